@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Замер опроса оповещений и инцидентов на больших таблицах
+
+База заполняется --alerts оповещениями 20 серверов, из которых --open
+не подтверждены, и таким же числом инцидентов. Запросы окна (опрос
+неподтвержденных оповещений каждые 5 с, последние инциденты сервера)
+замеряются с индексами схемы и без них - как было до частичных и
+составных индексов.
+
+Пример: python benchmarks/bench_alerts.py --alerts 1000000
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Добавляем путь к модулям проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.db_pool import ReadPool
+
+SERVERS = 20
+NEW_INDEXES = ('idx_alerts_unacknowledged', 'idx_alerts_unacknowledged_time', 'idx_alerts_server_time',
+               'idx_incidents_server_time')
+
+
+def fill(db, count, open_count):
+    """Заполняет alerts и incidents; последние open_count оповещений не подтверждены"""
+    urls = [f"http://server{i}:9090" for i in range(SERVERS)]
+    for url in urls:
+        db.add_server(url)
+    ids = [db.get_server_id(url) for url in urls]
+    rng = random.Random(1)
+    start = datetime.datetime.now() - datetime.timedelta(seconds=count * 3)
+
+    def rows():
+        for i in range(count):
+            stamp = (start + datetime.timedelta(seconds=i * 3)).strftime('%Y-%m-%d %H:%M:%S')
+            yield rng.choice(ids), stamp, i < count - open_count
+
+    conn = db.get_connection()
+    try:
+        conn.executemany("INSERT INTO alerts (server_id, timestamp, type, message, acknowledged) "
+                         "VALUES (?, ?, 'cpu_temp', 'Температура выше порога', ?)", rows())
+        conn.executemany("INSERT INTO incidents (server_id, timestamp, type, severity, description, resolved) "
+                         "VALUES (?, ?, 'cpu_temp', 'warning', 'Температура выше порога', ?)", rows())
+        conn.commit()
+    finally:
+        conn.close()
+    return urls
+
+
+def per_call(func, repeat):
+    """Среднее время вызова в миллисекундах"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def measure(db, urls, repeat):
+    return {
+        'оповещения, все серверы': per_call(lambda: db.get_unacknowledged_alerts(), repeat),
+        'оповещения, один сервер': per_call(lambda: db.get_unacknowledged_alerts(urls[0]), repeat),
+        'инциденты, один сервер': per_call(lambda: db.get_incidents(urls[0]), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер опроса оповещений и инцидентов")
+    parser.add_argument('--alerts', type=int, default=1000000)
+    parser.add_argument('--open', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+    temp_db.close()
+    db = Database(temp_db.name)
+    try:
+        urls = fill(db, args.alerts, args.open)
+        indexed = measure(db, urls, args.repeat)
+        conn = db.get_connection()
+        try:
+            for name in NEW_INDEXES:
+                conn.execute(f"DROP INDEX {name}")
+            conn.execute("CREATE INDEX idx_incidents_server ON incidents(server_id)")
+            conn.commit()
+        finally:
+            conn.close()
+        # Пул держит подготовленные запросы со старыми планами
+        db.read_pool.close()
+        db.read_pool = ReadPool(temp_db.name, 4, db.profile)
+        plain = measure(db, urls, args.repeat)
+    finally:
+        db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(temp_db.name + suffix):
+                os.unlink(temp_db.name + suffix)
+
+    print(f"{args.alerts} оповещений и инцидентов, {args.open} неподтвержденных")
+    print(f"{'запрос':<26} {'без индексов, мс':>17} {'с индексами, мс':>16}")
+    for name, elapsed in indexed.items():
+        print(f"{name:<26} {plain[name]:>17.2f} {elapsed:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
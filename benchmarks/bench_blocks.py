@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Замер хранения сырых метрик: строки metrics против сжатых блоков metric_blocks
+
+Для каждого размера в две базы (storage='rows' и storage='blocks') пишутся
+одни и те же точки с шагом 5 с: загрузка процессора и памяти с точностью
+0.1 %, температура в целых градусах. Сравниваются место, занятое сырыми
+данными (по dbstat), время чтения всей истории и время сводок для графика
+(get_metrics_buckets, 1000 интервалов: по сырым данным, если период не больше суток).
+
+Пример: python benchmarks/bench_blocks.py --rows 17280 120960
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Добавляем путь к модулям проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+
+URL = "http://bench-server:9090"
+STEP_MS = 5000
+BATCH = 720
+
+
+def samples(rows, seed=1):
+    """Точки, заканчивающиеся текущим моментом: случайное блуждание значений и дрожание меток"""
+    rng = random.Random(seed)
+    end = int(time.time() * 1000)
+    cpu, ram, temp = 30.0, 60.0, 45.0
+    for i in range(rows):
+        cpu = min(100.0, max(0.0, cpu + rng.uniform(-5, 5)))
+        ram = min(100.0, max(0.0, ram + rng.uniform(-0.2, 0.2)))
+        if rng.random() < 0.05:
+            temp = float(min(90, max(30, temp + rng.choice((-1, 1)))))
+        yield (URL, '', end - (rows - i) * STEP_MS + rng.randint(-20, 20),
+               round(cpu, 1), round(ram, 1), temp, None)
+
+
+def raw_bytes(db):
+    """Байты страниц, занятых сырыми рядами (таблица и ее индексы)"""
+    return db.conn.execute(
+        "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN ('metrics', 'metric_blocks')").fetchone()[0]
+
+
+def fill(db, rows):
+    batch = []
+    for row in samples(rows):
+        batch.append(row)
+        if len(batch) == BATCH:
+            db.save_metrics_batch(batch)
+            batch = []
+    if batch:
+        db.save_metrics_batch(batch)
+
+
+def best_of(func, repeat):
+    """Лучшее время из repeat запусков"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер хранения метрик: строки и сжатые блоки")
+    parser.add_argument('--rows', type=int, nargs='+', default=[17280, 120960])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'строк':>9} {'строки, КБ':>11} {'блоки, КБ':>10} {'сжатие':>7} "
+          f"{'чтение строк, мс':>17} {'чтение блоков, мс':>18} {'сводки строк, мс':>17} {'сводки блоков, мс':>18}")
+    for rows in args.rows:
+        hours = rows * STEP_MS / 3600000 + 1
+        results = {}
+        for storage in ('rows', 'blocks'):
+            temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+            temp_db.close()
+            db = Database(temp_db.name, storage=storage)
+            try:
+                db.add_server(URL)
+                fill(db, rows)
+                elapsed, count = best_of(lambda: len(db.get_metrics_history(URL, hours)), args.repeat)
+                assert count == rows
+                bucketed, count = best_of(lambda: sum(row[1] for row in db.get_metrics_buckets(URL, hours)[1]),
+                                          args.repeat)
+                assert count == rows
+                results[storage] = (raw_bytes(db), elapsed, bucketed)
+            finally:
+                db.close()
+                for suffix in ('', '-wal', '-shm'):
+                    if os.path.exists(temp_db.name + suffix):
+                        os.unlink(temp_db.name + suffix)
+        (row_size, row_time, row_buckets), (block_size, block_time, block_buckets) = results['rows'], results['blocks']
+        print(f"{rows:>9} {row_size / 1024:>11.0f} {block_size / 1024:>10.0f} {row_size / block_size:>6.1f}x "
+              f"{row_time * 1000:>17.1f} {block_time * 1000:>18.1f} "
+              f"{row_buckets * 1000:>17.1f} {block_buckets * 1000:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
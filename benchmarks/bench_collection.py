@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Замер пропускной способности сбора метрик на локальной замене Prometheus
+
+Для каждого режима выполняется --ticks тиков опроса всех серверов и
+выводятся тиков в секунду, p50/p99 длительности тика и процессорное
+время на один сервер.
+
+Пример: python benchmarks/bench_collection.py --servers 20 --instances 5 --latency 0.02
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import wait
+
+# Добавляем путь к модулям проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_prometheus import FakePrometheus
+from models.async_monitor import AsyncPrometheusMonitor
+from models.collector import MetricsCollector
+from models.database import Database
+from models.http_pool import SessionPool
+from models.monitor import PrometheusMonitor, MetadataCache
+
+MODES = ('monitor', 'collector', 'async', 'exporter')
+
+
+def percentile(values, fraction):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_monitor(urls, ticks, pool):
+    """Последовательный опрос серверов по одному, как в прежнем App.get_all_data"""
+    cache = MetadataCache()
+    monitors = [PrometheusMonitor(url, pool=pool, metadata_cache=cache) for url in urls]
+
+    def tick():
+        for monitor in monitors:
+            try:
+                monitor.get_all_instances()
+            except Exception:
+                pass
+    return measure(tick, ticks)
+
+
+def run_collector(urls, ticks, pool):
+    """Фоновый сборщик: параллельный опрос и пакетная запись в SQLite"""
+    temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+    temp_db.close()
+    db = Database(temp_db.name)
+    for url in urls:
+        db.add_server(url)
+    cache = MetadataCache()
+    collector = MetricsCollector(db, monitor_factory=lambda url: PrometheusMonitor(url, pool=pool, metadata_cache=cache))
+
+    def tick():
+        futures = [collector._executor.submit(collector._poll, url) for url in urls]
+        wait(futures)
+        collector.flush()
+    try:
+        return measure(tick, ticks)
+    finally:
+        collector.stop()
+        db.close()
+        os.unlink(temp_db.name)
+
+
+def run_async(urls, ticks, pool):
+    """Асинхронный опрос всех серверов за один тик"""
+    monitor = AsyncPrometheusMonitor(pool=pool, tick_deadline=60)
+    try:
+        return measure(lambda: monitor.run_tick(urls), ticks)
+    finally:
+        monitor.close()
+
+
+def measure(tick, ticks):
+    """Выполняет тики; возвращает длительности тиков, общее и процессорное время"""
+    tick()  # прогрев: соединения и кэш метаданных
+    latencies = []
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for _ in range(ticks):
+        tick_started = time.perf_counter()
+        tick()
+        latencies.append(time.perf_counter() - tick_started)
+    return latencies, time.perf_counter() - started, time.process_time() - cpu_started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер сбора метрик на локальной замене Prometheus")
+    parser.add_argument('--mode', choices=MODES + ('all',), default='all')
+    parser.add_argument('--servers', type=int, default=10, help="число адресов Prometheus")
+    parser.add_argument('--instances', type=int, default=5, help="хостов за каждым адресом")
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument('--jitter', type=float, default=0.0, help="разброс задержки, с")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument('--volumes', type=int, default=2)
+    parser.add_argument('--extra-series', type=int, default=0, help="посторонние ряды в /metrics")
+    args = parser.parse_args()
+
+    fake = FakePrometheus(args.instances, args.latency, args.jitter, args.error_rate,
+                          volumes=args.volumes, extra_series=args.extra_series, seed=1).start()
+    prometheus_urls = [f"{fake.url}/prom-{i}" for i in range(args.servers)]
+    # В режиме exporter каждый хост опрашивается напрямую
+    exporter_urls = [f"{fake.url}/prom-{i}/{instance}/metrics"
+                     for i in range(args.servers) for instance in fake.instances]
+
+    modes = MODES if args.mode == 'all' else (args.mode,)
+    print(f"{'режим':<10} {'серверов':>8} {'тиков/с':>8} {'p50, мс':>8} {'p99, мс':>8} {'CPU/сервер, мс':>15}")
+    try:
+        for mode in modes:
+            pool = SessionPool(pool_maxsize=32)
+            urls = exporter_urls if mode == 'exporter' else prometheus_urls
+            if mode == 'monitor':
+                result = run_monitor(urls, args.ticks, pool)
+            elif mode == 'collector':
+                result = run_collector(urls, args.ticks, pool)
+            else:
+                result = run_async(urls, args.ticks, pool)
+            pool.close()
+
+            latencies, elapsed, cpu = result
+            print(f"{mode:<10} {len(urls):>8} {len(latencies) / elapsed:>8.1f} "
+                  f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+                  f"{cpu / (len(latencies) * len(urls)) * 1000:>15.3f}")
+    finally:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
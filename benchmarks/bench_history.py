@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Замер чтения истории метрик: строки-кортежи против массивов numpy
+
+Для каждого размера база заполняется точками с шагом 5 с, затем читается
+вся история тремя способами: get_metrics_history как есть (только
+кортежи), get_metrics_history с построением списков datetime и float (как
+раньше делала вкладка истории) и get_metrics_history_arrays.
+Ускорение считается относительно второго способа; большую часть времени
+при любом способе занимает выборка строк из SQLite.
+
+Пример: python benchmarks/bench_history.py --rows 10000 100000 1000000
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+# Добавляем путь к модулям проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+
+URL = "http://bench-server:9090"
+STEP_MS = 5000
+
+
+def fill(db, rows):
+    """Записывает rows точек, заканчивающихся текущим моментом, напрямую в metrics"""
+    server_id = db.get_server_id(URL)
+    end = int(time.time() * 1000)
+    start = end - rows * STEP_MS
+    conn = db.get_connection()
+    try:
+        conn.executemany(
+            "INSERT INTO metrics (server_id, ts, cpu_usage, ram_usage, temperature) VALUES (?, ?, ?, ?, ?)",
+            ((server_id, start + i * STEP_MS, i % 100 * 1.0, 50.0, 40.0 + i % 20) for i in range(rows)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def read_rows(db, hours):
+    """Только выборка: кортежи без перевода в объекты для графика"""
+    return len(db.get_metrics_history(URL, hours))
+
+
+def read_tuples(db, hours):
+    """Прежний путь: кортежи и списки Python-объектов по каждой строке"""
+    timestamps, cpu, ram, temp = [], [], [], []
+    for ts, cpu_usage, ram_usage, temperature in db.get_metrics_history(URL, hours):
+        timestamps.append(datetime.datetime.fromtimestamp(ts / 1000))
+        cpu.append(float(cpu_usage if cpu_usage is not None else 0))
+        ram.append(float(ram_usage if ram_usage is not None else 0))
+        temp.append(float(temperature if temperature is not None else 0))
+    return len(timestamps)
+
+
+def read_arrays(db, hours):
+    return len(db.get_metrics_history_arrays(URL, hours)['ts'])
+
+
+def best_of(func, repeat):
+    """Лучшее время из repeat запусков"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер чтения истории: кортежи и массивы numpy")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'строк':>9} {'выборка, мс':>12} {'кортежи, мс':>12} {'массивы, мс':>12} {'ускорение':>10}")
+    for rows in args.rows:
+        temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        temp_db.close()
+        db = Database(temp_db.name)
+        try:
+            db.add_server(URL)
+            fill(db, rows)
+            hours = rows * STEP_MS / 3600000 + 1
+            fetch, _ = best_of(lambda: read_rows(db, hours), args.repeat)
+            tuples, count = best_of(lambda: read_tuples(db, hours), args.repeat)
+            arrays, array_count = best_of(lambda: read_arrays(db, hours), args.repeat)
+            assert count == array_count == rows
+            print(f"{rows:>9} {fetch * 1000:>12.1f} {tuples * 1000:>12.1f} {arrays * 1000:>12.1f} "
+                  f"{tuples / arrays:>9.1f}x")
+        finally:
+            db.close()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(temp_db.name + suffix):
+                    os.unlink(temp_db.name + suffix)
+
+
+if __name__ == '__main__':
+    main()
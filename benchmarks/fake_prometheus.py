@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Prometheus и windows_exporter для нагрузочных замеров
+
+Отвечает на /api/v1/query, /api/v1/query_range и /metrics данными
+N синтетических Windows-хостов. Задержка, ее разброс, доля ошибок
+и число рядов настраиваются.
+
+Запуск отдельно: python benchmarks/fake_prometheus.py --instances 50 --latency 0.02
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Тег подзапроса пакетного запроса: label_replace(..., "monitor_query", "cpu:usage_precent", "", "")
+TAG_PATTERN = re.compile(r'"monitor_query", "([a-z]+):([A-Za-z0-9_]+)"')
+
+GIB = 1073741824
+
+
+class FakePrometheus:
+    """HTTP-сервер, имитирующий Prometheus с instances хостами windows_exporter"""
+
+    def __init__(self, instances=10, latency=0.0, jitter=0.0, error_rate=0.0,
+                 volumes=2, cores=4, extra_series=0, host='127.0.0.1', port=0, seed=None):
+        self.instances = [f"win-{i:03d}:9182" for i in range(instances)]
+        self._index = {instance: i for i, instance in enumerate(self.instances)}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.volumes = [f"{chr(ord('C') + i)}:" for i in range(volumes)]
+        self.cores = [f"0,{i}" for i in range(cores)]
+        # Посторонние ряды в /metrics, которые клиент должен пропускать
+        self.extra_series = extra_series
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._started = time.time()
+        self.requests = 0
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def delay(self):
+        """Ждет заданную задержку; возвращает True, если запрос должен завершиться ошибкой"""
+        with self._rng_lock:
+            pause = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+            failed = self._rng.random() < self.error_rate
+            self.requests += 1
+        if pause > 0:
+            time.sleep(pause)
+        return failed
+
+    def value(self, instance, section, field, ts):
+        """Синтетическое значение поля хоста в момент ts"""
+        index = self._index.get(instance, 0)
+        phase = (ts / 60 + index) % 10 / 10
+        if section == 'cpu':
+            return {
+                'usage_precent': 0.1 + 0.8 * phase,
+                'temperatur': 40 + 40 * phase,
+                'name': 1,
+                'frequency_mhz': 2400,
+                'core': len(self.cores),
+                'thread': len(self.cores) * 2,
+                'L2': 1024,
+                'L3': 16384,
+            }.get(field, 0)
+        if section == 'ram':
+            return {'available': 16 * (1 - phase), 'all': 16}.get(field, 0)
+        if section == 'rom':
+            return {'available': 100 * (1 - phase / 2), 'all': 200}.get(field, 0)
+        if section == 'network':
+            return 1
+        if section == 'meta':
+            return int(self._started)
+        return 0
+
+    def series(self, section, field):
+        """Наборы меток рядов для подзапроса (section, field)"""
+        for instance in self.instances:
+            labels = {'instance': instance, 'monitor_query': f'{section}:{field}'}
+            if section == 'rom':
+                for volume in self.volumes:
+                    yield dict(labels, volume=volume), instance
+            elif section == 'cpu' and field == 'name':
+                yield dict(labels, name='Intel(R) Xeon(R) Gold', description='Intel64 Family 6'), instance
+            else:
+                yield labels, instance
+
+    def query(self, expr, ts):
+        result = []
+        for section, field in TAG_PATTERN.findall(expr):
+            for labels, instance in self.series(section, field):
+                result.append({'metric': labels,
+                               'value': [ts, str(self.value(instance, section, field, ts))]})
+        return {'resultType': 'vector', 'result': result}
+
+    def query_range(self, expr, start, end, step):
+        result = []
+        stamps = []
+        ts = start
+        while ts <= end:
+            stamps.append(ts)
+            ts += step
+        for section, field in TAG_PATTERN.findall(expr):
+            for labels, instance in self.series(section, field):
+                values = [[t, str(self.value(instance, section, field, t))] for t in stamps]
+                result.append({'metric': labels, 'values': values})
+        return {'resultType': 'matrix', 'result': result}
+
+    def exposition(self, instance):
+        """Ответ /metrics одного хоста в текстовом формате"""
+        now = time.time()
+        uptime = now - self._started
+        lines = [
+            '# HELP windows_cpu_info Labelled CPU information',
+            '# TYPE windows_cpu_info gauge',
+            'windows_cpu_info{description="Intel64 Family 6",name="Intel(R) Xeon(R) Gold"} 1',
+            f'windows_cpu_info_core {len(self.cores)}',
+            f'windows_cpu_info_thread {len(self.cores) * 2}',
+            'windows_cpu_info_l2_cache_size 1024',
+            'windows_cpu_info_l3_cache_size 16384',
+        ]
+        usage = self.value(instance, 'cpu', 'usage_precent', now)
+        for core in self.cores:
+            lines.append(f'windows_cpu_core_frequency_mhz{{core="{core}"}} 2400')
+            lines.append(f'windows_cpu_processor_utility_total{{core="{core}"}} {uptime * usage * 1e7:.0f}')
+            lines.append(f'windows_cpu_processor_rtc_total{{core="{core}"}} {uptime * 1e7:.0f}')
+        lines.append(f'windows_memory_available_bytes {self.value(instance, "ram", "available", now) * GIB:.0f}')
+        lines.append(f'windows_memory_physical_total_bytes {16 * GIB}')
+        for volume in self.volumes:
+            lines.append(f'windows_logical_disk_free_bytes{{volume="{volume}"}} '
+                         f'{self.value(instance, "rom", "available", now) * GIB:.0f}')
+            lines.append(f'windows_logical_disk_size_bytes{{volume="{volume}"}} {200 * GIB}')
+        lines.append(f'windows_thermalzone_temperature_celsius{{name="zone0"}} '
+                     f'{self.value(instance, "cpu", "temperatur", now):.1f}')
+        lines.append('# TYPE windows_service_state gauge')
+        for i in range(self.extra_series):
+            lines.append(f'windows_service_state{{name="service-{i}",state="running"}} 1')
+        lines.append(f'process_start_time_seconds {self._started:.0f}')
+        return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело пишутся раздельно - без этого Nagle добавляет ~40 мс к каждому ответу
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        fake = self.server.fake
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        if fake.delay():
+            self._send(503, 'text/plain', b'unavailable')
+            return
+
+        if parsed.path.endswith('/api/v1/query'):
+            data = fake.query(params.get('query', ''), float(params.get('time', time.time())))
+            self._send_json(data)
+        elif parsed.path.endswith('/api/v1/query_range'):
+            data = fake.query_range(params.get('query', ''), float(params['start']),
+                                    float(params['end']), float(params['step']))
+            self._send_json(data)
+        elif parsed.path.endswith('/metrics'):
+            # /metrics - первый хост, /<instance>/metrics - указанный
+            parts = parsed.path.strip('/').split('/')
+            instance = parts[-2] if len(parts) > 1 else fake.instances[0]
+            body = fake.exposition(instance).encode()
+            self._send(200, 'text/plain; version=0.0.4; charset=utf-8', body)
+        else:
+            self._send(404, 'text/plain', b'not found')
+
+    def _send_json(self, data):
+        body = json.dumps({'status': 'success', 'data': data}).encode()
+        self._send(200, 'application/json', body)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Prometheus/windows_exporter")
+    parser.add_argument('--port', type=int, default=9090)
+    parser.add_argument('--instances', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument('--jitter', type=float, default=0.0, help="разброс задержки, с")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument('--volumes', type=int, default=2)
+    parser.add_argument('--cores', type=int, default=4)
+    parser.add_argument('--extra-series', type=int, default=0, help="посторонние ряды в /metrics")
+    args = parser.parse_args()
+
+    fake = FakePrometheus(args.instances, args.latency, args.jitter, args.error_rate,
+                          args.volumes, args.cores, args.extra_series, port=args.port)
+    print(f"Сервер запущен: {fake.url} ({args.instances} хостов)")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
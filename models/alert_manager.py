@@ -11,49 +11,55 @@ class AlertManager:
         self.ram_alerts = defaultdict(bool)  # server_url -> bool
         self.alert_lock = threading.Lock()
 
-    def check_alerts(self, server_url, cpu_info, ram_info, rom_info):
+    def check_alerts(self, server_url, cpu_info, ram_info, rom_info, instance=''):
         """Проверяет все условия для оповещений"""
         with self.alert_lock:
-            self._check_temperature_alert(server_url, cpu_info)
-            self._check_disk_usage_alert(server_url, rom_info)
-            self._check_ram_usage_alert(server_url, ram_info)
+            self._check_temperature_alert(server_url, cpu_info, instance)
+            self._check_disk_usage_alert(server_url, rom_info, instance)
+            self._check_ram_usage_alert(server_url, ram_info, instance)
 
-    def _check_temperature_alert(self, server_url, cpu_info):
+    def _state_key(self, server_url, instance):
+        """Ключ состояния оповещений: адрес сервера или пара (адрес, экземпляр)"""
+        return (server_url, instance) if instance else server_url
+
+    def _check_temperature_alert(self, server_url, cpu_info, instance=''):
         """Проверяет температуру процессора"""
         if not cpu_info or 'temperatur' not in cpu_info:
             return
+        key = self._state_key(server_url, instance)
 
         temperature = float(cpu_info['temperatur'])
         current_time = datetime.datetime.now()
 
         if temperature > 85:
             # Добавляем время в список
-            self.temperature_alerts[server_url].append(current_time)
+            self.temperature_alerts[key].append(current_time)
             
             # Удаляем записи старше 10 минут
             cutoff_time = current_time - datetime.timedelta(minutes=10)
-            self.temperature_alerts[server_url] = [
-                t for t in self.temperature_alerts[server_url] 
+            self.temperature_alerts[key] = [
+                t for t in self.temperature_alerts[key] 
                 if t > cutoff_time
             ]
 
             # Если температура высокая более 10 минут
-            if len(self.temperature_alerts[server_url]) >= 2:  # 2 записи = 10 минут (при обновлении каждые 5 сек)
+            if len(self.temperature_alerts[key]) >= 2:  # 2 записи = 10 минут (при обновлении каждые 5 сек)
                 alert_message = f"КРИТИЧЕСКОЕ ОПОВЕЩЕНИЕ: Температура процессора {temperature:.1f}°C превышает 85°C более 10 минут!"
-                self.db.add_alert(server_url, "temperature_critical", alert_message)
+                self.db.add_alert(server_url, "temperature_critical", alert_message, instance)
                 self.db.add_incident(server_url, "cpu_temp", "critical", 
-                                   f"Температура процессора {temperature:.1f}°C превышает 85°C более 10 минут")
+                                   f"Температура процессора {temperature:.1f}°C превышает 85°C более 10 минут", instance)
             else:
                 alert_message = f"ПРЕДУПРЕЖДЕНИЕ: Температура процессора {temperature:.1f}°C превышает 85°C"
-                self.db.add_alert(server_url, "temperature_warning", alert_message)
+                self.db.add_alert(server_url, "temperature_warning", alert_message, instance)
         else:
             # Сбрасываем счетчик если температура нормальная
-            self.temperature_alerts[server_url].clear()
+            self.temperature_alerts[key].clear()
 
-    def _check_disk_usage_alert(self, server_url, rom_info):
+    def _check_disk_usage_alert(self, server_url, rom_info, instance=''):
         """Проверяет использование дисков"""
         if not rom_info:
             return
+        key = self._state_key(server_url, instance)
 
         current_alerts = set()
         for volume, disk_data in rom_info.items():
@@ -63,36 +69,37 @@ class AlertManager:
                 current_alerts.add(volume)
                 
                 # Проверяем, не было ли уже оповещения для этого диска
-                if volume not in self.disk_alerts[server_url]:
+                if volume not in self.disk_alerts[key]:
                     alert_message = f"ПРЕДУПРЕЖДЕНИЕ: Диск {volume} заполнен на {usage_percent:.1f}%"
-                    self.db.add_alert(server_url, "disk_usage", alert_message)
+                    self.db.add_alert(server_url, "disk_usage", alert_message, instance)
                     self.db.add_incident(server_url, "disk_usage", "warning", 
-                                       f"Диск {volume} заполнен на {usage_percent:.1f}%")
-                    self.disk_alerts[server_url].add(volume)
+                                       f"Диск {volume} заполнен на {usage_percent:.1f}%", instance)
+                    self.disk_alerts[key].add(volume)
 
         # Удаляем диски, которые больше не превышают лимит
-        self.disk_alerts[server_url] = self.disk_alerts[server_url].intersection(current_alerts)
+        self.disk_alerts[key] = self.disk_alerts[key].intersection(current_alerts)
 
-    def _check_ram_usage_alert(self, server_url, ram_info):
+    def _check_ram_usage_alert(self, server_url, ram_info, instance=''):
         """Проверяет использование RAM"""
         if not ram_info or 'usage_precent' not in ram_info:
             return
+        key = self._state_key(server_url, instance)
 
         ram_usage = float(ram_info['usage_precent'])
         
         if ram_usage > 90:
-            if not self.ram_alerts[server_url]:
+            if not self.ram_alerts[key]:
                 alert_message = f"ПРЕДУПРЕЖДЕНИЕ: Использование RAM {ram_usage:.1f}% превышает 90%"
-                self.db.add_alert(server_url, "ram_usage", alert_message)
+                self.db.add_alert(server_url, "ram_usage", alert_message, instance)
                 self.db.add_incident(server_url, "ram_usage", "warning", 
-                                   f"Использование RAM {ram_usage:.1f}% превышает 90%")
-                self.ram_alerts[server_url] = True
+                                   f"Использование RAM {ram_usage:.1f}% превышает 90%", instance)
+                self.ram_alerts[key] = True
         else:
-            self.ram_alerts[server_url] = False
+            self.ram_alerts[key] = False
 
-    def get_active_alerts(self, server_url=None):
-        """Получает активные оповещения"""
-        return self.db.get_unacknowledged_alerts(server_url)
+    def get_active_alerts(self, server_url=None, limit=100):
+        """Получает limit последних активных оповещений"""
+        return self.db.get_unacknowledged_alerts(server_url, limit)
 
     def acknowledge_alert(self, alert_id):
         """Подтверждает оповещение"""
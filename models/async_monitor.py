@@ -0,0 +1,122 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models.exporter import ExporterScraper, is_exporter_url
+from models.http_pool import shared_pool
+from models.monitor import BATCH_QUERIES, build_batch_query, demultiplex_instances, fill_derived
+
+
+class AsyncPrometheusMonitor:
+    """Асинхронный аналог PrometheusMonitor для одновременного опроса многих серверов"""
+
+    def __init__(self, max_concurrency=20, request_timeout=3, tick_deadline=4.5, split_queries=False, pool=None):
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.tick_deadline = tick_deadline
+        # split_queries=True - каждое выражение отдельным запросом, все одновременно
+        self.split_queries = split_queries
+        self.pool = pool if pool is not None else shared_pool
+        # Блокирующие HTTP-вызовы выполняются в собственном пуле потоков
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._connections = {}
+        self._scrapers = {}  # url -> ExporterScraper для адресов /metrics
+        self._lock = threading.Lock()
+        self.stats = {'ticks': 0, 'queries': 0, 'timeouts': 0, 'errors': 0}
+
+    def _get_prom(self, url):
+        with self._lock:
+            if url not in self._connections:
+                self._connections[url] = self.pool.connect(url)
+            return self._connections[url]
+
+    def _get_scraper(self, url):
+        with self._lock:
+            if url not in self._scrapers:
+                self._scrapers[url] = ExporterScraper(url, self.pool, self.request_timeout)
+            return self._scrapers[url]
+
+    async def _scrape_exporter(self, url, semaphore):
+        """Опрашивает /metrics экспортера напрямую"""
+        scraper = self._get_scraper(url)
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            self.stats['queries'] += 1
+            future = loop.run_in_executor(self._executor, scraper.scrape)
+            try:
+                result = await asyncio.wait_for(future, timeout=self.request_timeout)
+            except asyncio.TimeoutError:
+                self.stats['timeouts'] += 1
+                return None
+            except Exception:
+                self.stats['errors'] += 1
+                return None
+        return {'': fill_derived(result)}
+
+    async def _query(self, url, query, semaphore):
+        """Выполняет один запрос с ограничением параллельности и таймаутом"""
+        prom = self._get_prom(url)
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            self.stats['queries'] += 1
+            future = loop.run_in_executor(self._executor, lambda: prom.custom_query(query, timeout=self.request_timeout))
+            try:
+                return await asyncio.wait_for(future, timeout=self.request_timeout)
+            except asyncio.TimeoutError:
+                self.stats['timeouts'] += 1
+                raise
+
+    async def collect(self, url, semaphore=None):
+        """Собирает метрики всех экземпляров сервера, выполняя его запросы одновременно"""
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+        if is_exporter_url(url):
+            return await self._scrape_exporter(url, semaphore)
+        if self.split_queries:
+            queries = [build_batch_query([query]) for query in BATCH_QUERIES]
+        else:
+            queries = [build_batch_query(BATCH_QUERIES)]
+
+        results = await asyncio.gather(*(self._query(url, q, semaphore) for q in queries), return_exceptions=True)
+        data = []
+        failed = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                failed += 1
+                continue
+            data.extend(result)
+        if failed:
+            self.stats['errors'] += failed
+        if failed == len(results):
+            return None
+        return {instance: fill_derived(result) for instance, result in demultiplex_instances(data).items()}
+
+    async def scrape_all(self, urls):
+        """Опрашивает все серверы параллельно; не уложившиеся в срок тика получают None"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = {url: asyncio.ensure_future(self.collect(url, semaphore)) for url in urls}
+        self.stats['ticks'] += 1
+        if not tasks:
+            return {}
+
+        done, pending = await asyncio.wait(tasks.values(), timeout=self.tick_deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        results = {}
+        for url, task in tasks.items():
+            if task in done and task.exception() is None:
+                results[url] = task.result()
+            else:
+                results[url] = None
+        return results
+
+    def run_tick(self, urls):
+        """Синхронная обертка: один тик опроса всех серверов"""
+        return asyncio.run(self.scrape_all(urls))
+
+    def close(self):
+        """Останавливает пул потоков"""
+        self._executor.shutdown(wait=False)
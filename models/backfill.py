@@ -0,0 +1,149 @@
+import datetime
+import queue
+import threading
+import time
+
+from models.exporter import is_exporter_url
+from models.http_pool import shared_pool
+from models.monitor import BATCH_QUERIES, build_batch_query, demultiplex, fill_derived
+
+# Для истории загрузка CPU считается по минутному окну, чтобы rate() работал на любом шаге
+CPU_RANGE_QUERY = ('cpu', 'usage_precent',
+                   'avg by (instance) (rate(windows_cpu_processor_utility_total[1m]) / rate(windows_cpu_processor_rtc_total[1m]))')
+
+BACKFILL_FIELDS = {('cpu', 'temperatur'), ('ram', 'available'), ('ram', 'all'), ('rom', 'available'), ('rom', 'all')}
+
+BACKFILL_QUERIES = [CPU_RANGE_QUERY] + [q for q in BATCH_QUERIES if (q[0], q[1]) in BACKFILL_FIELDS]
+
+
+def split_matrix(data):
+    """Раскладывает результат query_range на снимки (instance, ts, snapshot) по экземплярам и меткам времени"""
+    by_time = {}
+    for series in data:
+        instance = series['metric'].get('instance', '')
+        for ts, value in series['values']:
+            by_time.setdefault((instance, int(float(ts))), []).append({'metric': series['metric'], 'value': [ts, value]})
+    return [(instance, ts, fill_derived(demultiplex(items))) for (instance, ts), items in sorted(by_time.items())]
+
+
+class HistoryBackfill:
+    """Фоновая загрузка истории метрик из Prometheus через query_range"""
+
+    def __init__(self, database, lookback_hours=168, step=5, chunk_points=5000, timeout=30,
+                 pool=None, progress_callback=None):
+        self.db = database
+        self.lookback_hours = lookback_hours
+        self.step = step
+        self.chunk_points = chunk_points
+        self.timeout = timeout
+        self.pool = pool if pool is not None else shared_pool
+        self.progress_callback = progress_callback
+
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.progress = {}  # url -> доля загруженного периода (0..1)
+
+    def start(self, urls):
+        """Ставит серверы в очередь загрузки и запускает фоновый поток"""
+        with self._lock:
+            for url in urls:
+                if url not in self._queued:
+                    self._queued.add(url)
+                    self._queue.put(url)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Прерывает загрузку; при следующем запуске она продолжится с места остановки"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def get_progress(self, url):
+        with self._lock:
+            return self.progress.get(url)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                url = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.backfill(url)
+            except Exception as e:
+                print(f"Ошибка при загрузке истории {url}: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(url)
+
+    def _set_progress(self, url, value):
+        with self._lock:
+            self.progress[url] = value
+        if self.progress_callback:
+            self.progress_callback(url, value)
+
+    def backfill(self, url, now=None):
+        """Загружает историю сервера блоками, выровненными по шагу; возвращает число новых строк"""
+        if is_exporter_url(url):
+            # У экспортера нет истории - она копится только собственными опросами
+            self._set_progress(url, 1.0)
+            return 0
+        now = time.time() if now is None else now
+        end = int(now) // self.step * self.step
+        start = end - self.lookback_hours * 3600
+        done_until = self.db.get_backfill_progress(url)
+        if done_until is not None:
+            start = max(start, done_until + self.step)
+        start = -(-start // self.step) * self.step
+        if start > end:
+            self._set_progress(url, 1.0)
+            return 0
+
+        prom = self.pool.connect(url)
+        query = build_batch_query(BACKFILL_QUERIES)
+        chunk = self.step * self.chunk_points
+        total = end - start + self.step
+        inserted = 0
+
+        for chunk_start in range(start, end + 1, chunk):
+            if self._stop_event.is_set():
+                break
+            chunk_end = min(chunk_start + chunk - self.step, end)
+            data = prom.custom_query_range(
+                query,
+                start_time=datetime.datetime.fromtimestamp(chunk_start),
+                end_time=datetime.datetime.fromtimestamp(chunk_end),
+                step=str(self.step),
+                timeout=self.timeout,
+            )
+            inserted += self._store_chunk(url, chunk_start, chunk_end, data)
+            self._set_progress(url, (chunk_end - start + self.step) / total)
+
+        return inserted
+
+    def _store_chunk(self, url, chunk_start, chunk_end, data):
+        """Сохраняет блок вместе с прогрессом одной транзакцией, пропуская шаги, где точка уже есть"""
+        step_ms = self.step * 1000
+        existing = {}
+        rows = []
+        for instance, ts, snapshot in split_matrix(data):
+            if instance not in existing:
+                # Собственные опросы не выровнены по шагу - сравниваем номера шагов, а не метки
+                existing[instance] = {stamp // step_ms for stamp in self.db.get_metric_timestamps(
+                    url, chunk_start * 1000, chunk_end * 1000 + step_ms - 1, instance)}
+            timestamp = int(ts * 1000)
+            if timestamp // step_ms in existing[instance] or not snapshot['cpu'] or not snapshot['ram']:
+                continue
+            rows.append((url, instance, timestamp,
+                         float(snapshot['cpu'].get('usage_precent', 0)),
+                         float(snapshot['ram'].get('usage_precent', 0)),
+                         float(snapshot['cpu'].get('temperatur', 0)),
+                         snapshot['rom']))
+        self.db.save_backfill_chunk(url, rows, chunk_end)
+        return len(rows)
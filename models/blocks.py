@@ -0,0 +1,219 @@
+import math
+import struct
+
+# Длительность блока: точки сервера за интервал сжимаются в одну строку metric_blocks
+BLOCK_MS = 2 * 3600 * 1000
+
+# Значения блока в порядке хранения
+BLOCK_METRICS = ('cpu_usage', 'ram_usage', 'temperature')
+
+# Пропуск значения (NULL) кодируется как NaN
+NULL_BITS = struct.unpack('>Q', struct.pack('>d', math.nan))[0]
+
+# Диапазоны delta-of-delta меток времени: (префикс, длина префикса, бит значения)
+DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12), (0b1111, 4, 32))
+
+BLOCKS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS metric_blocks (
+        server_id INTEGER NOT NULL,
+        block_start INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        first_ts INTEGER NOT NULL,
+        last_ts INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (server_id, block_start)
+    ) WITHOUT ROWID"""
+
+# Блоки, пересекающиеся с интервалом от ts: начало блока позже ts - BLOCK_MS
+BLOCKS_HISTORY_SQL = """
+    SELECT count, data
+    FROM metric_blocks
+    WHERE server_id = ? AND block_start > ?
+    ORDER BY block_start
+"""
+
+
+def block_start(ts):
+    """Начало блока, в который попадает ts (мс эпохи)"""
+    return ts - ts % BLOCK_MS
+
+
+class BitWriter:
+    """Запись битового потока старшими битами вперед"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self._value = 0
+        self._bits = 0
+
+    def write(self, value, bits):
+        self._value = (self._value << bits) | (value & ((1 << bits) - 1))
+        self._bits += bits
+        if self._bits >= 64:
+            # Целые байты переносим в буфер, чтобы накопитель оставался коротким
+            extra = self._bits % 8
+            self.data += (self._value >> extra).to_bytes((self._bits - extra) // 8, 'big')
+            self._value &= (1 << extra) - 1
+            self._bits = extra
+
+    def getvalue(self):
+        padding = -self._bits % 8
+        return bytes(self.data) + (self._value << padding).to_bytes((self._bits + padding) // 8, 'big')
+
+
+class BitReader:
+    """Чтение битового потока, записанного BitWriter"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, bits):
+        start = self.pos >> 3
+        end = (self.pos + bits + 7) >> 3
+        chunk = int.from_bytes(self.data[start:end], 'big')
+        self.pos += bits
+        return (chunk >> (end * 8 - self.pos)) & ((1 << bits) - 1)
+
+
+def _float_bits(value):
+    if value is None:
+        return NULL_BITS
+    return struct.unpack('>Q', struct.pack('>d', value))[0]
+
+
+def _bits_float(bits):
+    value = struct.unpack('>d', struct.pack('>Q', bits))[0]
+    return None if value != value else value
+
+
+def encode_block(samples):
+    """Сжимает точки (ts, cpu_usage, ram_usage, temperature), упорядоченные по ts, в BLOB
+
+    Метки времени - delta-of-delta, значения - XOR с предыдущим значением
+    столбца (как в Gorilla): повторяющиеся значения занимают один бит.
+    """
+    writer = BitWriter()
+    writer.write(len(samples), 32)
+    if not samples:
+        return writer.getvalue()
+    first = samples[0]
+    writer.write(first[0], 64)
+    previous = [_float_bits(value) for value in first[1:]]
+    for bits in previous:
+        writer.write(bits, 64)
+    # Окно значащих битов предыдущего XOR по каждому столбцу: (ведущие нули, длина)
+    windows = [None] * len(previous)
+    last_ts = first[0]
+    last_delta = 0
+    for sample in samples[1:]:
+        delta = sample[0] - last_ts
+        dod = delta - last_delta
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, bits in DOD_BUCKETS:
+                if -(1 << (bits - 1)) <= dod < 1 << (bits - 1) or bits == 32:
+                    writer.write(prefix, prefix_bits)
+                    writer.write(dod, bits)
+                    break
+        last_ts, last_delta = sample[0], delta
+
+        for index, value in enumerate(sample[1:]):
+            bits = _float_bits(value)
+            xor = bits ^ previous[index]
+            previous[index] = bits
+            if xor == 0:
+                writer.write(0, 1)
+                continue
+            leading = min(64 - xor.bit_length(), 31)
+            trailing = (xor & -xor).bit_length() - 1
+            window = windows[index]
+            if window and leading >= window[0] and trailing >= 64 - window[0] - window[1]:
+                # Значащие биты помещаются в окно предыдущего значения
+                writer.write(0b10, 2)
+                writer.write(xor >> (64 - window[0] - window[1]), window[1])
+            else:
+                length = 64 - leading - trailing
+                writer.write(0b11, 2)
+                writer.write(leading, 5)
+                writer.write(length - 1, 6)
+                writer.write(xor >> trailing, length)
+                windows[index] = (leading, length)
+    return writer.getvalue()
+
+
+def _read_dod(reader):
+    if not reader.read(1):
+        return 0
+    for _, _, bits in DOD_BUCKETS[:-1]:
+        if not reader.read(1):
+            break
+    else:
+        bits = DOD_BUCKETS[-1][2]
+    value = reader.read(bits)
+    # Знак значения в дополнительном коде
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+
+def decode_block_columns(data):
+    """Точки блока по столбцам: (метки, [биты значений столбца, ...])
+
+    Биты - представление double (IEEE 754), пропуск - NaN: массив битов
+    переводится в числа одним view(float64) без struct на каждое значение.
+    """
+    reader = BitReader(data)
+    count = reader.read(32)
+    if not count:
+        return [], [[] for _ in BLOCK_METRICS]
+    ts = reader.read(64)
+    previous = [reader.read(64) for _ in BLOCK_METRICS]
+    windows = [None] * len(previous)
+    stamps = [ts]
+    columns = [[bits] for bits in previous]
+    delta = 0
+    for _ in range(count - 1):
+        delta += _read_dod(reader)
+        ts += delta
+        stamps.append(ts)
+        for index, column in enumerate(columns):
+            if reader.read(1):
+                if reader.read(1):
+                    leading = reader.read(5)
+                    length = reader.read(6) + 1
+                    windows[index] = (leading, length)
+                else:
+                    leading, length = windows[index]
+                previous[index] ^= reader.read(length) << (64 - leading - length)
+            column.append(previous[index])
+    return stamps, columns
+
+
+def decode_block(data):
+    """Восстанавливает точки блока: список (ts, cpu_usage, ram_usage, temperature), пропуски - None"""
+    stamps, columns = decode_block_columns(data)
+    return list(zip(stamps, *(map(_bits_float, column) for column in columns)))
+
+
+def decode_rows(rows, start_ms):
+    """Точки блоков из строк (count, data) начиная с start_ms"""
+    return [sample for _, data in rows for sample in decode_block(data) if sample[0] >= start_ms]
+
+
+def decode_rows_arrays(rows, start_ms):
+    """Точки блоков из строк (count, data) начиная с start_ms в массивах numpy
+
+    Возвращает (ts: int64, values: float64 [столбец, точка]), пропуски - NaN.
+    """
+    import numpy as np
+
+    stamps, columns = [], [[] for _ in BLOCK_METRICS]
+    for _, data in rows:
+        block_stamps, block_columns = decode_block_columns(data)
+        stamps += block_stamps
+        for column, bits in zip(columns, block_columns):
+            column += bits
+    ts = np.array(stamps, dtype=np.int64)
+    values = np.array(columns, dtype=np.uint64).reshape(len(BLOCK_METRICS), len(ts)).view(np.float64)
+    keep = ts >= start_ms
+    return ts[keep], values[:, keep]
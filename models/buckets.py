@@ -0,0 +1,121 @@
+from models.rollup import ROLLUP_TIERS
+
+SECOND_MS = 1000
+MINUTE_MS = 60 * SECOND_MS
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# Допустимые ширины интервалов: все делят сутки (и двухчасовой блок, если они меньше
+# пяти минут), поэтому интервал не пересекает границу шарда или блока
+BUCKET_WIDTHS = (
+    SECOND_MS, 5 * SECOND_MS, 10 * SECOND_MS, 15 * SECOND_MS, 30 * SECOND_MS,
+    MINUTE_MS, 2 * MINUTE_MS, 5 * MINUTE_MS, 10 * MINUTE_MS, 15 * MINUTE_MS, 30 * MINUTE_MS,
+    HOUR_MS, 2 * HOUR_MS, 3 * HOUR_MS, 4 * HOUR_MS, 6 * HOUR_MS, 12 * HOUR_MS, DAY_MS,
+)
+
+# Сводки по интервалу для каждого столбца
+BUCKET_STATS = ('min', 'avg', 'max', 'p95')
+
+# Процентиль по методу ближайшего ранга
+PERCENTILE = 95
+
+# Сколько интервалов агрегата должно попасть в интервал сводки, чтобы считать по агрегату
+MIN_TIER_POINTS = 5
+
+
+def bucket_columns(metrics):
+    """Столбцы строки сводки: ts (начало интервала), count, {metric}_{stat}..."""
+    return ('ts', 'count') + tuple(f"{metric}_{stat}" for metric in metrics for stat in BUCKET_STATS)
+
+
+def pick_width(span_ms, buckets):
+    """Наименьшая допустимая ширина, при которой span_ms укладывается не больше чем в buckets интервалов"""
+    target = span_ms / max(buckets, 1)
+    for width in BUCKET_WIDTHS:
+        if width >= target:
+            return width
+    return -(-int(target) // DAY_MS) * DAY_MS
+
+
+def pick_bucket_tier(width):
+    """Самый крупный уровень агрегации, дающий не меньше MIN_TIER_POINTS точек на интервал; None - сырые данные"""
+    for table, step in reversed(ROLLUP_TIERS):
+        if width % step == 0 and width // step >= MIN_TIER_POINTS:
+            return table
+    return None
+
+
+def raw_source_sql(table, metrics, where):
+    """Подзапрос к сырым данным в виде источника bucket_sql: вес 1, min = avg = max = значение"""
+    columns = ", ".join(f"{metric} AS {metric}_min, {metric} AS {metric}_avg, {metric} AS {metric}_max"
+                        for metric in metrics)
+    return f"SELECT ts, 1 AS weight, {columns} FROM {table} WHERE {where}"
+
+
+def tier_source_sql(table, metrics):
+    """Подзапрос к уровню агрегации в виде источника bucket_sql: вес - число точек интервала"""
+    columns = ", ".join(f"{metric}_min, {metric}_avg, {metric}_max" for metric in metrics)
+    return (f"SELECT bucket AS ts, count AS weight, {columns} FROM {table} "
+            f"WHERE server_id = ? AND bucket >= ? AND bucket < ?")
+
+
+def bucket_sql(source, metrics, width):
+    """Запрос сводок min/avg/max/p95 по интервалам width мс
+
+    source - подзапрос со столбцами ts, weight и {metric}_min/_avg/_max.
+    Номер интервала - целочисленное деление ts на width. Среднее взвешивается
+    по weight; p95 - ближайший ранг среди значений _avg, найденный оконными
+    ROW_NUMBER и COUNT внутри интервала (по агрегату - среди средних его интервалов).
+    """
+    width = int(width)
+    ranks = ",\n".join(f"ROW_NUMBER() OVER w_{metric} AS {metric}_rank, COUNT({metric}_avg) OVER w_{metric} AS {metric}_n"
+                       for metric in metrics)
+    windows = ",\n".join(f"w_{metric} AS (PARTITION BY bucket ORDER BY {metric}_avg NULLS LAST "
+                         f"ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)"
+                         for metric in metrics)
+    stats = ",\n".join(
+        f"MIN({metric}_min), "
+        f"SUM({metric}_avg * weight) / SUM(CASE WHEN {metric}_avg IS NOT NULL THEN weight END), "
+        f"MAX({metric}_max), "
+        f"MAX(CASE WHEN {metric}_rank = ({metric}_n * {PERCENTILE} + 99) / 100 THEN {metric}_avg END)"
+        for metric in metrics)
+    return f"""
+        SELECT bucket * {width} AS ts, SUM(weight),
+            {stats}
+        FROM (
+            SELECT *, {ranks}
+            FROM (SELECT ts / {width} AS bucket, * FROM ({source}))
+            WINDOW {windows}
+        )
+        GROUP BY bucket
+        ORDER BY bucket
+    """
+
+
+def bucket_arrays(ts, values, width):
+    """Сводки min/avg/max/p95 по интервалам width мс, посчитанные numpy - строки как у bucket_sql
+
+    ts - int64 по возрастанию, values - float64 [столбец, точка], пропуски - NaN.
+    Для точек, которые уже распакованы в массивы (сжатые блоки).
+    """
+    import numpy as np
+
+    if not len(ts):
+        return []
+    buckets = ts // int(width)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    sizes = np.diff(np.r_[starts, len(ts)])
+    columns = [buckets[starts] * int(width), sizes]
+    for column in values:
+        valid = ~np.isnan(column)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        sums = np.add.reduceat(np.where(valid, column, 0.0), starts)
+        # Внутри интервала по возрастанию значения, NaN - в конце
+        ordered = column[np.lexsort((column, buckets))]
+        empty = counts == 0
+        last = starts + np.maximum(counts, 1) - 1
+        rank = starts + np.maximum((counts * PERCENTILE + 99) // 100, 1) - 1
+        for stat in (ordered[starts], sums / np.maximum(counts, 1), ordered[last], ordered[rank]):
+            columns.append(np.where(empty, np.nan, stat))
+    return [tuple(None if value != value else value for value in row)
+            for row in zip(*(column.tolist() for column in columns))]
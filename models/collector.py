@@ -0,0 +1,165 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from models.monitor import PrometheusMonitor
+from models.scheduler import PollScheduler
+
+
+class MetricsCollector:
+    """Фоновый сборщик метрик со всех зарегистрированных серверов"""
+
+    def __init__(self, database, alert_manager=None, interval=5, max_workers=8,
+                 flush_interval=5, batch_size=200, monitor_factory=PrometheusMonitor, scheduler=None):
+        self.db = database
+        self.alert_manager = alert_manager
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.monitor_factory = monitor_factory
+        # Планировщик решает, кого опрашивать на тике, и откладывает недоступные серверы
+        self.scheduler = scheduler if scheduler is not None else PollScheduler(interval)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self._monitors = {}   # url -> PrometheusMonitor
+        self._running = set()  # серверы, опрос которых еще выполняется
+        self._latest = {}     # url -> {instance: последний снимок метрик}
+        self._pending = []    # строки, ожидающие пакетной записи
+        self._last_flush = time.monotonic()
+
+    def start(self):
+        """Запускает фоновый поток сборщика"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает сборщик и записывает накопленные метрики"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+        self.flush()
+
+    def set_interval(self, url, interval):
+        """Задает индивидуальный интервал опроса сервера"""
+        self.scheduler.set_interval(url, interval)
+
+    def get_stats(self):
+        """Возвращает счетчики планировщика: опросы, пробы, неудачи и пропущенные тики"""
+        return self.scheduler.get_stats()
+
+    def get_latest(self, url, instance=None):
+        """Возвращает последний снимок метрик экземпляра (по умолчанию первого) или None"""
+        with self._lock:
+            instances = self._latest.get(url)
+        if not instances:
+            return None
+        if instance is None or instance not in instances:
+            instance = sorted(instances)[0]
+        return instances[instance]
+
+    def get_instances(self, url):
+        """Возвращает экземпляры сервера из последнего опроса"""
+        with self._lock:
+            return sorted(self._latest.get(url) or {})
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Ошибка в сборщике метрик: {e}")
+            self._stop_event.wait(0.5)
+
+    def tick(self, now=None):
+        """Запускает опрос серверов, у которых наступило время, и сбрасывает буфер записи"""
+        now = time.monotonic() if now is None else now
+        servers = list(self.db.servers)
+
+        with self._lock:
+            # Забываем удаленные серверы
+            for url in list(self._monitors):
+                if url not in servers:
+                    self._monitors.pop(url, None)
+                    self._latest.pop(url, None)
+                    self.scheduler.forget(url)
+
+            # Сервер, опрос которого еще идет, пропускает тик
+            due = self.scheduler.due(servers, self._running, now)
+            for url, _ in due:
+                self._running.add(url)
+
+        for url, probe in due:
+            self._executor.submit(self._poll, url, probe)
+
+        with self._lock:
+            pending = len(self._pending)
+        if pending and (pending >= self.batch_size or now - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def _poll(self, url, probe=False):
+        """Опрашивает один сервер и ставит метрики в очередь на запись
+
+        probe=True - недоступный сервер проверяется только запросом up.
+        """
+        try:
+            with self._lock:
+                monitor = self._monitors.get(url)
+            if monitor is None:
+                monitor = self.monitor_factory(url)
+                with self._lock:
+                    self._monitors[url] = monitor
+
+            if probe:
+                try:
+                    ok = monitor.probe()
+                except Exception:
+                    ok = False
+                self.scheduler.report(url, ok)
+                return
+
+            try:
+                instances = monitor.get_all_instances()
+            except Exception as e:
+                print(f"Ошибка при опросе сервера {url}: {e}")
+                instances = None
+
+            with self._lock:
+                self._latest[url] = instances
+            self.scheduler.report(url, any(s['network'] == '1' for s in (instances or {}).values()))
+
+            timestamp = int(time.time() * 1000)
+            for instance, snapshot in sorted((instances or {}).items()):
+                if not (snapshot['cpu'] and snapshot['ram'] and snapshot['rom']):
+                    continue
+                cpu_info, ram_info, rom_info = snapshot['cpu'], snapshot['ram'], snapshot['rom']
+                row = (url, instance, timestamp,
+                       float(cpu_info.get('usage_precent', 0)),
+                       float(ram_info.get('usage_precent', 0)),
+                       float(cpu_info.get('temperatur', 0)),
+                       rom_info)
+                with self._lock:
+                    self._pending.append(row)
+                if self.alert_manager:
+                    self.alert_manager.check_alerts(url, cpu_info, ram_info, rom_info, instance)
+        finally:
+            with self._lock:
+                self._running.discard(url)
+
+    def flush(self):
+        """Записывает накопленные метрики одной транзакцией"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+        if rows:
+            try:
+                self.db.save_metrics_batch(rows)
+            except Exception as e:
+                print(f"Ошибка при записи метрик: {e}")
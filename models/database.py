@@ -1,40 +1,375 @@
 import sqlite3 
 import datetime
+import json
 import threading
+import time
+from itertools import chain
+
+from models.db_pool import ReadPool, TUNING_PROFILES, apply_pragmas
+from models.db_writer import DatabaseWriter
+from models.retention import RetentionService
+from models.shards import ShardSet
+from models.blocks import BLOCKS_HISTORY_SQL, BLOCKS_SCHEMA, BLOCK_MS, block_start, decode_block, decode_rows, decode_rows_arrays, encode_block
+from models.buckets import bucket_arrays, bucket_sql, pick_bucket_tier, pick_width, raw_source_sql, tier_source_sql
+from models.rollup import ROLLUP_TIERS, aggregate, pick_tier, rollup_history_sql, rollup_schema, rollup_upsert
+
+# История метрик сервера: диапазон по первичному ключу (server_id, ts), без сортировки
+METRICS_HISTORY_SQL = """
+    SELECT ts, cpu_usage, ram_usage, temperature
+    FROM {schema}.metrics
+    WHERE server_id = ? AND ts >= ?
+    ORDER BY ts
+"""
+
+# То же с верхней границей: дочитывание истории старше кольца последних точек
+METRICS_RANGE_SQL = """
+    SELECT ts, cpu_usage, ram_usage, temperature
+    FROM {schema}.metrics
+    WHERE server_id = ? AND ts >= ? AND ts < ?
+    ORDER BY ts
+"""
+
+# Столбцы значений истории метрик (после ts)
+HISTORY_COLUMNS = ('cpu_usage', 'ram_usage', 'temperature')
+
+# История одного тома сервера: диапазон по ключу (server_id, volume_id, ts)
+DISK_HISTORY_SQL = """
+    SELECT ts, used_pct, free_gb, total_gb
+    FROM {schema}.disk_metrics
+    WHERE server_id = ? AND volume_id = ? AND ts >= ?
+    ORDER BY ts
+"""
+
+
+# Неподтвержденные оповещения (опрос окна каждые 5 с): частичные индексы idx_alerts_unacknowledged
+# (серверы адреса) и idx_alerts_unacknowledged_time (все серверы) читаются сразу в порядке выдачи
+UNACKNOWLEDGED_ALERTS_SQL = """
+    SELECT * FROM alerts
+    WHERE {condition} AND acknowledged = FALSE
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+"""
+
+# Последние инциденты серверов: индекс (server_id, timestamp)
+INCIDENTS_SQL = """
+    SELECT * FROM incidents
+    WHERE {condition}
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+"""
+
+# Страница событий от новых к старым: частичные индексы idx_incidents_active_time (активные
+# инциденты всех серверов) и idx_incidents_active (серверы адреса) дают этот порядок без сортировки
+KEYSET_PAGE_SQL = """
+    SELECT * FROM {table}
+    WHERE {where}
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+"""
+
+
+def to_epoch_ms(value):
+    """Переводит метку времени (мс эпохи, datetime или строку '%Y-%m-%d %H:%M:%S') в мс эпохи"""
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, str):
+        return int(datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp() * 1000)
+    return int(value)
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def disk_rows(rom_info):
+    """Разворачивает rom_info в строки (том, used_pct, free_gb, total_gb)"""
+    rows = []
+    for volume, info in (rom_info or {}).items():
+        if isinstance(info, dict):
+            rows.append((volume, _to_float(info.get('usage_precent')),
+                         _to_float(info.get('available')), _to_float(info.get('all'))))
+    return rows
+
 
 class Database:
-    def __init__(self, db_file):
+    def __init__(self, db_file, profile='balanced', read_pool_size=4, lock_timeout=5.0,
+                 migrate_in_background=True, shard_period=None, storage='rows',
+                 cache_points=None, cache_max_bytes=16 * 1024 * 1024):
+        if storage not in ('rows', 'blocks'):
+            raise ValueError(f"Неизвестный способ хранения: {storage}")
+        if storage == 'blocks' and shard_period:
+            raise ValueError("Сжатые блоки не поддерживаются вместе с шардами")
         self.db_file = db_file
         self._lock = threading.Lock()
+        self.profile = TUNING_PROFILES[profile]
+        # Сколько писатель ждет освобождения базы, прежде чем сдаться
+        self.lock_timeout = lock_timeout
+        self._contention = {'lock_waits': 0, 'lock_wait_time': 0.0}
+        self._contention_lock = threading.Lock()
+        # Поток записи (start_writer); без него каждая запись открывает свое соединение
+        self.writer = None
+        # Соответствие (url, instance) <-> id, чтобы не искать сервер запросом при каждой записи
+        self._server_ids = {}
+        self._server_keys = {}
+        # Словарь томов name <-> id (таблица volumes)
+        self._volume_ids = {}
+        self._ids_lock = threading.Lock()
+        self._last_ts = 0
+        self._migration_thread = None
+        # Сырые метрики в файлах по дням/неделям ('day', 'week'); None - все в основной базе
+        self.shards = ShardSet(db_file, shard_period, self._create_raw_tables) if shard_period else None
+        # 'blocks' - закрытые интервалы сырых метрик сжимаются в metric_blocks. Графики (сводки, массивы)
+        # распаковывают их сразу в numpy; история списком кортежей читается медленнее, чем строками
+        self.storage = storage
+        # Начало открытого блока по server_id: точки в нем еще лежат строками metrics
+        self._block_heads = {}
+        # Кольца последних cache_points точек серверов в памяти (нужен numpy); None - история только из SQLite
+        self.recent = None
+        if cache_points:
+            from models.recent_cache import RecentMetricsCache
+            self.recent = RecentMetricsCache(now_ms(), cache_points, cache_max_bytes, len(HISTORY_COLUMNS))
         self.conn = sqlite3.connect(db_file)
         self.cursor = self.conn.cursor()
+        # Режим auto_vacuum задается до перевода новой базы в WAL - тот уже записывает файл
+        self._enable_incremental_vacuum()
+        apply_pragmas(self.conn, self.profile, journal=True)
         self.create_database()
         self.update_servers()
+        self._load_server_ids()
+        self._load_volume_ids()
+        # Читатели берут соединения из пула и в режиме WAL не блокируют запись
+        self.read_pool = ReadPool(db_file, read_pool_size, self.profile)
+        if migrate_in_background and self.has_legacy_metrics():
+            self.start_metrics_migration()
 
-    def get_connection(self):
+    def get_connection(self, timeout=5.0):
         """Создает новое соединение для использования в других потоках"""
-        return sqlite3.connect(self.db_file)
+        conn = sqlite3.connect(self.db_file, timeout=timeout)
+        apply_pragmas(conn, self.profile)
+        return conn
+
+    def run_write(self, conn, write):
+        """Выполняет транзакцию write(cursor) и фиксирует ее
+
+        Соединение открывается с timeout=0: при занятой базе транзакция
+        повторяется с нарастающей паузой, а время ожидания учитывается
+        в get_contention_stats.
+        """
+        delay = 0.001
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                result = write(conn.cursor())
+                conn.commit()
+                return result
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                # Экземпляры и тома, созданные в отмененной транзакции, убираем из соответствия
+                self._load_server_ids()
+                self._load_volume_ids()
+                if 'locked' not in str(e) or time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                with self._contention_lock:
+                    self._contention['lock_waits'] += 1
+                    self._contention['lock_wait_time'] += delay
+                delay = min(delay * 2, 0.05)
+            except Exception:
+                conn.rollback()
+                self._load_server_ids()
+                self._load_volume_ids()
+                raise
+
+    def get_contention_stats(self):
+        """Ожидание блокировок писателями и ожидание свободного соединения читателями"""
+        with self._contention_lock:
+            stats = dict(self._contention)
+        pool = self.read_pool.get_stats()
+        stats.update({f'read_pool_{name}': value for name, value in pool.items()})
+        return stats
+
+    def get_cache_stats(self):
+        """Попадания и промахи колец последних точек, вытеснения и занятая память; {} без кэша"""
+        return self.recent.get_stats() if self.recent is not None else {}
+
+    def close(self):
+        """Останавливает поток записи и закрывает все соединения"""
+        self.close_writer()
+        self.read_pool.close()
+        self.conn.close()
+
+    def start_writer(self, flush_interval=0.05, batch_size=500, max_queue=10000):
+        """Переводит запись метрик, оповещений и инцидентов на отдельный поток с очередью"""
+        if self.writer is None:
+            self.writer = DatabaseWriter(self, flush_interval, batch_size, max_queue).start()
+        return self.writer
+
+    def flush_writes(self):
+        """Ждет фиксации всех записей, поставленных в очередь"""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close_writer(self):
+        """Записывает остаток очереди и останавливает поток записи"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def _create_raw_tables(self, cursor, schema='main'):
+        """Создает таблицы сырых рядов в основной базе или подключенном шарде"""
+        # Таблица метрик: время в мс эпохи, строки физически упорядочены по (server_id, ts)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.metrics (
+                server_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                cpu_usage REAL,
+                ram_usage REAL,
+                temperature REAL,
+                PRIMARY KEY (server_id, ts)
+            ) WITHOUT ROWID""")
+
+        # Метрики дисков: строка на том, упорядочены по (server_id, volume_id, ts).
+        # Ссылка на volumes возможна только внутри основной базы
+        foreign_key = ",\n                FOREIGN KEY(volume_id) REFERENCES volumes(id)" if schema == 'main' else ""
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.disk_metrics (
+                server_id INTEGER NOT NULL,
+                volume_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                used_pct REAL,
+                free_gb REAL,
+                total_gb REAL,
+                PRIMARY KEY (server_id, volume_id, ts){foreign_key}
+            ) WITHOUT ROWID""")
+
+    def _raw_schemas(self, conn, start_ms, end_ms=None):
+        """Базы с сырыми рядами за интервал по возрастанию времени: основная, затем шарды
+
+        Шарды подключаются только для чтения по одному, поэтому интервал может
+        охватывать сколько угодно шардов.
+        """
+        yield 'main'
+        if self.shards is None:
+            return
+        for start in self.shards.overlapping(start_ms, end_ms):
+            yield from self.shards.attach(conn, [start], readonly=True)
+
+    def _server_volume_ids(self, cursor, schema, server_id):
+        """id томов с записями сервера в базе schema по возрастанию
+
+        Следующий том ищется одним переходом по ключу (server_id, volume_id, ts),
+        поэтому тома других серверов и строки самих томов не перебираются.
+        """
+        volume_ids = []
+        while True:
+            row = cursor.execute(f"""
+                SELECT volume_id FROM {schema}.disk_metrics
+                WHERE server_id = ? AND volume_id > ?
+                ORDER BY volume_id LIMIT 1
+            """, (server_id, volume_ids[-1] if volume_ids else -1)).fetchone()
+            if row is None:
+                return volume_ids
+            volume_ids.append(row[0])
+
+    def _server_volumes(self, cursor, schema, server_id):
+        """Тома с записями сервера в базе schema: [(имя, volume_id)] по имени"""
+        with self._ids_lock:
+            names = {volume_id: name for name, volume_id in self._volume_ids.items()}
+        return sorted((names[volume_id], volume_id) for volume_id in self._server_volume_ids(cursor, schema, server_id)
+                      if volume_id in names)
+
+    def _raw_schema_for(self, ts):
+        """База, в которую пишется точка ts"""
+        if self.shards is None:
+            return 'main'
+        return self.shards.schema(self.shards.start_of(ts))
+
+    def _enable_incremental_vacuum(self):
+        """Включает auto_vacuum=INCREMENTAL, чтобы очистка возвращала страницы файлу порциями
+
+        Режим задается только новой базе, до создания таблиц. Существующую
+        перестраивает convert_incremental_vacuum по запросу пользователя.
+        """
+        if self.cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            return
+        self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    def needs_incremental_vacuum(self):
+        """База создана без auto_vacuum=INCREMENTAL: очистка не возвращает страницы файлу"""
+        # Долгоживущее соединение помнит режим на момент открытия - спрашиваем новое
+        conn = self.get_connection()
+        try:
+            return conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+        finally:
+            conn.close()
+
+    def convert_incremental_vacuum(self):
+        """Перестраивает существующую базу VACUUM в режим auto_vacuum=INCREMENTAL
+
+        Обслуживание по запросу пользователя: VACUUM переписывает весь файл,
+        держит блокировку записи до конца и требует еще столько же места
+        на диске. Поток записи на это время приостанавливается, и новые
+        записи ждут в очереди, а не теряются по lock_timeout. Пока идет
+        перенос старой таблицы метрик, база не перестраивается.
+        Возвращает True, если база перестроена.
+        """
+        if self.has_legacy_metrics() or not self.needs_incremental_vacuum():
+            return False
+        if self.writer is None:
+            return self._vacuum_incremental()
+        with self.writer.paused():
+            return self._vacuum_incremental()
+
+    def _vacuum_incremental(self):
+        conn = self.get_connection(timeout=self.lock_timeout)
+        try:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return True
+        finally:
+            conn.close()
 
     def create_database(self):
+        # Сервер - пара (адрес Prometheus, экземпляр). Строка с пустым instance
+        # соответствует самому адресу в списке серверов
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS servers (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT UNIQUE
+                url TEXT,
+                instance TEXT NOT NULL DEFAULT '',
+                UNIQUE(url, instance)
             )""")
+        self._migrate_servers_instance()
+
+        # Таблица метрик старой схемы (строковые метки времени) переносится в фоне
+        self._detach_legacy_metrics()
 
-        # Таблица метрик (расширенная)
+        # Словарь томов ('C:', '/', ...)
         self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS metrics (
+            CREATE TABLE IF NOT EXISTS volumes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                server_id INTEGER,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                cpu_usage REAL,
-                ram_usage REAL,
-                temperature REAL,
-                disk_usage TEXT,  -- JSON для хранения данных по дискам
-                FOREIGN KEY(server_id) REFERENCES servers(id)
+                name TEXT NOT NULL UNIQUE
             )""")
 
+        self._create_raw_tables(self.cursor)
+        self.cursor.execute(BLOCKS_SCHEMA)
+        self._split_disk_usage()
+
+        # Агрегаты метрик по интервалам; при первом создании заполняются из уже собранных метрик
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing = {row[0] for row in self.cursor.fetchall()}
+        for table, _ in ROLLUP_TIERS:
+            self.cursor.execute(rollup_schema(table))
+        if any(table not in existing for table, _ in ROLLUP_TIERS):
+            self.rebuild_rollups(self.cursor)
+
         # Таблица инцидентов
         self.cursor.execute("""
             CREATE TABLE IF NOT EXISTS incidents (
@@ -62,150 +397,914 @@ class Database:
                 FOREIGN KEY(server_id) REFERENCES servers(id)
             )""")
 
-        # Индексы для оптимизации запросов
-        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp)")
-        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_server ON metrics(server_id)")
+        # Прогресс загрузки истории из Prometheus (время в секундах эпохи)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS backfill_progress (
+                server_id INTEGER PRIMARY KEY,
+                done_until INTEGER,
+                FOREIGN KEY(server_id) REFERENCES servers(id)
+            )""")
+
+        # Индексы для оптимизации запросов. Выборки по серверам идут в порядке времени
+        # по (server_id, timestamp); SQLite читает индекс и в обратном порядке для DESC
         self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incidents_timestamp ON incidents(timestamp)")
-        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incidents_server ON incidents(server_id)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incidents_server_time ON incidents(server_id, timestamp)")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_incidents_server")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incidents_type_time ON incidents(type, timestamp)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_incidents_severity_time ON incidents(severity, timestamp)")
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_incidents_active ON incidents(server_id, timestamp)
+            WHERE resolved = FALSE""")
+        # Активные инциденты всех серверов (вид вкладки по умолчанию) читаются по времени без сортировки
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_incidents_active_time ON incidents(timestamp)
+            WHERE resolved = FALSE""")
         self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts(timestamp)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_server_time ON alerts(server_id, timestamp)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_type_time ON alerts(type, timestamp)")
+        # Частичный индекс только по неподтвержденным: размер не растет вместе с историей.
+        # Запрос использует его, только если содержит то же условие acknowledged = FALSE
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_alerts_unacknowledged ON alerts(server_id, timestamp)
+            WHERE acknowledged = FALSE""")
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_alerts_unacknowledged_time ON alerts(timestamp)
+            WHERE acknowledged = FALSE""")
         
         self.conn.commit()
 
+    def _detach_legacy_metrics(self):
+        """Переименовывает таблицу metrics старой схемы в metrics_legacy"""
+        self.cursor.execute("PRAGMA table_info(metrics)")
+        columns = [row[1] for row in self.cursor.fetchall()]
+        if 'timestamp' not in columns:
+            return
+        self.cursor.execute("ALTER TABLE metrics RENAME TO metrics_legacy")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_metrics_timestamp")
+        self.cursor.execute("DROP INDEX IF EXISTS idx_metrics_server")
+        self.conn.commit()
+
+    def _split_disk_usage(self):
+        """Переносит JSON из столбца metrics.disk_usage в disk_metrics и очищает его"""
+        self.cursor.execute("PRAGMA table_info(metrics)")
+        if 'disk_usage' not in [row[1] for row in self.cursor.fetchall()]:
+            return
+        self.cursor.execute("SELECT server_id, ts, disk_usage FROM metrics WHERE disk_usage IS NOT NULL")
+        self._write_disks(self.cursor, self.cursor.fetchall())
+        self.cursor.execute("UPDATE metrics SET disk_usage = NULL WHERE disk_usage IS NOT NULL")
+        self.conn.commit()
+
+    def has_legacy_metrics(self):
+        """Есть ли еще не перенесенные метрики старой схемы"""
+        conn = self.get_connection()
+        try:
+            return conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metrics_legacy'"
+            ).fetchone() is not None
+        finally:
+            conn.close()
+
+    def start_metrics_migration(self, chunk_size=5000, pause=0.05):
+        """Переносит метрики старой схемы в фоне, не останавливая запись и чтение"""
+        if self._migration_thread and self._migration_thread.is_alive():
+            return
+
+        def run():
+            try:
+                while self.migrate_legacy_metrics(chunk_size):
+                    time.sleep(pause)
+            except Exception as e:
+                print(f"Ошибка при переносе метрик: {e}")
+
+        self._migration_thread = threading.Thread(target=run, daemon=True)
+        self._migration_thread.start()
+
+    def migrate_legacy_metrics(self, chunk_size=5000):
+        """Переносит одну порцию метрик старой схемы (сначала самые новые)
+
+        Порция копируется и удаляется из metrics_legacy одной транзакцией,
+        поэтому прерванный перенос продолжается с того же места.
+        Возвращает True, если перенос не завершен.
+        """
+        if not self.has_legacy_metrics():
+            return False
+
+        def move(cursor):
+            cursor.execute("SELECT id FROM metrics_legacy ORDER BY id DESC LIMIT ?", (chunk_size,))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                cursor.execute("DROP TABLE metrics_legacy")
+                return False
+            low, high = ids[-1], ids[0]
+            # Строки хранили локальное время; 'utc' переводит его в UTC перед расчетом эпохи
+            cursor.execute("""
+                INSERT OR IGNORE INTO metrics (server_id, ts, cpu_usage, ram_usage, temperature)
+                SELECT server_id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000,
+                       cpu_usage, ram_usage, temperature
+                FROM metrics_legacy
+                WHERE id BETWEEN ? AND ? AND server_id IS NOT NULL AND timestamp IS NOT NULL
+            """, (low, high))
+            cursor.execute("""
+                SELECT server_id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000,
+                       cpu_usage, ram_usage, temperature, disk_usage
+                FROM metrics_legacy
+                WHERE id BETWEEN ? AND ? AND server_id IS NOT NULL AND timestamp IS NOT NULL
+            """, (low, high))
+            rows = cursor.fetchall()
+            self._write_rollups(cursor, [row[:5] for row in rows])
+            self._write_disks(cursor, [(row[0], row[1], row[5]) for row in rows if row[5]])
+            cursor.execute("DELETE FROM metrics_legacy WHERE id BETWEEN ? AND ?", (low, high))
+            return True
+
+        conn = self.get_connection(timeout=0)
+        try:
+            return self.run_write(conn, move)
+        finally:
+            conn.close()
+
+    def _migrate_servers_instance(self):
+        """Переводит старую таблицу servers (url UNIQUE) на ключ (url, instance)"""
+        self.cursor.execute("PRAGMA table_info(servers)")
+        columns = [row[1] for row in self.cursor.fetchall()]
+        if 'instance' in columns:
+            return
+        self.cursor.execute("""
+            CREATE TABLE servers_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT,
+                instance TEXT NOT NULL DEFAULT '',
+                UNIQUE(url, instance)
+            )""")
+        self.cursor.execute("INSERT INTO servers_new (id, url) SELECT id, url FROM servers")
+        self.cursor.execute("DROP TABLE servers")
+        self.cursor.execute("ALTER TABLE servers_new RENAME TO servers")
+        self.conn.commit()
+
     def _refresh_servers_list(self):
         """Обновляет список серверов (внутренний метод)"""
-        self.servers = []
-        self.cursor.execute("SELECT url FROM servers")
-        rows = self.cursor.fetchall()
-        for row in rows:
-            self.servers.append(row[0])
+        self.cursor.execute("SELECT url FROM servers WHERE instance = '' ORDER BY id")
+        # Новый список подменяет прежний одним присваиванием: сборщик в другом потоке
+        # не должен увидеть пустой или недостроенный список
+        self.servers = [row[0] for row in self.cursor.fetchall()]
 
     def update_servers(self):
         with self._lock:
             self._refresh_servers_list()
             if not self.servers:
                 # Добавляем сервер по умолчанию напрямую, без рекурсивного вызова
-                self.cursor.execute("INSERT OR REPLACE INTO servers (url) VALUES (?)", ("http://localhost:9090",))
+                self.cursor.execute("INSERT OR IGNORE INTO servers (url) VALUES (?)", ("http://localhost:9090",))
                 self.conn.commit()
                 self._refresh_servers_list()
+                self._load_server_ids(self.cursor)
 
     def add_server(self, url, name=None):
         try:
             with self._lock:
                 if name is None:
                     name = url
-                self.cursor.execute("INSERT OR REPLACE INTO servers (url) VALUES (?)", (url,))
+                self.cursor.execute("INSERT OR IGNORE INTO servers (url) VALUES (?)", (url,))
                 self.conn.commit()
                 # Обновляем список серверов без рекурсивного вызова
                 self._refresh_servers_list()
+                self._load_server_ids(self.cursor)
         except Exception as e:
             print(f"Error adding server: {e}")
 
     def delete_server(self, url):
         with self._lock:
             self.cursor.execute("DELETE FROM servers WHERE url = ?", (url,))
+            # События удаленных серверов (и оставшиеся от прежних удалений) больше не показываются:
+            # запрос по всем серверам не фильтрует по списку id
+            for table in ('alerts', 'incidents'):
+                self.cursor.execute(f"DELETE FROM {table} WHERE server_id NOT IN (SELECT id FROM servers)")
             self.conn.commit()
             # Обновляем список серверов без рекурсивного вызова
             self._refresh_servers_list()
+            self._load_server_ids(self.cursor)
+        if self.recent is not None:
+            # id удаленного сервера может достаться новому
+            self.recent.discard()
 
-    def get_server_id(self, url):
-        with self._lock:
-            self.cursor.execute("SELECT id FROM servers WHERE url = ?", (url,))
-            result = self.cursor.fetchone()
-            return result[0] if result else None
+    def _load_server_ids(self, cursor=None):
+        """Перечитывает соответствие серверов и их id и подменяет его целиком"""
+        if cursor is None:
+            conn = self.get_connection()
+            try:
+                rows = conn.execute("SELECT id, url, instance FROM servers").fetchall()
+            finally:
+                conn.close()
+        else:
+            cursor.execute("SELECT id, url, instance FROM servers")
+            rows = cursor.fetchall()
+        server_ids = {(url, instance): server_id for server_id, url, instance in rows}
+        server_keys = {server_id: key for key, server_id in server_ids.items()}
+        with self._ids_lock:
+            self._server_ids, self._server_keys = server_ids, server_keys
+
+    def _load_volume_ids(self):
+        """Перечитывает словарь томов"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute("SELECT id, name FROM volumes").fetchall()
+        finally:
+            conn.close()
+        with self._ids_lock:
+            self._volume_ids = {name: volume_id for volume_id, name in rows}
+
+    def get_volume_id(self, name, cursor=None):
+        """Возвращает id тома; с cursor - добавляет отсутствующий том в словарь"""
+        with self._ids_lock:
+            volume_id = self._volume_ids.get(name)
+        if volume_id or cursor is None:
+            return volume_id
+        cursor.execute("INSERT OR IGNORE INTO volumes (name) VALUES (?)", (name,))
+        cursor.execute("SELECT id FROM volumes WHERE name = ?", (name,))
+        volume_id = cursor.fetchone()[0]
+        with self._ids_lock:
+            self._volume_ids[name] = volume_id
+        return volume_id
 
-    def get_server_id_threadsafe(self, url, cursor):
-        """Потокобезопасное получение ID сервера"""
-        cursor.execute("SELECT id FROM servers WHERE url = ?", (url,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+    def get_server_id(self, url, instance=''):
+        with self._ids_lock:
+            return self._server_ids.get((url, instance))
 
-    def save_metrics(self, server_url, cpu_usage, ram_usage, temperature, disk_usage):
+    def get_server_ids(self):
+        """Возвращает id всех серверов (потокобезопасно)"""
+        with self._ids_lock:
+            return list(self._server_keys)
+
+    def get_server_key(self, server_id):
+        """Возвращает (url, instance) сервера по его id или None"""
+        with self._ids_lock:
+            return self._server_keys.get(server_id)
+
+    def _server_name(self, server_id):
+        key = self.get_server_key(server_id)
+        if key is None:
+            return None
+        url, instance = key
+        return f"{url} / {instance}" if instance else url
+
+    def get_server_id_threadsafe(self, url, cursor, instance='', create=False):
+        """Потокобезопасное получение ID сервера (из соответствия в памяти)"""
+        with self._ids_lock:
+            server_id = self._server_ids.get((url, instance))
+            registered = (url, '') in self._server_ids
+        if server_id or not instance or not create or not registered:
+            return server_id
+        # Новый экземпляр зарегистрированного сервера добавляется при первой записи
+        cursor.execute("INSERT OR IGNORE INTO servers (url, instance) VALUES (?, ?)", (url, instance))
+        cursor.execute("SELECT id FROM servers WHERE url = ? AND instance = ?", (url, instance))
+        server_id = cursor.fetchone()[0]
+        with self._ids_lock:
+            self._server_ids[(url, instance)] = server_id
+            self._server_keys[server_id] = (url, instance)
+        return server_id
+
+    def _server_filter(self, server_url=None):
+        """Условие на server_id для всех экземпляров адреса (или всех серверов)"""
+        if server_url is None:
+            # Без списка id: запрос по всем серверам читает индекс по времени без сортировки
+            return "TRUE", []
+        with self._ids_lock:
+            ids = [server_id for (url, _), server_id in self._server_ids.items()
+                   if server_url is None or url == server_url]
+        return f"server_id IN ({', '.join('?' * len(ids))})", ids
+
+    def _with_server_names(self, rows):
+        """Добавляет к строкам имя сервера (url или 'url / instance') по server_id"""
+        return [tuple(row) + (self._server_name(row[1]),) for row in rows]
+
+    def get_instances(self, url):
+        """Возвращает экземпляры, обнаруженные за адресом Prometheus (потокобезопасно)"""
+        with self._ids_lock:
+            return sorted(instance for (server_url, instance) in self._server_ids if server_url == url and instance)
+
+    def has_history(self, url, instance=''):
+        """Есть ли сохраненная история сервера (по часовым агрегатам, они есть для любых сырых точек)"""
+        server_id = self.get_server_id(url, instance)
+        if not server_id:
+            return False
+        conn = self.read_pool.acquire()
+        try:
+            return conn.execute("SELECT 1 FROM metrics_1h WHERE server_id = ? LIMIT 1",
+                                (server_id,)).fetchone() is not None
+        finally:
+            self.read_pool.release(conn)
+
+    def save_metrics(self, server_url, cpu_usage, ram_usage, temperature, disk_usage, instance=''):
         """Сохраняет метрики в базу данных (потокобезопасно)"""
-        conn = self.get_connection()
+        # Метки этого процесса строго возрастают, чтобы две записи подряд не совпали по ключу
+        with self._ids_lock:
+            self._last_ts = max(now_ms(), self._last_ts + 1)
+            current_time = self._last_ts
+        self.save_metrics_batch([(server_url, instance, current_time, cpu_usage, ram_usage, temperature, disk_usage)])
+
+    def save_metrics_batch(self, rows):
+        """Сохраняет пачку метрик одной транзакцией (потокобезопасно)
+
+        rows - список кортежей (server_url, instance, timestamp, cpu_usage, ram_usage, temperature, disk_usage),
+        timestamp - мс эпохи (строки и datetime тоже принимаются)
+        """
+        if self.writer is not None:
+            for row in rows:
+                self.writer.submit('metrics', row)
+            return
+        conn = self.get_connection(timeout=0)
         try:
-            cursor = conn.cursor()
-            server_id = self.get_server_id_threadsafe(server_url, cursor)
+            values = self.run_write(conn, lambda cursor: self._write_metrics(cursor, rows))
+        finally:
+            conn.close()
+        self._metrics_committed(values)
+
+    def _metrics_committed(self, values):
+        """Передает зафиксированные строки метрик в кольца последних точек"""
+        if self.recent is not None and values:
+            self.recent.add(values)
+
+    def _write_metrics(self, cursor, rows):
+        """Вставляет строки метрик без фиксации; возвращает вставленные (server_id, ts, cpu, ram, temperature)"""
+        if self.shards is not None:
+            # Шарды подключаются до первой вставки: внутри транзакции ATTACH недоступен
+            starts = {self.shards.start_of(to_epoch_ms(row[2])) for row in rows}
+            self.shards.attach(cursor.connection, sorted(starts))
+        server_ids = {}
+        values = []
+        disks = []
+        for server_url, instance, timestamp, cpu_usage, ram_usage, temperature, disk_usage in rows:
+            key = (server_url, instance)
+            if key not in server_ids:
+                server_ids[key] = self.get_server_id_threadsafe(server_url, cursor, instance, create=True)
+            server_id = server_ids[key]
             if server_id:
-                import json
-                disk_usage_json = json.dumps(disk_usage) if disk_usage else None
-                # Явно указываем текущее время при сохранении
-                current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                ts = to_epoch_ms(timestamp)
+                values.append((server_id, ts, cpu_usage, ram_usage, temperature))
+                if disk_usage:
+                    disks.append((server_id, ts, disk_usage))
+        by_schema = {}
+        for value in values:
+            by_schema.setdefault(self._raw_schema_for(value[1]), []).append(value)
+        for schema, schema_values in by_schema.items():
+            cursor.executemany(f"""
+                INSERT OR REPLACE INTO {schema}.metrics (server_id, ts, cpu_usage, ram_usage, temperature)
+                VALUES (?, ?, ?, ?, ?)
+            """, schema_values)
+        # Агрегаты всегда в основной базе
+        self._write_rollups(cursor, values)
+        self._write_disks(cursor, disks, route=True)
+        if self.storage == 'blocks':
+            self._seal_blocks(cursor, values)
+        return values
+
+    def _block_head(self, cursor, server_id):
+        """Начало открытого блока сервера: блок самой поздней сохраненной точки"""
+        if server_id not in self._block_heads:
+            cursor.execute("SELECT MAX(ts) FROM metrics WHERE server_id = ?", (server_id,))
+            raw = cursor.fetchone()[0]
+            cursor.execute("SELECT MAX(last_ts) FROM metric_blocks WHERE server_id = ?", (server_id,))
+            sealed = cursor.fetchone()[0]
+            self._block_heads[server_id] = block_start(max(raw or 0, sealed or 0))
+        return self._block_heads[server_id]
+
+    def _seal_blocks(self, cursor, values):
+        """Упаковывает сырые точки серверов старше открытого блока в metric_blocks
+
+        Точки открытого блока остаются строками metrics, поэтому запись не
+        перекодирует блок; опоздавшие точки объединяются с уже сжатым блоком.
+        """
+        latest = {}
+        for server_id, ts, *_ in values:
+            latest[server_id] = max(ts, latest.get(server_id, 0))
+        for server_id, ts in latest.items():
+            head = max(block_start(ts), self._block_head(cursor, server_id))
+            self._block_heads[server_id] = head
+            cursor.execute("""
+                SELECT ts, cpu_usage, ram_usage, temperature FROM metrics
+                WHERE server_id = ? AND ts < ? ORDER BY ts
+            """, (server_id, head))
+            rows = cursor.fetchall()
+            if not rows:
+                continue
+            blocks = {}
+            for row in rows:
+                blocks.setdefault(block_start(row[0]), []).append(row)
+            for start, samples in blocks.items():
+                cursor.execute("SELECT data FROM metric_blocks WHERE server_id = ? AND block_start = ?",
+                               (server_id, start))
+                existing = cursor.fetchone()
+                if existing:
+                    # Новые значения заменяют сохраненные с той же меткой, как INSERT OR REPLACE
+                    merged = {sample[0]: sample for sample in decode_block(existing[0])}
+                    merged.update((sample[0], sample) for sample in samples)
+                    samples = [merged[ts] for ts in sorted(merged)]
                 cursor.execute("""
-                    INSERT INTO metrics (server_id, timestamp, cpu_usage, ram_usage, temperature, disk_usage)
+                    INSERT OR REPLACE INTO metric_blocks (server_id, block_start, count, first_ts, last_ts, data)
                     VALUES (?, ?, ?, ?, ?, ?)
-                """, (server_id, current_time, cpu_usage, ram_usage, temperature, disk_usage_json))
-                conn.commit()
+                """, (server_id, start, len(samples), samples[0][0], samples[-1][0], encode_block(samples)))
+            cursor.execute("DELETE FROM metrics WHERE server_id = ? AND ts < ?", (server_id, head))
+
+    def _write_rollups(self, cursor, samples):
+        """Добавляет строки (server_id, ts, cpu_usage, ram_usage, temperature) в агрегаты всех уровней"""
+        if not samples:
+            return
+        for table, step in ROLLUP_TIERS:
+            cursor.executemany(rollup_upsert(table), aggregate(samples, step))
+
+    def rebuild_rollups(self, cursor, chunk_size=10000):
+        """Пересчитывает агрегаты всех уровней из таблицы metrics"""
+        for table, _ in ROLLUP_TIERS:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("SELECT DISTINCT server_id FROM metrics")
+        for (server_id,) in cursor.fetchall():
+            last_ts = -1
+            while True:
+                cursor.execute("""
+                    SELECT server_id, ts, cpu_usage, ram_usage, temperature FROM metrics
+                    WHERE server_id = ? AND ts > ? ORDER BY ts LIMIT ?
+                """, (server_id, last_ts, chunk_size))
+                samples = cursor.fetchall()
+                if not samples:
+                    break
+                self._write_rollups(cursor, samples)
+                last_ts = samples[-1][1]
+
+    def _write_disks(self, cursor, rows, route=False):
+        """Вставляет метрики томов; rows - (server_id, ts, rom_info), rom_info - dict или JSON
+
+        route=True - строки раскладываются по шардам (они уже подключены), иначе - в основную базу.
+        """
+        values = {}
+        for server_id, ts, rom_info in rows:
+            if isinstance(rom_info, str):
+                try:
+                    rom_info = json.loads(rom_info)
+                except ValueError:
+                    continue
+            schema = self._raw_schema_for(ts) if route else 'main'
+            for volume, used_pct, free_gb, total_gb in disk_rows(rom_info):
+                values.setdefault(schema, []).append(
+                    (server_id, self.get_volume_id(volume, cursor), ts, used_pct, free_gb, total_gb))
+        for schema, schema_values in values.items():
+            cursor.executemany(f"""
+                INSERT OR REPLACE INTO {schema}.disk_metrics (server_id, volume_id, ts, used_pct, free_gb, total_gb)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, schema_values)
+
+    def _history_queries(self, conn, server_id, hours, points, start_ms=None, end_ms=None):
+        """Запросы истории сервера по возрастанию времени: уровень агрегации или сырые метрики по базам
+
+        Выдает (sql, params, decode); decode, если задан, переводит строки сжатых блоков в точки.
+        start_ms по умолчанию - hours назад; end_ms ограничивает сырые точки сверху (не включая).
+        """
+        if start_ms is None:
+            start_ms = now_ms() - int(hours * 3600 * 1000)
+        tier = pick_tier(hours, points) if points else None
+        if tier is not None:
+            table, step = tier
+            yield rollup_history_sql(table), (server_id, start_ms - start_ms % step), None
+            return
+        if self.storage == 'blocks':
+            # Сжатые блоки старше открытого, поэтому идут первыми
+            if end_ms is None:
+                decode = lambda rows: decode_rows(rows, start_ms)
+            else:
+                decode = lambda rows: [sample for sample in decode_rows(rows, start_ms) if sample[0] < end_ms]
+            yield BLOCKS_HISTORY_SQL, (server_id, start_ms - BLOCK_MS), decode
+        for schema in self._raw_schemas(conn, start_ms, end_ms):
+            if end_ms is None:
+                yield METRICS_HISTORY_SQL.format(schema=schema), (server_id, start_ms), None
+            else:
+                yield METRICS_RANGE_SQL.format(schema=schema), (server_id, start_ms, end_ms), None
+
+    def _cached_history(self, server_id, start_ms):
+        """Точки сервера из кольца последних точек: (строки, covered_from) или None, если кольца нет
+
+        Строки - (ts, cpu_usage, ram_usage, temperature) с None на месте пропусков,
+        как из SQLite; точек раньше covered_from в них нет.
+        """
+        cached = self.recent.window(server_id, start_ms)
+        if cached is None:
+            return None
+        ts, values, covered_from = cached
+        rows = [(stamp, *[None if value != value else value for value in row])
+                for stamp, row in zip(ts.tolist(), values.tolist())]
+        return rows, covered_from
+
+    def get_metrics_history(self, server_url, hours=24, instance='', points=None):
+        """Получает историю метрик за указанное количество часов (потокобезопасно)
+
+        Возвращает строки (ts, cpu_usage, ram_usage, temperature), ts - мс эпохи.
+        С points берется самый крупный уровень агрегации, дающий не меньше
+        points точек (средние за интервал, ts - начало интервала).
+        """
+        conn = self.read_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            server_id = self.get_server_id_threadsafe(server_url, cursor, instance)
+            if not server_id:
+                return []
+            start_ms = now_ms() - int(hours * 3600 * 1000)
+            raw = self.recent is not None and not (points and pick_tier(hours, points))
+            cached = self._cached_history(server_id, start_ms) if raw else None
+            if raw and cached is None:
+                version = self.recent.version(server_id)
+            # Из SQLite читается только то, чего нет в кольце
+            end_ms = cached[1] if cached else None
+            rows = []
+            if end_ms is None or start_ms < end_ms:
+                for sql, params, decode in self._history_queries(conn, server_id, hours, points, start_ms, end_ms):
+                    fetched = cursor.execute(sql, params).fetchall()
+                    rows.extend(decode(fetched) if decode else fetched)
+            if cached:
+                rows.extend(cached[0])
+            elif raw:
+                self.recent.fill(server_id, rows, start_ms, version)
+            return rows
+        finally:
+            self.read_pool.release(conn)
+
+    def _iter_rows(self, queries, batch_size, cancel, transform=None):
+        """Выдает строки запросов queries(conn) -> [(sql, params, decode)], читая их порциями
+        по batch_size на отдельном соединении
+
+        Соединение закрывается, когда строки закончились, установлен cancel
+        (threading.Event) или генератор закрыт (close() или выход из цикла).
+        Пока генератор открыт, он держит снимок базы для чтения.
+        """
+        conn = self.read_pool.open_connection()
+        try:
+            for sql, params, decode in queries(conn):
+                cursor = conn.execute(sql, params)
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if decode:
+                        rows = decode(rows)
+                    yield from (transform(rows) if transform else rows)
         finally:
             conn.close()
 
-    def get_metrics_history(self, server_url, hours=24):
-        """Получает историю метрик за указанное количество часов (потокобезопасно)"""
-        conn = self.get_connection()
+    def _page_filters(self, server_url, flag, **equals):
+        """Условия и параметры страницы: сервер, равенство столбцов и флаг (столбец, True/False)
+
+        Флаг подставляется константой, чтобы подходил частичный индекс.
+        """
+        conditions, params = [], []
+        if server_url:
+            condition, ids = self._server_filter(server_url)
+            conditions.append(condition)
+            params += ids
+        for column, value in equals.items():
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        column, value = flag
+        if value is not None:
+            conditions.append(f"{column} = TRUE" if value else f"{column} = FALSE")
+        return conditions, params
+
+    def _keyset_page(self, table, conditions, params, after, limit):
+        """Страница строк table от новых к старым, после курсора after = (timestamp, id)
+
+        Возвращает (строки, курсор следующей страницы или None). Курсор - условие
+        по индексу, а не OFFSET, поэтому страница стоит одинаково на любой глубине.
+        """
+        if after is not None:
+            conditions = conditions + ["(timestamp, id) < (?, ?)"]
+            params = params + list(after)
+        where = " AND ".join(conditions) or "1"
+        conn = self.read_pool.acquire()
         try:
             cursor = conn.cursor()
-            server_id = self.get_server_id_threadsafe(server_url, cursor)
+            # Лишняя строка показывает, есть ли следующая страница
+            cursor.execute(KEYSET_PAGE_SQL.format(table=table, where=where), params + [limit + 1])
+            rows = cursor.fetchall()
+        finally:
+            self.read_pool.release(conn)
+        next_cursor = (rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+        return self._with_server_names(rows[:limit]), next_cursor
+
+    def iter_metrics_history(self, server_url, hours=24, instance='', points=None, batch_size=1000, cancel=None):
+        """Потоковый вариант get_metrics_history: строки выдаются порциями, память не растет"""
+        server_id = self.get_server_id(server_url, instance)
+        if not server_id:
+            return iter(())
+        return self._iter_rows(lambda conn: self._history_queries(conn, server_id, hours, points),
+                               batch_size, cancel)
+
+    def get_recent_arrays(self, server_url, hours=1, instance=''):
+        """Точки периода из кольца последних точек в виде get_metrics_history_arrays
+
+        Возвращает None, если кэш выключен или период покрыт кольцом не целиком.
+        """
+        import numpy as np
+
+        server_id = self.get_server_id(server_url, instance)
+        if not server_id or self.recent is None:
+            return None
+        start_ms = now_ms() - int(hours * 3600 * 1000)
+        cached = self.recent.window(server_id, start_ms)
+        if not cached or start_ms < cached[2]:
+            return None
+        ts, values, _ = cached
+        result = {'ts': ts, 'time': ts.astype('datetime64[ms]')}
+        for index, name in enumerate(HISTORY_COLUMNS):
+            result[name] = values[:, index].astype(np.float32)
+        return result
+
+    def get_metrics_history_arrays(self, server_url, hours=24, instance='', points=None, chunk_size=8192):
+        """История метрик по столбцам в массивах numpy (потокобезопасно)
+
+        Возвращает {'ts': int64 (мс эпохи), 'time': datetime64[ms] (UTC),
+        'cpu_usage', 'ram_usage', 'temperature': float32, пропуски - NaN}.
+        Массивы выделяются заранее по COUNT(*) и заполняются порциями fetchmany;
+        порция переводится в массив без промежуточных объектов на каждую строку,
+        сжатые блоки распаковываются сразу в столбцы (decode_rows_arrays).
+        """
+        import numpy as np
+
+        if not (points and pick_tier(hours, points)):
+            result = self.get_recent_arrays(server_url, hours, instance)
+            if result is not None:
+                return result
+        conn = self.read_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            server_id = self.get_server_id_threadsafe(server_url, cursor, instance)
+            start_ms = now_ms() - int(hours * 3600 * 1000)
+            # Запросы строятся заново для каждого прохода: шарды подключаются по одному
+            queries = ((lambda: self._history_queries(conn, server_id, hours, points, start_ms)) if server_id
+                       else (lambda: []))
+            # У сжатых блоков число точек хранится в столбце count
+            size = sum(cursor.execute(f"SELECT COALESCE(SUM(count), 0) FROM ({sql})" if decode
+                                      else f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+                       for sql, params, decode in queries())
+            ts = np.empty(size, dtype=np.int64)
+            # Строка массива - столбец таблицы, чтобы каждый столбец был непрерывным
+            values = np.empty((len(HISTORY_COLUMNS), size), dtype=np.float32)
+            filled = 0
+            width = len(HISTORY_COLUMNS) + 1
+            for sql, params, decode in queries() if size else []:
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    if decode:
+                        chunk_ts, chunk_values = decode_rows_arrays(rows, start_ms)
+                    else:
+                        try:
+                            chunk = np.fromiter(chain.from_iterable(rows), dtype=np.float64,
+                                                count=len(rows) * width).reshape(len(rows), width)
+                        except TypeError:
+                            # В порции есть NULL: np.array переводит None в NaN
+                            chunk = np.array(rows, dtype=np.float64)
+                        chunk_ts, chunk_values = chunk[:, 0], chunk[:, 1:].T
+                    end = filled + len(chunk_ts)
+                    if end > len(ts):
+                        # Между COUNT и выборкой писатель успел добавить строки
+                        grown = max(end, 2 * len(ts))
+                        ts = np.resize(ts, grown)
+                        values = np.hstack((values, np.empty((len(HISTORY_COLUMNS), grown - values.shape[1]),
+                                                             dtype=np.float32)))
+                    ts[filled:end] = chunk_ts
+                    values[:, filled:end] = chunk_values
+                    filled = end
+        finally:
+            self.read_pool.release(conn)
+
+        result = {'ts': ts[:filled], 'time': ts[:filled].astype('datetime64[ms]')}
+        for index, name in enumerate(HISTORY_COLUMNS):
+            result[name] = values[index, :filled]
+        return result
+
+    def get_disk_history(self, server_url, hours=24, instance=''):
+        """Получает историю томов за указанное количество часов (потокобезопасно)
+
+        Возвращает {том: [(ts, used_pct, free_gb, total_gb), ...]}; каждый том
+        читается отдельным диапазоном по ключу disk_metrics.
+        """
+        conn = self.read_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            server_id = self.get_server_id_threadsafe(server_url, cursor, instance)
             if not server_id:
-                return []
-            
-            # Вычисляем время начала периода
-            start_time = datetime.datetime.now() - datetime.timedelta(hours=hours)
-            start_time_str = start_time.strftime('%Y-%m-%d %H:%M:%S')
-            
-            cursor.execute("""
-                SELECT timestamp, cpu_usage, ram_usage, temperature, disk_usage
-                FROM metrics 
-                WHERE server_id = ? AND timestamp >= ?
-                ORDER BY timestamp
-            """, (server_id, start_time_str))
-            
-            return cursor.fetchall()
+                return {}
+            start_ms = now_ms() - int(hours * 3600 * 1000)
+            history = {}
+            for schema in self._raw_schemas(conn, start_ms):
+                sql = DISK_HISTORY_SQL.format(schema=schema)
+                for name, volume_id in self._server_volumes(cursor, schema, server_id):
+                    rows = cursor.execute(sql, (server_id, volume_id, start_ms)).fetchall()
+                    if rows:
+                        history.setdefault(name, []).extend(rows)
+            return history
+        finally:
+            self.read_pool.release(conn)
+
+    def _bucket_sources(self, conn, server_id, start_ms, end_ms, tier):
+        """Источники сводок истории по возрастанию времени: уровень агрегации или сырые метрики
+
+        Сжатые блоки сюда не входят - их сводки считает get_metrics_buckets в numpy.
+        """
+        if tier is not None:
+            step = dict(ROLLUP_TIERS)[tier]
+            yield tier_source_sql(tier, HISTORY_COLUMNS), (server_id, start_ms - start_ms % step, end_ms + 1)
+            return
+        for schema in self._raw_schemas(conn, start_ms, end_ms):
+            yield (raw_source_sql(f"{schema}.metrics", HISTORY_COLUMNS, "server_id = ? AND ts >= ? AND ts < ?"),
+                   (server_id, start_ms, end_ms + 1))
+
+    def get_metrics_buckets(self, server_url, hours=24, buckets=1000, instance=''):
+        """Сводки истории по интервалам, посчитанные в SQLite (потокобезопасно)
+
+        Возвращает (ширина интервала в мс, строки); строка - bucket_columns(HISTORY_COLUMNS):
+        начало интервала, число точек и min/avg/max/p95 CPU, RAM и температуры.
+        Строк не больше buckets при любом периоде. Широкие интервалы считаются
+        по агрегатам metrics_1m/5m/1h, p95 тогда - среди средних их интервалов.
+        """
+        end_ms = now_ms()
+        start_ms = end_ms - int(hours * 3600 * 1000)
+        # Неполные интервалы по краям: на buckets - 1 полных приходится не больше buckets строк
+        width = pick_width(end_ms - start_ms, max(buckets - 1, 1))
+        conn = self.read_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            server_id = self.get_server_id_threadsafe(server_url, cursor, instance)
+            if not server_id:
+                return width, []
+            rows = []
+            tier = pick_bucket_tier(width)
+            if self.storage == 'blocks' and tier is None:
+                # Блоки старше открытого: распаковываются сразу в столбцы и сводятся без возврата точек в SQLite.
+                # Ширины меньше агрегатов делят блок, поэтому интервал не делится между блоком и строками
+                blocks = cursor.execute(BLOCKS_HISTORY_SQL, (server_id, start_ms - BLOCK_MS)).fetchall()
+                ts, values = decode_rows_arrays(blocks, start_ms)
+                keep = ts <= end_ms
+                rows.extend(bucket_arrays(ts[keep], values[:, keep], width))
+            for source, params in self._bucket_sources(conn, server_id, start_ms, end_ms, tier):
+                rows.extend(cursor.execute(bucket_sql(source, HISTORY_COLUMNS, width), params).fetchall())
+            return width, rows
+        finally:
+            self.read_pool.release(conn)
+
+    def get_disk_buckets(self, server_url, hours=24, buckets=1000, instance=''):
+        """Сводки заполнения томов по интервалам (потокобезопасно)
+
+        Возвращает (ширина интервала в мс, {том: строки}); строка - bucket_columns(('used_pct',)).
+        """
+        end_ms = now_ms()
+        start_ms = end_ms - int(hours * 3600 * 1000)
+        width = pick_width(end_ms - start_ms, max(buckets - 1, 1))
+        conn = self.read_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            server_id = self.get_server_id_threadsafe(server_url, cursor, instance)
+            if not server_id:
+                return width, {}
+            history = {}
+            for schema in self._raw_schemas(conn, start_ms, end_ms):
+                source = raw_source_sql(f"{schema}.disk_metrics", ('used_pct',),
+                                        "server_id = ? AND volume_id = ? AND ts >= ? AND ts < ?")
+                sql = bucket_sql(source, ('used_pct',), width)
+                for name, volume_id in self._server_volumes(cursor, schema, server_id):
+                    rows = cursor.execute(sql, (server_id, volume_id, start_ms, end_ms + 1)).fetchall()
+                    if rows:
+                        history.setdefault(name, []).extend(rows)
+            return width, history
+        finally:
+            self.read_pool.release(conn)
+
+    def get_metric_timestamps(self, server_url, start_time, end_time, instance=''):
+        """Возвращает множество уже сохраненных меток (мс эпохи) в интервале (потокобезопасно)"""
+        conn = self.read_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            server_id = self.get_server_id_threadsafe(server_url, cursor, instance)
+            if not server_id:
+                return set()
+            start_ms, end_ms = to_epoch_ms(start_time), to_epoch_ms(end_time)
+            stamps = set()
+            if self.storage == 'blocks':
+                cursor.execute("""
+                    SELECT data FROM metric_blocks
+                    WHERE server_id = ? AND block_start > ? AND block_start <= ?
+                """, (server_id, start_ms - BLOCK_MS, end_ms))
+                stamps.update(sample[0] for row in cursor.fetchall() for sample in decode_block(row[0])
+                              if start_ms <= sample[0] <= end_ms)
+            for schema in self._raw_schemas(conn, start_ms, end_ms):
+                cursor.execute(f"""
+                    SELECT ts FROM {schema}.metrics
+                    WHERE server_id = ? AND ts BETWEEN ? AND ?
+                """, (server_id, start_ms, end_ms))
+                stamps.update(row[0] for row in cursor.fetchall())
+            return stamps
+        finally:
+            self.read_pool.release(conn)
+
+    def get_backfill_progress(self, server_url):
+        """Возвращает время (сек. эпохи), до которого загружена история, или None"""
+        conn = self.read_pool.acquire()
+        try:
+            cursor = conn.cursor()
+            server_id = self.get_server_id_threadsafe(server_url, cursor)
+            cursor.execute("SELECT done_until FROM backfill_progress WHERE server_id = ?", (server_id,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+        finally:
+            self.read_pool.release(conn)
+
+    def save_backfill_chunk(self, server_url, rows, done_until):
+        """Сохраняет блок загруженной истории и прогресс одной транзакцией (потокобезопасно)
+
+        Пишется напрямую, минуя очередь записи: прогресс фиксируется только
+        вместе со строками, и отмененный блок будет запрошен повторно.
+        """
+        def write(cursor):
+            values = self._write_metrics(cursor, rows) if rows else []
+            server_id = self.get_server_id_threadsafe(server_url, cursor)
+            if server_id:
+                cursor.execute("""
+                    INSERT OR REPLACE INTO backfill_progress (server_id, done_until)
+                    VALUES (?, ?)
+                """, (server_id, done_until))
+            return values
+
+        conn = self.get_connection(timeout=0)
+        try:
+            values = self.run_write(conn, write)
         finally:
             conn.close()
+        self._metrics_committed(values)
 
-    def add_incident(self, server_url, incident_type, severity, description):
-        """Добавляет новый инцидент (потокобезопасно)"""
-        import datetime
+    def set_backfill_progress(self, server_url, done_until):
+        """Запоминает, до какого времени загружена история (потокобезопасно)"""
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
             server_id = self.get_server_id_threadsafe(server_url, cursor)
             if server_id:
-                now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 cursor.execute("""
-                    INSERT INTO incidents (server_id, type, severity, description, timestamp)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (server_id, incident_type, severity, description, now))
+                    INSERT OR REPLACE INTO backfill_progress (server_id, done_until)
+                    VALUES (?, ?)
+                """, (server_id, done_until))
                 conn.commit()
         finally:
             conn.close()
 
+    def add_incident(self, server_url, incident_type, severity, description, instance=''):
+        """Добавляет новый инцидент (потокобезопасно)"""
+        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        item = (server_url, incident_type, severity, description, instance, now)
+        if self.writer is not None:
+            self.writer.submit('incident', item)
+            return
+        conn = self.get_connection(timeout=0)
+        try:
+            self.run_write(conn, lambda cursor: self._write_incident(cursor, *item))
+        finally:
+            conn.close()
+
+    def _write_incident(self, cursor, server_url, incident_type, severity, description, instance, timestamp):
+        """Вставляет инцидент без фиксации"""
+        server_id = self.get_server_id_threadsafe(server_url, cursor, instance, create=True)
+        if not server_id:
+            return False
+        cursor.execute("""
+            INSERT INTO incidents (server_id, type, severity, description, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        """, (server_id, incident_type, severity, description, timestamp))
+        return True
+
     def get_incidents(self, server_url=None, limit=100):
         """Получает список инцидентов (потокобезопасно)"""
-        conn = self.get_connection()
+        condition, params = self._server_filter(server_url or None)
+        conn = self.read_pool.acquire()
         try:
             cursor = conn.cursor()
-            if server_url:
-                server_id = self.get_server_id_threadsafe(server_url, cursor)
-                cursor.execute("""
-                    SELECT i.*, s.url as server_name
-                    FROM incidents i
-                    JOIN servers s ON i.server_id = s.id
-                    WHERE i.server_id = ?
-                    ORDER BY i.timestamp DESC
-                    LIMIT ?
-                """, (server_id, limit))
-            else:
-                cursor.execute("""
-                    SELECT i.*, s.url as server_name
-                    FROM incidents i
-                    JOIN servers s ON i.server_id = s.id
-                    ORDER BY i.timestamp DESC
-                    LIMIT ?
-                """, (limit,))
-            
-            return cursor.fetchall()
+            cursor.execute(INCIDENTS_SQL.format(condition=condition), params + [limit])
+            return self._with_server_names(cursor.fetchall())
         finally:
-            conn.close()
+            self.read_pool.release(conn)
+
+    def iter_incidents(self, server_url=None, batch_size=1000, cancel=None):
+        """Потоковый вариант get_incidents без ограничения числа строк"""
+        condition, params = self._server_filter(server_url or None)
+        sql = f"SELECT * FROM incidents WHERE {condition} ORDER BY timestamp DESC, id DESC"
+        return self._iter_rows(lambda conn: [(sql, params, None)], batch_size, cancel, self._with_server_names)
+
+    def get_incidents_page(self, server_url=None, incident_type=None, severity=None, resolved=None,
+                           after=None, limit=50):
+        """Страница инцидентов с фильтрами (потокобезопасно)
+
+        after - курсор из предыдущего вызова; возвращает (инциденты, курсор следующей страницы или None).
+        """
+        conditions, params = self._page_filters(server_url, ('resolved', resolved),
+                                                type=incident_type, severity=severity)
+        return self._keyset_page('incidents', conditions, params, after, limit)
 
     def resolve_incident(self, incident_id):
         """Отмечает инцидент как разрешенный (потокобезопасно)"""
@@ -231,49 +1330,40 @@ class Database:
         finally:
             conn.close()
 
-    def add_alert(self, server_url, alert_type, message):
+    def add_alert(self, server_url, alert_type, message, instance=''):
         """Добавляет новое оповещение (потокобезопасно)"""
-        import datetime
-        conn = self.get_connection()
+        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        item = (server_url, alert_type, message, instance, now)
+        if self.writer is not None:
+            self.writer.submit('alert', item)
+            return
+        conn = self.get_connection(timeout=0)
         try:
-            cursor = conn.cursor()
-            server_id = self.get_server_id_threadsafe(server_url, cursor)
-            if server_id:
-                now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                cursor.execute("""
-                    INSERT INTO alerts (server_id, type, message, timestamp)
-                    VALUES (?, ?, ?, ?)
-                """, (server_id, alert_type, message, now))
-                conn.commit()
+            self.run_write(conn, lambda cursor: self._write_alert(cursor, *item))
         finally:
             conn.close()
 
-    def get_unacknowledged_alerts(self, server_url=None):
-        """Получает неподтвержденные оповещения (потокобезопасно)"""
-        conn = self.get_connection()
+    def _write_alert(self, cursor, server_url, alert_type, message, instance, timestamp):
+        """Вставляет оповещение без фиксации"""
+        server_id = self.get_server_id_threadsafe(server_url, cursor, instance, create=True)
+        if not server_id:
+            return False
+        cursor.execute("""
+            INSERT INTO alerts (server_id, type, message, timestamp)
+            VALUES (?, ?, ?, ?)
+        """, (server_id, alert_type, message, timestamp))
+        return True
+
+    def get_unacknowledged_alerts(self, server_url=None, limit=100):
+        """Получает limit последних неподтвержденных оповещений (потокобезопасно); все - iter_alerts"""
+        condition, params = self._server_filter(server_url or None)
+        conn = self.read_pool.acquire()
         try:
             cursor = conn.cursor()
-            if server_url:
-                server_id = self.get_server_id_threadsafe(server_url, cursor)
-                cursor.execute("""
-                    SELECT a.*, s.url as server_name
-                    FROM alerts a
-                    JOIN servers s ON a.server_id = s.id
-                    WHERE a.server_id = ? AND a.acknowledged = FALSE
-                    ORDER BY a.timestamp DESC
-                """, (server_id,))
-            else:
-                cursor.execute("""
-                    SELECT a.*, s.url as server_name
-                    FROM alerts a
-                    JOIN servers s ON a.server_id = s.id
-                    WHERE a.acknowledged = FALSE
-                    ORDER BY a.timestamp DESC
-                """)
-            
-            return cursor.fetchall()
+            cursor.execute(UNACKNOWLEDGED_ALERTS_SQL.format(condition=condition), params + [limit])
+            return self._with_server_names(cursor.fetchall())
         finally:
-            conn.close()
+            self.read_pool.release(conn)
 
     def acknowledge_alert(self, alert_id):
         """Подтверждает оповещение (потокобезопасно)"""
@@ -289,89 +1379,72 @@ class Database:
         finally:
             conn.close()
 
-    def get_all_alerts(self, server_url=None):
-        """Получает все оповещения (потокобезопасно)"""
-        conn = self.get_connection()
+    def get_all_alerts(self, server_url=None, limit=None):
+        """Получает все оповещения (потокобезопасно); для полной выборки - iter_alerts"""
+        condition, params = self._server_filter(server_url or None)
+        conn = self.read_pool.acquire()
         try:
             cursor = conn.cursor()
-            if server_url:
-                server_id = self.get_server_id_threadsafe(server_url, cursor)
-                cursor.execute("""
-                    SELECT a.*, s.url as server_name
-                    FROM alerts a
-                    JOIN servers s ON a.server_id = s.id
-                    WHERE a.server_id = ?
-                    ORDER BY a.timestamp DESC
-                """, (server_id,))
-            else:
-                cursor.execute("""
-                    SELECT a.*, s.url as server_name
-                    FROM alerts a
-                    JOIN servers s ON a.server_id = s.id
-                    ORDER BY a.timestamp DESC
-                """)
-            
-            return cursor.fetchall()
+            # LIMIT -1 в SQLite - без ограничения
+            cursor.execute(f"""
+                SELECT * FROM alerts
+                WHERE {condition}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            """, params + [-1 if limit is None else limit])
+            return self._with_server_names(cursor.fetchall())
         finally:
-            conn.close()
+            self.read_pool.release(conn)
+
+    def iter_alerts(self, server_url=None, acknowledged=None, batch_size=1000, cancel=None):
+        """Потоковая выборка оповещений; acknowledged=True/False - только подтвержденные/неподтвержденные"""
+        condition, params = self._server_filter(server_url or None)
+        if acknowledged is not None:
+            # Константа, а не параметр: иначе частичный индекс неприменим
+            condition += " AND acknowledged = TRUE" if acknowledged else " AND acknowledged = FALSE"
+        sql = f"SELECT * FROM alerts WHERE {condition} ORDER BY timestamp DESC, id DESC"
+        return self._iter_rows(lambda conn: [(sql, params, None)], batch_size, cancel, self._with_server_names)
+
+    def get_alerts_page(self, server_url=None, alert_type=None, acknowledged=None, after=None, limit=50):
+        """Страница оповещений с фильтрами (потокобезопасно)
+
+        after - курсор из предыдущего вызова; возвращает (оповещения, курсор следующей страницы или None).
+        """
+        conditions, params = self._page_filters(server_url, ('acknowledged', acknowledged), type=alert_type)
+        return self._keyset_page('alerts', conditions, params, after, limit)
 
     def get_acknowledged_alerts(self, server_url=None):
         """Получает подтвержденные оповещения (потокобезопасно)"""
-        conn = self.get_connection()
+        condition, params = self._server_filter(server_url or None)
+        conn = self.read_pool.acquire()
         try:
             cursor = conn.cursor()
-            if server_url:
-                server_id = self.get_server_id_threadsafe(server_url, cursor)
-                cursor.execute("""
-                    SELECT a.*, s.url as server_name
-                    FROM alerts a
-                    JOIN servers s ON a.server_id = s.id
-                    WHERE a.server_id = ? AND a.acknowledged = TRUE
-                    ORDER BY a.timestamp DESC
-                """, (server_id,))
-            else:
-                cursor.execute("""
-                    SELECT a.*, s.url as server_name
-                    FROM alerts a
-                    JOIN servers s ON a.server_id = s.id
-                    WHERE a.acknowledged = TRUE
-                    ORDER BY a.timestamp DESC
-                """)
-            
-            return cursor.fetchall()
+            cursor.execute(f"""
+                SELECT * FROM alerts
+                WHERE {condition} AND acknowledged = TRUE
+                ORDER BY timestamp DESC, id DESC
+            """, params)
+            return self._with_server_names(cursor.fetchall())
         finally:
-            conn.close()
+            self.read_pool.release(conn)
 
     def cleanup_old_data(self, days=30):
-        """Удаляет старые данные для экономии места (потокобезопасно)"""
-        conn = self.get_connection()
+        """Удаляет метрики, закрытые инциденты и оповещения старше days дней (потокобезопасно)
+
+        Удаление идет порциями через RetentionService; агрегаты истории не затрагиваются.
+        """
+        policy = {table: days for table in ('metrics', 'metric_blocks', 'disk_metrics', 'incidents', 'alerts')}
         try:
-            cursor = conn.cursor()
-            
-            # Удаляем старые метрики
-            cursor.execute("DELETE FROM metrics WHERE timestamp < datetime('now', '-{} days')".format(days))
-            metrics_deleted = cursor.rowcount
-            
-            # Удаляем старые разрешенные инциденты
-            cursor.execute("DELETE FROM incidents WHERE resolved = TRUE AND timestamp < datetime('now', '-{} days')".format(days))
-            incidents_deleted = cursor.rowcount
-            
-            # Удаляем старые подтвержденные оповещения
-            cursor.execute("DELETE FROM alerts WHERE acknowledged = TRUE AND timestamp < datetime('now', '-{} days')".format(days))
-            alerts_deleted = cursor.rowcount
-            
-            conn.commit()
-            
-            print(f"Очистка данных: удалено {metrics_deleted} метрик, {incidents_deleted} инцидентов, {alerts_deleted} оповещений")
-            
-            return {
-                'metrics_deleted': metrics_deleted,
-                'incidents_deleted': incidents_deleted,
-                'alerts_deleted': alerts_deleted
-            }
-            
+            report = RetentionService(self, policy, pause=0).run_once()
         except Exception as e:
             print(f"Ошибка при очистке данных: {e}")
             raise
-        finally:
-            conn.close()
\ No newline at end of file
+        rows = report['rows']
+        print(f"Очистка данных: удалено {rows['metrics']} метрик, {rows['incidents']} инцидентов, "
+              f"{rows['alerts']} оповещений, освобождено {report['bytes_freed']} байт")
+        return {
+            'metrics_deleted': rows['metrics'],
+            'incidents_deleted': rows['incidents'],
+            'alerts_deleted': rows['alerts'],
+            'bytes_freed': report['bytes_freed'],
+        }
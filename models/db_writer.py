@@ -0,0 +1,156 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class DatabaseWriter:
+    """Единственный поток записи в SQLite: долгоживущее соединение и пакетные транзакции
+
+    Записи ставятся в ограниченную очередь и объединяются в одну транзакцию
+    каждые flush_interval секунд или batch_size записей. При заполненной
+    очереди submit ждет освобождения места.
+    """
+
+    def __init__(self, database, flush_interval=0.05, batch_size=500, max_queue=10000):
+        self.db = database
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        # Запрошен сброс - накопленная пачка фиксируется, не дожидаясь flush_interval
+        self._flush_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Удерживается на время транзакции; paused() забирает его, чтобы остановить запись
+        self._write_lock = threading.Lock()
+        self.stats = {'rows': 0, 'transactions': 0, 'errors': 0, 'backpressure': 0, 'write_time': 0.0}
+
+    def start(self):
+        """Запускает поток записи"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, kind, item):
+        """Ставит запись в очередь; kind - metrics, alert или incident"""
+        try:
+            self._queue.put_nowait((kind, item))
+        except queue.Full:
+            # Очередь заполнена - задерживаем источник, пока поток записи не догонит
+            with self._lock:
+                self.stats['backpressure'] += 1
+            self._queue.put((kind, item))
+
+    def flush(self):
+        """Ждет, пока все поставленные записи будут зафиксированы"""
+        self._flush_event.set()
+        try:
+            self._queue.join()
+        finally:
+            self._flush_event.clear()
+
+    @contextmanager
+    def paused(self):
+        """Приостанавливает запись на время блока with
+
+        Уже поставленные записи сначала фиксируются; новые ждут в очереди
+        (при заполненной очереди submit ждет) и пишутся после выхода из блока.
+        """
+        self.flush()
+        with self._write_lock:
+            yield
+
+    def close(self):
+        """Записывает остаток очереди и останавливает поток"""
+        if self._thread and self._thread.is_alive():
+            self.flush()
+            self._stop_event.set()
+            self._thread.join(timeout=5)
+
+    def get_stats(self):
+        """Статистика записи, включая пропускную способность (строк в секунду)"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['queued'] = self._queue.qsize()
+        stats['rows_per_sec'] = stats['rows'] / stats['write_time'] if stats['write_time'] else 0.0
+        return stats
+
+    def _run(self):
+        conn = self.db.get_connection(timeout=0)
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    first = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                batch = [first]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=min(remaining, 0.01)))
+                    except queue.Empty:
+                        if self._flush_event.is_set():
+                            break
+                with self._write_lock:
+                    self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        """Записывает пачку одной транзакцией
+
+        Если транзакция отменена не из-за блокировки, записи повторяются по
+        одной: ошибочная строка теряется одна, а не вся пачка всех серверов.
+        """
+        started = time.perf_counter()
+        try:
+            try:
+                self._commit(conn, batch)
+                written = len(batch)
+            except Exception as e:
+                if 'locked' in str(e) or len(batch) == 1:
+                    raise
+                print(f"Ошибка при записи пачки в базу данных, запись по одной: {e}")
+                written = 0
+                for item in batch:
+                    try:
+                        self._commit(conn, [item])
+                        written += 1
+                    except Exception as item_error:
+                        with self._lock:
+                            self.stats['errors'] += 1
+                        print(f"Ошибка при записи в базу данных ({item[0]}): {item_error}")
+            with self._lock:
+                self.stats['rows'] += written
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            print(f"Ошибка при записи в базу данных: {e}")
+        finally:
+            with self._lock:
+                self.stats['write_time'] += time.perf_counter() - started
+            for _ in batch:
+                self._queue.task_done()
+
+    def _commit(self, conn, batch):
+        """Фиксирует записи batch одной транзакцией"""
+        def write(cursor):
+            metrics = [item for kind, item in batch if kind == 'metrics']
+            values = self.db._write_metrics(cursor, metrics) if metrics else []
+            for kind, item in batch:
+                if kind == 'alert':
+                    self.db._write_alert(cursor, *item)
+                elif kind == 'incident':
+                    self.db._write_incident(cursor, *item)
+            return values
+
+        self.db._metrics_committed(self.db.run_write(conn, write))
+        with self._lock:
+            self.stats['transactions'] += 1
@@ -0,0 +1,148 @@
+import threading
+
+from models.http_pool import shared_pool
+
+GIB = 1073741824
+
+# Семейства метрик windows_exporter, которые нужны мониторингу; остальные строки пропускаются
+EXPORTER_FAMILIES = ('windows_cpu_', 'windows_memory_', 'windows_logical_disk_', 'windows_thermalzone_')
+
+# Метрики, значения которых переносятся в снимок без пересчета: имя -> (раздел, поле, делитель)
+GAUGES = {
+    'windows_cpu_info_core': ('cpu', 'core', None),
+    'windows_cpu_info_thread': ('cpu', 'thread', None),
+    'windows_cpu_info_l2_cache_size': ('cpu', 'L2', None),
+    'windows_cpu_info_l3_cache_size': ('cpu', 'L3', None),
+    'windows_memory_available_bytes': ('ram', 'available', GIB),
+    'windows_memory_physical_total_bytes': ('ram', 'all', GIB),
+    'windows_logical_disk_free_bytes': ('rom', 'available', GIB),
+    'windows_logical_disk_size_bytes': ('rom', 'all', GIB),
+}
+
+_ESCAPES = {'\\': '\\', '"': '"', 'n': '\n'}
+
+
+def is_exporter_url(url):
+    """Адрес, оканчивающийся на /metrics, опрашивается напрямую, а не через Prometheus"""
+    return bool(url) and url.rstrip('/').endswith('/metrics')
+
+
+def _parse_labels(line, pos):
+    """Разбирает {имя="значение",...}, начиная с позиции после '{'; возвращает метки и позицию '}'"""
+    labels = {}
+    length = len(line)
+    while pos < length:
+        if line[pos] in ', ':
+            pos += 1
+            continue
+        if line[pos] == '}':
+            return labels, pos
+        eq = line.index('=', pos)
+        name = line[pos:eq].strip()
+        pos = eq + 2  # пропускаем ="
+        chars = []
+        while line[pos] != '"':
+            if line[pos] == '\\':
+                pos += 1
+                chars.append(_ESCAPES.get(line[pos], line[pos]))
+            else:
+                chars.append(line[pos])
+            pos += 1
+        labels[name] = ''.join(chars)
+        pos += 1
+    raise ValueError(f"Незакрытый список меток: {line}")
+
+
+def parse_exposition(lines, prefixes=EXPORTER_FAMILIES):
+    """Потоково разбирает текстовый формат Prometheus, возвращая (имя, метки, значение)
+
+    Комментарии и строки семейств не из prefixes отбрасываются по префиксу,
+    без разбора.
+    """
+    for line in lines:
+        if not line.startswith(prefixes):
+            continue
+        brace = line.find('{')
+        space = line.find(' ')
+        if brace == -1 or (space != -1 and space < brace):
+            if space == -1:
+                continue
+            name, labels, rest = line[:space], {}, line[space:]
+        else:
+            name = line[:brace]
+            labels, end = _parse_labels(line, brace + 1)
+            rest = line[end + 1:]
+        parts = rest.split()
+        if parts:
+            yield name, labels, parts[0]
+
+
+class ExporterScraper:
+    """Опрос /metrics windows_exporter напрямую с локальным расчетом загрузки CPU"""
+
+    def __init__(self, url, pool=None, timeout=3):
+        self.url = url
+        self.pool = pool if pool is not None else shared_pool
+        self.timeout = timeout
+        self._counters = {}  # ядро -> (utility, rtc) предыдущего опроса
+        self._lock = threading.Lock()
+
+    def fetch_lines(self):
+        """Построчно читает ответ экспортера, не загружая его целиком"""
+        session, _ = self.pool.get_session(self.url)
+        with session.get(self.url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            response.encoding = response.encoding or 'utf-8'
+            yield from response.iter_lines(decode_unicode=True)
+
+    def scrape(self):
+        """Опрашивает экспортер; возвращает снимок в формате PrometheusMonitor (без производных полей)"""
+        return self.to_result(parse_exposition(self.fetch_lines()))
+
+    def to_result(self, samples):
+        """Раскладывает образцы экспортера по разделам cpu/ram/rom"""
+        result = {'cpu': {}, 'ram': {}, 'rom': {}, 'network': '1', 'start_time': None}
+        counters = {}
+        temperature = None
+
+        for name, labels, value in samples:
+            if name in GAUGES:
+                section, field, divisor = GAUGES[name]
+                value = str(float(value) / divisor) if divisor else value
+                if section == 'rom':
+                    result['rom'].setdefault(labels.get('volume', ''), {})[field] = value
+                else:
+                    result[section][field] = value
+            elif name == 'windows_cpu_processor_utility_total':
+                counters.setdefault(labels.get('core'), [None, None])[0] = float(value)
+            elif name == 'windows_cpu_processor_rtc_total':
+                counters.setdefault(labels.get('core'), [None, None])[1] = float(value)
+            elif name == 'windows_cpu_info':
+                result['cpu']['name'] = labels.get('name')
+                result['cpu']['description'] = labels.get('description')
+            elif name == 'windows_cpu_core_frequency_mhz' and labels.get('core') == '0,0':
+                result['cpu']['frequency_mhz'] = value
+            elif name == 'windows_thermalzone_temperature_celsius':
+                temperature = max(temperature, float(value)) if temperature is not None else float(value)
+
+        if temperature is not None:
+            result['cpu']['temperatur'] = str(temperature)
+        usage = self._cpu_usage(counters)
+        if usage:
+            result['cpu']['usage_precent'] = sum(usage) / len(usage)
+        return result
+
+    def _cpu_usage(self, counters):
+        """Отношение приращений utility/rtc по каждому ядру между двумя опросами"""
+        current = {core: tuple(pair) for core, pair in counters.items() if None not in pair}
+        with self._lock:
+            previous, self._counters = self._counters, current
+        usage = []
+        for core, (utility, rtc) in current.items():
+            if core not in previous:
+                continue
+            prev_utility, prev_rtc = previous[core]
+            # Счетчики сбрасываются при перезапуске экспортера - такой интервал пропускаем
+            if rtc > prev_rtc and utility >= prev_utility:
+                usage.append((utility - prev_utility) / (rtc - prev_rtc))
+        return usage
@@ -0,0 +1,102 @@
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from prometheus_api_client import PrometheusConnect
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTP-адаптер, считающий объем полученных данных"""
+
+    def __init__(self, pool, **kwargs):
+        self._pool = pool
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        response = super().send(request, stream=stream, **kwargs)
+        if not stream:
+            body = response.content
+            # tell() возвращает объем данных до распаковки gzip
+            received = response.raw.tell() if response.raw is not None else 0
+            self._pool._add_bytes(received or len(body))
+        return response
+
+
+class SessionPool:
+    """Пул HTTP-сессий: одна сессия с keep-alive на каждый хост Prometheus"""
+
+    def __init__(self, pool_maxsize=10, max_retries=1):
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self._sessions = {}  # host -> (session, adapter)
+        self._lock = threading.Lock()
+        self._bytes_received = 0
+
+    def get_session(self, url):
+        """Возвращает сессию для хоста из url, создавая ее при первом обращении"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                session.verify = False
+                session.headers.update({
+                    'Accept-Encoding': 'gzip',
+                    'Connection': 'keep-alive',
+                })
+                adapter = _CountingAdapter(
+                    self,
+                    pool_connections=1,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=Retry(total=self.max_retries, backoff_factor=0.1),
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[host] = (session, adapter)
+            return self._sessions[host]
+
+    def connect(self, url):
+        """Создает PrometheusConnect поверх общей сессии хоста"""
+        session, adapter = self.get_session(url)
+        prom = PrometheusConnect(url=url, disable_ssl=True, session=session)
+        # PrometheusConnect монтирует собственный адаптер на url - возвращаем общий
+        session.mount(url, adapter)
+        return prom
+
+    def _add_bytes(self, count):
+        with self._lock:
+            self._bytes_received += count
+
+    def get_stats(self):
+        """Статистика пула: переиспользованные и новые соединения, полученные байты"""
+        requests_count = 0
+        new_connections = 0
+        with self._lock:
+            adapters = [adapter for _, adapter in self._sessions.values()]
+            bytes_received = self._bytes_received
+            sessions = len(self._sessions)
+        for adapter in adapters:
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is not None:
+                    requests_count += pool.num_requests
+                    new_connections += pool.num_connections
+        return {
+            'sessions': sessions,
+            'requests': requests_count,
+            'new_connections': new_connections,
+            'hits': max(requests_count - new_connections, 0),
+            'bytes_received': bytes_received,
+        }
+
+    def close(self):
+        """Закрывает все сессии пула"""
+        with self._lock:
+            for session, _ in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+# Общий пул, разделяемый всеми мониторами приложения
+shared_pool = SessionPool()
@@ -1,113 +1,272 @@
-from prometheus_api_client import PrometheusConnect
+import threading
+import time
 
-class PrometheusMonitor:
-    def __init__(self, PROMETHEUS_URL):
-        self.prom = PrometheusConnect(url=PROMETHEUS_URL, disable_ssl=True)
-        self.timeout = 3
+from models.exporter import ExporterScraper, is_exporter_url
+from models.http_pool import shared_pool
 
-    def change_url(self, new_url):
-        self.prom = PrometheusConnect(url=new_url, disable_ssl=True)
+# Метка, которой помечается каждое подвыражение пакетного запроса
+BATCH_LABEL = 'monitor_query'
 
-    def get_cpu_info(self):
-        proc = 0
-        info = {}
-        query = 'rate(windows_cpu_processor_utility_total{instance="windows-server"}[5s]) / rate(windows_cpu_processor_rtc_total{instance="windows-server"}[5s])'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            for i in range(len(data)):
-                proc += float(data[i]['value'][1])
-            info['usage_precent'] = proc/ len(data)
+BATCH_SECTIONS = ('cpu', 'ram', 'rom', 'network')
 
-        query = 'windows_thermalzone_temperature_celsius'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['temperatur'] = data[0]['value'][1]
+# Запросы пакетного режима: (раздел, поле, выражение).
+# Каждое выражение сохраняет метку instance, поэтому один запрос обслуживает
+# все хосты за Prometheus. Занятый объем и процент использования вычисляются
+# локально в fill_derived
+BATCH_QUERIES = [
+    ('cpu', 'usage_precent', 'avg by (instance) (rate(windows_cpu_processor_utility_total[5s]) / rate(windows_cpu_processor_rtc_total[5s]))'),
+    ('cpu', 'temperatur', 'max by (instance) (windows_thermalzone_temperature_celsius)'),
+    ('cpu', 'name', 'windows_cpu_info'),
+    ('cpu', 'frequency_mhz', 'max by (instance) (windows_cpu_core_frequency_mhz{core="0,0"})'),
+    ('cpu', 'core', 'max by (instance) (windows_cpu_info_core)'),
+    ('cpu', 'thread', 'max by (instance) (windows_cpu_info_thread)'),
+    ('cpu', 'L2', 'max by (instance) (windows_cpu_info_l2_cache_size)'),
+    ('cpu', 'L3', 'max by (instance) (windows_cpu_info_l3_cache_size)'),
+    ('ram', 'available', 'windows_memory_available_bytes / 1073741824'),
+    ('ram', 'all', 'windows_memory_physical_total_bytes / 1073741824'),
+    ('rom', 'available', 'windows_logical_disk_free_bytes / 1073741824'),
+    ('rom', 'all', 'windows_logical_disk_size_bytes / 1073741824'),
+    ('network', 'up', 'up{job="windows"}'),
+    # Время запуска экспортера - по его изменению определяется перезапуск
+    ('meta', 'start_time', 'process_start_time_seconds{job="windows"}'),
+]
 
-        query = 'windows_cpu_info'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['name'] = data[0]['metric']['name']
-            info['description'] = data[0]['metric']['description']
-        
-        query = 'windows_cpu_core_frequency_mhz{core="0,0"}'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['frequency_mhz'] = data[0]['value'][1]
+# Поля, которые почти не меняются и берутся из кэша метаданных
+STATIC_FIELDS = {
+    ('cpu', 'name'), ('cpu', 'description'), ('cpu', 'frequency_mhz'), ('cpu', 'core'),
+    ('cpu', 'thread'), ('cpu', 'L2'), ('cpu', 'L3'), ('ram', 'all'), ('rom', 'all'),
+}
 
-        query = 'windows_cpu_info_core'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['core'] = data[0]['value'][1]
+STATIC_QUERIES = [q for q in BATCH_QUERIES if (q[0], q[1]) in STATIC_FIELDS]
+VOLATILE_QUERIES = [q for q in BATCH_QUERIES if (q[0], q[1]) not in STATIC_FIELDS]
 
-        query = 'windows_cpu_info_thread'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['thread'] = data[0]['value'][1]
 
-        query = 'windows_cpu_info_l2_cache_size'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['L2'] = data[0]['value'][1]
+def build_batch_query(queries):
+    """Объединяет выражения в один запрос, помечая каждое меткой BATCH_LABEL"""
+    parts = []
+    for section, field, expr in queries:
+        parts.append(f'label_replace({expr}, "{BATCH_LABEL}", "{section}:{field}", "", "")')
+    return ' or '.join(parts)
 
-        query = 'windows_cpu_info_l3_cache_size'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['L3'] = data[0]['value'][1]
-        
-        return info
 
-    def get_RAM_info(self):
-        info = {}
-        query = '(windows_memory_physical_total_bytes - windows_memory_available_bytes) / windows_memory_physical_total_bytes * 100'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['usage_precent'] = data[0]['value'][1]
+def empty_result():
+    return {'cpu': {}, 'ram': {}, 'rom': {}, 'network': None, 'start_time': None}
 
-        query = 'windows_memory_available_bytes / 1073741824'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['available'] = data[0]['value'][1]
 
-        query = '(windows_memory_physical_total_bytes - windows_memory_available_bytes) / 1073741824'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['use'] = data[0]['value'][1]
+def demultiplex_instances(data):
+    """Раскладывает результат пакетного запроса по экземплярам (метка instance)"""
+    groups = {}
+    for item in data:
+        groups.setdefault(item['metric'].get('instance', ''), []).append(item)
+    return {instance: demultiplex(items) for instance, items in groups.items()}
 
-        query = 'windows_memory_physical_total_bytes / 1073741824'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        if len(data) != 0:
-            info['all'] = data[0]['value'][1]
-        
-        return info
+
+def demultiplex(data):
+    """Раскладывает результат пакетного запроса по словарям cpu/ram/rom"""
+    result = empty_result()
+    cpu_usage = []
+    for item in data:
+        tag = item['metric'].get(BATCH_LABEL, '')
+        section, _, field = tag.partition(':')
+        value = item['value'][1]
+        if section == 'cpu':
+            if field == 'usage_precent':
+                cpu_usage.append(float(value))
+            elif field == 'name':
+                if 'name' not in result['cpu']:
+                    result['cpu']['name'] = item['metric'].get('name')
+                    result['cpu']['description'] = item['metric'].get('description')
+            else:
+                result['cpu'].setdefault(field, value)
+        elif section == 'ram':
+            result['ram'].setdefault(field, value)
+        elif section == 'rom':
+            volume = item['metric'].get('volume')
+            result['rom'].setdefault(volume, {})[field] = value
+        elif section == 'network':
+            if result['network'] is None:
+                result['network'] = value
+        elif section == 'meta':
+            if result[field] is None:
+                result[field] = value
+    if cpu_usage:
+        result['cpu']['usage_precent'] = sum(cpu_usage) / len(cpu_usage)
+    return result
+
+
+def fill_derived(result):
+    """Вычисляет занятый объем и процент использования RAM и дисков"""
+    disks = [result['ram']] + list(result['rom'].values())
+    for info in disks:
+        if 'all' in info and 'available' in info:
+            total = float(info['all'])
+            use = total - float(info['available'])
+            info['use'] = use
+            info['usage_precent'] = use / total * 100 if total else 0.0
+    return result
+
+
+def extract_static(result):
+    """Выделяет из результата статические метаданные для кэша"""
+    return {
+        'cpu': {k: v for k, v in result['cpu'].items() if ('cpu', k) in STATIC_FIELDS},
+        'ram': {k: v for k, v in result['ram'].items() if ('ram', k) in STATIC_FIELDS},
+        'rom': {volume: {k: v for k, v in disk.items() if ('rom', k) in STATIC_FIELDS}
+                for volume, disk in result['rom'].items()},
+    }
+
+
+class MetadataCache:
+    """Кэш статических метаданных серверов с TTL и сбросом при перезапуске экспортера"""
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._entries = {}  # url -> {'static': {instance: ...}, 'start_time': {instance: ...}, 'expires'}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url):
+        """Возвращает закэшированные метаданные или None, если их нет или они устарели"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry['expires'] <= time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def put(self, url, statics, start_times):
+        with self._lock:
+            self._entries[url] = {
+                'static': statics,
+                'start_time': start_times,
+                'expires': time.monotonic() + self.ttl,
+            }
+
+    def invalidate(self, url):
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def is_stale(self, entry, results):
+        """Проверяет, не появились ли новые экземпляры или диски и не перезапускались ли экспортеры"""
+        for instance, result in results.items():
+            if instance not in entry['static']:
+                return True
+            if result['start_time'] is not None and result['start_time'] != entry['start_time'].get(instance):
+                return True
+            if any(volume not in entry['static'][instance]['rom'] for volume in result['rom']):
+                return True
+        return False
+
+
+# Общий кэш метаданных, разделяемый всеми мониторами приложения
+shared_metadata_cache = MetadataCache()
+
+
+class PrometheusMonitor:
+    def __init__(self, PROMETHEUS_URL, pool=None, metadata_cache=None, instance=None):
+        # Соединения берутся из общего пула, чтобы не открывать их заново на каждый тик
+        self.pool = pool if pool is not None else shared_pool
+        self.metadata_cache = metadata_cache if metadata_cache is not None else shared_metadata_cache
+        self.prom = self.pool.connect(PROMETHEUS_URL)
+        self.timeout = 3
+        # Адрес вида http://host:9182/metrics опрашивается напрямую, минуя Prometheus
+        self.exporter = ExporterScraper(PROMETHEUS_URL, self.pool, self.timeout) if is_exporter_url(PROMETHEUS_URL) else None
+        self.queries_sent = 0
+        # Экземпляр, данные которого возвращают get_*_info (None - первый по имени)
+        self.instance = instance
+
+    def change_url(self, new_url):
+        self.prom = self.pool.connect(new_url)
+        self.exporter = ExporterScraper(new_url, self.pool, self.timeout) if is_exporter_url(new_url) else None
+
+    def get_all_instances(self):
+        """Получает метрики всех экземпляров за этим Prometheus одним запросом"""
+        return self._collect(BATCH_SECTIONS)
+
+    def get_all_info(self):
+        """Получает все метрики сервера одним запросом к Prometheus"""
+        return self._pick(self._collect(BATCH_SECTIONS))
+
+    def get_cpu_info(self):
+        return self._pick(self._collect(('cpu',)))['cpu']
+
+    def get_RAM_info(self):
+        return self._pick(self._collect(('ram',)))['ram']
 
     def get_ROM_info(self):
-        disks = {}
-        query = '(windows_logical_disk_size_bytes - windows_logical_disk_free_bytes) / windows_logical_disk_size_bytes * 100'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        for i in range(len(data)):
-            disks[data[i]['metric']['volume']] = {'usage_precent': data[i]['value'][1]}
+        return self._pick(self._collect(('rom',)))['rom']
 
-        query = 'windows_logical_disk_free_bytes / 1073741824'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        for i in range(len(data)):
-            disks[data[i]['metric']['volume']]['available'] = data[i]['value'][1]
+    def is_network_available(self):
+        return self._pick(self._collect(('network',)))['network']
 
-        query = '(windows_logical_disk_size_bytes - windows_logical_disk_free_bytes) / 1073741824'
+    def probe(self):
+        """Дешевая проверка доступности: запрашивает только метрику up"""
+        if self.exporter is not None:
+            # Экспортер не нагружает общий Prometheus - проверяем его обычным опросом;
+            # доступен, только если ответ содержит значения
+            try:
+                result = self._collect(BATCH_SECTIONS)['']
+            except Exception:
+                return False
+            return bool(result['cpu'] or result['ram'] or result['rom'])
+        query = build_batch_query([q for q in BATCH_QUERIES if q[0] == 'network'])
         data = self.prom.custom_query(query, timeout=self.timeout)
-        for i in range(len(data)):
-            disks[data[i]['metric']['volume']]['use'] = data[i]['value'][1]
+        self.queries_sent += 1
+        return any(item['value'][1] == '1' for item in data)
 
-        query = 'windows_logical_disk_size_bytes / 1073741824'
-        data = self.prom.custom_query(query, timeout=self.timeout)
-        for i in range(len(data)):
-            disks[data[i]['metric']['volume']]['all'] = data[i]['value'][1]
-        return disks
+    def _pick(self, instances):
+        """Выбирает снимок заданного экземпляра (по умолчанию - первого по имени)"""
+        if self.instance is not None:
+            return instances.get(self.instance, empty_result())
+        if instances:
+            return instances[sorted(instances)[0]]
+        return empty_result()
 
-    def is_network_available(self):
-        query = 'up{job="windows"}'
-        data = self.prom.custom_query(query)
-        if len(data) != 0:
-            return data[0]['value'][1]
+    def _collect(self, sections):
+        """Выполняет пакетный запрос и раскладывает результат по экземплярам"""
+        if self.exporter is not None:
+            result = self.exporter.scrape()
+            self.queries_sent += 1
+            return {'': fill_derived(result)}
+        url = self.prom.url
+        entry = self.metadata_cache.get(url)
+        results = self._query_batch(sections, with_static=entry is None)
+
+        if entry is not None and self.metadata_cache.is_stale(entry, results):
+            # Новый экземпляр, новый диск или перезапуск экспортера - перечитываем все
+            self.metadata_cache.invalidate(url)
+            entry = None
+            results = self._query_batch(sections, with_static=True)
+
+        if entry is None:
+            statics = {instance: extract_static(result) for instance, result in results.items()}
+            # Пустые метаданные (серверы недоступны) не кэшируем
+            if any(static['cpu'] or static['ram'] for static in statics.values()):
+                start_times = {instance: result['start_time'] for instance, result in results.items()}
+                self.metadata_cache.put(url, statics, start_times)
+            return {instance: fill_derived(result) for instance, result in results.items()}
+
+        for instance, result in results.items():
+            static = entry['static'][instance]
+            # Дополняем только разделы, для которых пришли текущие значения
+            for section in ('cpu', 'ram'):
+                if result[section]:
+                    result[section].update(static[section])
+            for volume, disk in result['rom'].items():
+                disk.update(static['rom'].get(volume, {}))
+            fill_derived(result)
+        return results
+
+    def _query_batch(self, sections, with_static):
+        queries = [q for q in VOLATILE_QUERIES if q[0] in sections or q[0] == 'meta']
+        if with_static:
+            # Метаданные кэшируются целиком, независимо от запрошенных разделов
+            queries += STATIC_QUERIES
+        data = self.prom.custom_query(build_batch_query(queries), timeout=self.timeout)
+        self.queries_sent += 1
+        return demultiplex_instances(data)
 
     def _parse_metric_value(self, value):
         try:
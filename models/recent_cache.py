@@ -0,0 +1,161 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Точек в кольце сервера по умолчанию: час при опросе раз в 5 с
+DEFAULT_CAPACITY = 720
+
+# Предел памяти всех колец по умолчанию
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class RingBuffer:
+    """Последние capacity точек одного сервера в массивах numpy фиксированного размера
+
+    covered_from - метка, начиная с которой в кольце есть все сохраненные точки
+    сервера; более ранние читаются из SQLite.
+    """
+
+    def __init__(self, capacity, columns):
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, columns), np.nan)
+        self.size = 0
+        # Индекс следующей записи
+        self.head = 0
+        self.covered_from = None
+
+    @property
+    def nbytes(self):
+        return self.ts.nbytes + self.values.nbytes
+
+    def append(self, ts, values):
+        """Добавляет точку; опоздавшая точка не вставляется, а сужает покрытие"""
+        capacity = len(self.ts)
+        if self.size:
+            last = (self.head - 1) % capacity
+            if ts == self.ts[last]:
+                # INSERT OR REPLACE в базе заменил значение - заменяем и здесь
+                self.values[last] = values
+                return
+            if ts < self.ts[last]:
+                self.covered_from = max(self.covered_from, ts + 1)
+                return
+        if self.covered_from is None:
+            self.covered_from = ts
+        if self.size == capacity:
+            # Затирается самая старая точка
+            self.covered_from = max(self.covered_from, int(self.ts[self.head]) + 1)
+        else:
+            self.size += 1
+        self.ts[self.head] = ts
+        self.values[self.head] = values
+        self.head = (self.head + 1) % capacity
+
+    def window(self, start_ms):
+        """Копии (ts, values) точек с меткой не раньше start_ms и covered_from по возрастанию времени"""
+        if self.size < len(self.ts):
+            ts, values = self.ts[:self.size], self.values[:self.size]
+        else:
+            ts = np.concatenate((self.ts[self.head:], self.ts[:self.head]))
+            values = np.concatenate((self.values[self.head:], self.values[:self.head]))
+        first = np.searchsorted(ts, max(start_ms, self.covered_from))
+        return ts[first:].copy(), values[first:].copy()
+
+
+class RecentMetricsCache:
+    """Кольца последних точек серверов в памяти с вытеснением давно не читавшихся (LRU)
+
+    Кольцо создается записью точки новее всех записанных процессом (если
+    хватает места) или первым чтением истории сервера из SQLite; число колец
+    ограничено max_bytes. Порядок вытеснения обновляют только чтения.
+    """
+
+    def __init__(self, since_ms, capacity=DEFAULT_CAPACITY, max_bytes=DEFAULT_MAX_BYTES, columns=3):
+        # Точки с меткой раньше since_ms могли быть сохранены до запуска, а в базе - и более новые
+        self.since_ms = since_ms
+        self.capacity = capacity
+        self.columns = columns
+        buffer_bytes = capacity * (np.dtype(np.int64).itemsize + columns * np.dtype(np.float64).itemsize)
+        self.max_buffers = max(1, max_bytes // buffer_bytes)
+        self._buffers = OrderedDict()
+        # Число записей и последняя записанная метка по server_id
+        self._versions = {}
+        self._latest = {}
+        # Растет при сбросе колец: заполнение, начатое до сброса, отбрасывается
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def add(self, rows):
+        """Добавляет зафиксированные строки (server_id, ts, *значения) в кольца серверов"""
+        with self._lock:
+            for server_id, ts, *values in rows:
+                self._versions[server_id] = self._versions.get(server_id, 0) + 1
+                buffer = self._buffers.get(server_id)
+                if (buffer is None and ts >= self.since_ms and ts > self._latest.get(server_id, ts - 1)
+                        and len(self._buffers) < self.max_buffers):
+                    # В базе нет точек новее ts: кольцо полно начиная с нее. Еще не читалось - вытесняется первым
+                    buffer = self._buffers[server_id] = RingBuffer(self.capacity, self.columns)
+                    self._buffers.move_to_end(server_id, last=False)
+                if buffer is not None:
+                    buffer.append(ts, values)
+                self._latest[server_id] = max(ts, self._latest.get(server_id, ts))
+
+    def version(self, server_id):
+        """Состояние записей сервера перед чтением из SQLite; передается в fill"""
+        with self._lock:
+            return self._generation, self._versions.get(server_id, 0)
+
+    def fill(self, server_id, rows, start_ms, version):
+        """Создает кольцо по строкам истории (ts, *значения), прочитанным из SQLite начиная с start_ms
+
+        Если после чтения (version) сервер получил новые записи, строки устарели
+        и кольцо не создается.
+        """
+        with self._lock:
+            if server_id in self._buffers or (self._generation, self._versions.get(server_id, 0)) != version:
+                return
+            buffer = RingBuffer(self.capacity, self.columns)
+            buffer.covered_from = start_ms
+            for ts, *values in rows[-self.capacity:]:
+                buffer.append(ts, values)
+            if len(rows) > self.capacity:
+                buffer.covered_from = int(rows[-self.capacity][0])
+            self._buffers[server_id] = buffer
+            while len(self._buffers) > self.max_buffers:
+                self._buffers.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def window(self, server_id, start_ms):
+        """(ts, values, covered_from) точек сервера начиная с start_ms или None, если кольца нет
+
+        Точек раньше covered_from в кольце нет - их нужно дочитать из SQLite.
+        Запрос, целиком покрытый кольцом, считается попаданием, остальные - промахом.
+        """
+        with self._lock:
+            buffer = self._buffers.get(server_id)
+            if buffer is None:
+                self.stats['misses'] += 1
+                return None
+            self._buffers.move_to_end(server_id)
+            ts, values = buffer.window(start_ms)
+            self.stats['hits' if start_ms >= buffer.covered_from else 'misses'] += 1
+            return ts, values, buffer.covered_from
+
+    def discard(self, server_id=None):
+        """Убирает кольцо сервера (или все кольца), например после удаления его данных"""
+        with self._lock:
+            self._generation += 1
+            if server_id is None:
+                self._buffers.clear()
+            else:
+                self._buffers.pop(server_id, None)
+
+    def get_stats(self):
+        """Попадания, промахи, вытеснения, число колец и занятая ими память"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['servers'] = len(self._buffers)
+            stats['bytes'] = sum(buffer.nbytes for buffer in self._buffers.values())
+        return stats
@@ -0,0 +1,207 @@
+import datetime
+import threading
+import time
+
+from models.rollup import ROLLUP_TIERS
+from models.shards import SHARDED_TABLES
+
+# Сколько дней хранится каждая таблица
+DEFAULT_POLICIES = {
+    'metrics': 7,
+    'metric_blocks': 7,
+    'disk_metrics': 7,
+    'metrics_1m': 14,
+    'metrics_5m': 90,
+    'metrics_1h': 730,
+    'incidents': 90,
+    'alerts': 90,
+    # Предупреждения каждые 5 с обычно никто не подтверждает - без срока таблица растет бесконечно
+    'alerts_unacknowledged': 180,
+}
+
+# Ряды с ключом (server_id, [volume_id,] время в мс эпохи): таблица -> столбец времени.
+# Сжатый блок удаляется, когда срок вышел у его последней точки
+SERIES_TABLES = dict({'metrics': 'ts', 'metric_blocks': 'last_ts', 'disk_metrics': 'ts'},
+                     **{table: 'bucket' for table, _ in ROLLUP_TIERS})
+
+# Политики событий: имя -> (таблица, условие). Закрытые события и неподтвержденные
+# оповещения хранятся разные сроки; время - строка локального времени
+EVENT_TABLES = {
+    'incidents': ('incidents', 'resolved = TRUE'),
+    'alerts': ('alerts', 'acknowledged = TRUE'),
+    'alerts_unacknowledged': ('alerts', 'acknowledged = FALSE'),
+}
+
+
+class RetentionService:
+    """Фоновое удаление устаревших данных небольшими порциями и возврат страниц файлу
+
+    Каждая порция - отдельная короткая транзакция, между порциями поток
+    уступает базу писателю. Размер порции подстраивается так, чтобы
+    транзакция укладывалась в max_chunk_time.
+    """
+
+    def __init__(self, database, policies=None, interval=3600, initial_delay=60,
+                 chunk_rows=2000, max_chunk_time=0.05, pause=0.05, vacuum_pages=256):
+        self.db = database
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self.chunk_rows = chunk_rows
+        self.min_chunk_rows = 100
+        self.max_chunk_rows = chunk_rows * 16
+        self.max_chunk_time = max_chunk_time
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.last_report = None
+
+    def start(self):
+        """Запускает периодическую очистку в фоновом потоке"""
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Прерывает очистку; недоделанное будет удалено при следующем запуске"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def get_report(self):
+        """Итог последнего прохода: удаленные строки по таблицам и освобожденные байты"""
+        with self._lock:
+            return self.last_report
+
+    def _run(self):
+        if self._stop_event.wait(self.initial_delay):
+            return
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Ошибка при очистке старых данных: {e}")
+            if self._stop_event.wait(self.interval):
+                return
+
+    def run_once(self, now=None):
+        """Один проход по всем политикам и возврат свободных страниц; возвращает отчет"""
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        report = {'rows': {}, 'chunks': 0, 'bytes_freed': 0, 'shards_dropped': 0}
+
+        shards_freed = 0
+        shards = getattr(self.db, 'shards', None)
+        if shards is not None and all(table in self.policies for table in SHARDED_TABLES):
+            # Шарды целиком старше срока хранения удаляются вместе с файлами
+            days = max(self.policies[table] for table in SHARDED_TABLES)
+            report['shards_dropped'], shards_freed = shards.drop_before(int((now - days * 86400) * 1000))
+
+        conn = self.db.get_connection(timeout=0)
+        try:
+            for table, days in self.policies.items():
+                cutoff = now - days * 86400
+                if table in SERIES_TABLES:
+                    deleted = self._purge_series(conn, table, SERIES_TABLES[table], int(cutoff * 1000), report)
+                elif table in EVENT_TABLES:
+                    local = datetime.datetime.fromtimestamp(cutoff).strftime('%Y-%m-%d %H:%M:%S')
+                    deleted = self._purge_events(conn, *EVENT_TABLES[table], local, report)
+                else:
+                    continue
+                report['rows'][table] = deleted
+            report['bytes_freed'] = self._vacuum(conn) + shards_freed
+        finally:
+            conn.close()
+
+        report['duration'] = time.perf_counter() - started
+        with self._lock:
+            self.last_report = report
+        return report
+
+    def _prefixes(self, conn, table):
+        """Значения ведущих столбцов ключа, по которым таблица читается диапазонами"""
+        server_ids = self.db.get_server_ids()
+        if table == 'disk_metrics':
+            # Только тома, по которым у сервера есть строки
+            cursor = conn.cursor()
+            return ('server_id', 'volume_id'), [(s, v) for s in server_ids
+                                                for v in self.db._server_volume_ids(cursor, 'main', s)]
+        return ('server_id',), [(s,) for s in server_ids]
+
+    def _purge_series(self, conn, table, column, cutoff, report):
+        """Удаляет строки старше cutoff диапазонами ключа каждого сервера"""
+        columns, prefixes = self._prefixes(conn, table)
+        where = " AND ".join(f"{name} = ?" for name in columns)
+        deleted = 0
+        for prefix in prefixes:
+            while not self._stop_event.is_set():
+
+                def chunk(cursor):
+                    # Граница порции - chunk_rows-я по счету метка; без нее удаляется остаток
+                    cursor.execute(f"SELECT {column} FROM {table} WHERE {where} AND {column} < ? "
+                                   f"ORDER BY {column} LIMIT 1 OFFSET ?", (*prefix, cutoff, self.chunk_rows - 1))
+                    row = cursor.fetchone()
+                    if row is None:
+                        cursor.execute(f"DELETE FROM {table} WHERE {where} AND {column} < ?", (*prefix, cutoff))
+                    else:
+                        cursor.execute(f"DELETE FROM {table} WHERE {where} AND {column} <= ?", (*prefix, row[0]))
+                    return cursor.rowcount, row is None
+
+                count, done = self._run_chunk(conn, chunk, report)
+                deleted += count
+                if done:
+                    break
+        return deleted
+
+    def _purge_events(self, conn, table, condition, cutoff, report):
+        """Удаляет события table, отвечающие condition, старше cutoff порциями по rowid"""
+        deleted = 0
+        while not self._stop_event.is_set():
+
+            def chunk(cursor):
+                cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} "
+                               f"WHERE {condition} AND timestamp < ? LIMIT ?)", (cutoff, self.chunk_rows))
+                return cursor.rowcount, cursor.rowcount < self.chunk_rows
+
+            count, done = self._run_chunk(conn, chunk, report)
+            deleted += count
+            if done:
+                break
+        return deleted
+
+    def _run_chunk(self, conn, chunk, report):
+        """Выполняет порцию отдельной транзакцией и подстраивает размер следующей"""
+        started = time.perf_counter()
+        result = self.db.run_write(conn, chunk)
+        elapsed = time.perf_counter() - started
+        report['chunks'] += 1
+        if elapsed > self.max_chunk_time:
+            self.chunk_rows = max(self.min_chunk_rows, self.chunk_rows // 2)
+        elif elapsed < self.max_chunk_time / 4:
+            self.chunk_rows = min(self.max_chunk_rows, self.chunk_rows * 2)
+        if self.pause:
+            # Уступаем базу потоку записи
+            time.sleep(self.pause)
+        return result
+
+    def _vacuum(self, conn):
+        """Возвращает свободные страницы файлу порциями (auto_vacuum=INCREMENTAL); возвращает байты"""
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        while not self._stop_event.is_set():
+            if not conn.execute("PRAGMA freelist_count").fetchone()[0]:
+                break
+            self.db.run_write(conn, lambda cursor: cursor.execute(
+                f"PRAGMA incremental_vacuum({self.vacuum_pages})").fetchall())
+            if self.pause:
+                time.sleep(self.pause)
+        after = conn.execute("PRAGMA page_count").fetchone()[0]
+        return (before - after) * page_size
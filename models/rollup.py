@@ -0,0 +1,104 @@
+# Агрегаты метрик по интервалам для длинных периодов истории.
+# Уровни агрегации от мелкого к крупному: (таблица, длина интервала в мс)
+ROLLUP_TIERS = (
+    ('metrics_1m', 60 * 1000),
+    ('metrics_5m', 5 * 60 * 1000),
+    ('metrics_1h', 60 * 60 * 1000),
+)
+
+ROLLUP_METRICS = ('cpu_usage', 'ram_usage', 'temperature')
+ROLLUP_STATS = ('min', 'max', 'avg', 'last')
+
+ROLLUP_COLUMNS = ('server_id', 'bucket', 'count', 'last_ts') + tuple(
+    f"{metric}_{stat}" for metric in ROLLUP_METRICS for stat in ROLLUP_STATS)
+
+
+def rollup_schema(table):
+    """CREATE TABLE уровня агрегации: строка на (сервер, начало интервала)"""
+    columns = ",\n".join(f"                {metric}_{stat} REAL"
+                         for metric in ROLLUP_METRICS for stat in ROLLUP_STATS)
+    return f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                server_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,  -- начало интервала, мс эпохи
+                count INTEGER NOT NULL,
+                last_ts INTEGER NOT NULL,
+{columns},
+                PRIMARY KEY (server_id, bucket)
+            ) WITHOUT ROWID"""
+
+
+def rollup_upsert(table):
+    """INSERT, объединяющий агрегат пачки с уже сохраненным агрегатом интервала"""
+    updates = []
+    for metric in ROLLUP_METRICS:
+        for stat, merge in (('min', 'MIN'), ('max', 'MAX')):
+            column = f"{metric}_{stat}"
+            updates.append(f"{column} = COALESCE({merge}({column}, excluded.{column}), {column}, excluded.{column})")
+        avg = f"{metric}_avg"
+        updates.append(f"{avg} = COALESCE(({avg} * count + excluded.{avg} * excluded.count) / "
+                       f"(count + excluded.count), {avg}, excluded.{avg})")
+        last = f"{metric}_last"
+        updates.append(f"{last} = CASE WHEN excluded.last_ts >= last_ts "
+                       f"THEN COALESCE(excluded.{last}, {last}) ELSE {last} END")
+    # Все правые части вычисляются по значениям строки до обновления
+    updates.append("count = count + excluded.count")
+    updates.append("last_ts = MAX(last_ts, excluded.last_ts)")
+    return (f"INSERT INTO {table} ({', '.join(ROLLUP_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(ROLLUP_COLUMNS))}) "
+            f"ON CONFLICT(server_id, bucket) DO UPDATE SET {', '.join(updates)}")
+
+
+def rollup_history_sql(table):
+    """История по уровню агрегации в форме сырых строк (начало интервала и средние)"""
+    averages = ', '.join(f"{metric}_avg" for metric in ROLLUP_METRICS)
+    return f"""
+        SELECT bucket, {averages}
+        FROM {table}
+        WHERE server_id = ? AND bucket >= ?
+        ORDER BY bucket
+    """
+
+
+def aggregate(samples, step):
+    """Сворачивает строки (server_id, ts, cpu_usage, ram_usage, temperature) в агрегаты интервалов step
+
+    Возвращает строки в порядке ROLLUP_COLUMNS.
+    """
+    buckets = {}
+    for server_id, ts, *values in samples:
+        key = (server_id, ts - ts % step)
+        entry = buckets.get(key)
+        if entry is None:
+            # [count, last_ts, по метрике: [min, max, sum, n, last]]
+            entry = buckets[key] = [0, ts, [[None, None, 0.0, 0, None] for _ in ROLLUP_METRICS]]
+        entry[0] += 1
+        newest = ts >= entry[1]
+        if newest:
+            entry[1] = ts
+        for stats, value in zip(entry[2], values):
+            if value is None:
+                continue
+            stats[0] = value if stats[0] is None else min(stats[0], value)
+            stats[1] = value if stats[1] is None else max(stats[1], value)
+            stats[2] += value
+            stats[3] += 1
+            if newest or stats[4] is None:
+                stats[4] = value
+
+    rows = []
+    for (server_id, bucket), (count, last_ts, metrics) in buckets.items():
+        row = [server_id, bucket, count, last_ts]
+        for low, high, total, n, last in metrics:
+            row.extend((low, high, total / n if n else None, last))
+        rows.append(tuple(row))
+    return rows
+
+
+def pick_tier(hours, points):
+    """Самый крупный уровень, дающий за hours часов не меньше points точек, или None (сырые данные)"""
+    span = hours * 3600 * 1000
+    for table, step in reversed(ROLLUP_TIERS):
+        if span // step >= points:
+            return table, step
+    return None
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+
+# Состояния автомата защиты (circuit breaker) сервера
+CLOSED = 'closed'        # сервер доступен, выполняется полный сбор
+OPEN = 'open'            # сервер недоступен, опрос отложен с нарастающей задержкой
+HALF_OPEN = 'half_open'  # выполняется пробный запрос up перед возвратом к полному сбору
+
+
+class PollScheduler:
+    """Планировщик опроса серверов с экспоненциальной задержкой, разбросом и защитой от недоступных серверов"""
+
+    def __init__(self, interval=5, max_backoff=300, jitter=0.1, failure_threshold=3, rng=None):
+        self.interval = interval
+        self.max_backoff = max_backoff
+        # Доля интервала, на которую случайно сдвигается каждый опрос
+        self.jitter = jitter
+        # Число неудач подряд, после которого полный сбор заменяется пробными запросами
+        self.failure_threshold = failure_threshold
+        self._rng = rng if rng is not None else random.Random()
+        self._lock = threading.Lock()
+
+        self._intervals = {}  # url -> индивидуальный интервал опроса
+        self._next_due = {}   # url -> время следующего опроса (monotonic)
+        self._failures = {}   # url -> число неудачных опросов подряд
+        self._state = {}      # url -> состояние защиты
+        self._skipped = {}    # url -> число пропущенных тиков
+        self.stats = {'polls': 0, 'probes': 0, 'failures': 0, 'skipped': 0}
+
+    def set_interval(self, url, interval):
+        """Задает индивидуальный интервал опроса сервера"""
+        with self._lock:
+            self._intervals[url] = interval
+
+    def forget(self, url):
+        """Удаляет состояние сервера"""
+        with self._lock:
+            for state in (self._intervals, self._next_due, self._failures, self._state, self._skipped):
+                state.pop(url, None)
+
+    def get_state(self, url):
+        with self._lock:
+            return self._state.get(url, CLOSED)
+
+    def get_skipped(self, url):
+        with self._lock:
+            return self._skipped.get(url, 0)
+
+    def get_stats(self):
+        """Возвращает счетчики опросов и число серверов с открытой защитой"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['open'] = sum(1 for state in self._state.values() if state != CLOSED)
+            return stats
+
+    def _jittered(self, delay):
+        return delay * (1 + self._rng.uniform(-self.jitter, self.jitter))
+
+    def due(self, urls, running, now=None):
+        """Возвращает список (url, probe) серверов, которые пора опросить
+
+        Сервер, предыдущий опрос которого еще не завершен, пропускает тик.
+        """
+        now = time.monotonic() if now is None else now
+        result = []
+        with self._lock:
+            for index, url in enumerate(urls):
+                if url not in self._next_due:
+                    # Разносим первые опросы по интервалу, чтобы они не совпадали
+                    self._next_due[url] = now + self.interval * index / max(len(urls), 1)
+                if self._next_due[url] > now:
+                    continue
+                interval = self._intervals.get(url, self.interval)
+                self._next_due[url] = now + self._jittered(interval)
+                if url in running:
+                    self._skipped[url] = self._skipped.get(url, 0) + 1
+                    self.stats['skipped'] += 1
+                    continue
+                probe = self._state.get(url, CLOSED) != CLOSED
+                if probe:
+                    self._state[url] = HALF_OPEN
+                    self.stats['probes'] += 1
+                else:
+                    self.stats['polls'] += 1
+                result.append((url, probe))
+        return result
+
+    def report(self, url, ok, now=None):
+        """Учитывает результат опроса: сбрасывает задержку или увеличивает ее"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if ok:
+                if self._state.get(url, CLOSED) != CLOSED:
+                    # Пробный запрос прошел - полный сбор сразу на следующем тике
+                    self._next_due[url] = now
+                self._failures[url] = 0
+                self._state[url] = CLOSED
+                return
+
+            failures = self._failures.get(url, 0) + 1
+            self._failures[url] = failures
+            self.stats['failures'] += 1
+            if failures >= self.failure_threshold:
+                self._state[url] = OPEN
+            interval = self._intervals.get(url, self.interval)
+            delay = min(interval * 2 ** failures, self.max_backoff)
+            self._next_due[url] = now + self._jittered(delay)
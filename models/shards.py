@@ -0,0 +1,158 @@
+import datetime
+import glob
+import os
+import re
+import threading
+from pathlib import Path
+
+DAY_MS = 86400 * 1000
+
+# Длина периода шарда и сдвиг начала относительно эпохи (1970-01-05 - понедельник)
+SHARD_PERIODS = {
+    'day': (DAY_MS, 0),
+    'week': (7 * DAY_MS, 4 * DAY_MS),
+}
+
+# Таблицы сырых рядов, которые хранятся в шардах
+SHARDED_TABLES = ('metrics', 'disk_metrics')
+
+# SQLite по умолчанию подключает не больше 10 баз; одна из них - основная
+MAX_ATTACHED = 8
+
+SHARD_NAME = re.compile(r'^shard_(\d{8})$')
+
+
+class ShardSet:
+    """Файлы-шарды сырых метрик по периодам (день или неделя), подключаемые через ATTACH
+
+    Шард - отдельный файл рядом с основной базой, например servers.metrics-20240101.db,
+    с теми же таблицами metrics и disk_metrics. Запись идет в шард периода точки,
+    чтение обходит только шарды, пересекающиеся с запрошенным интервалом, а
+    удаление старых данных сводится к удалению файлов.
+    """
+
+    def __init__(self, db_file, period, create_tables, mmap_size=268435456):
+        if period not in SHARD_PERIODS:
+            raise ValueError(f"Неизвестный период шарда: {period}")
+        self.db_file = db_file
+        self.period = period
+        self.length, self.offset = SHARD_PERIODS[period]
+        # create_tables(cursor, schema) создает таблицы рядов в подключенной базе
+        self.create_tables = create_tables
+        self.mmap_size = mmap_size
+        self._lock = threading.Lock()
+        self._starts = set(self._scan())
+        # Удаленные шарды: соединения отключают их при следующем использовании
+        self._retired = set()
+
+    def _pattern(self):
+        path = Path(self.db_file)
+        return path.with_name(f"{path.stem}.metrics-*.db")
+
+    def _scan(self):
+        for path in glob.glob(str(self._pattern())):
+            match = re.search(r'\.metrics-(\d{8})\.db$', path)
+            if match:
+                yield self._parse_date(match.group(1))
+
+    @staticmethod
+    def _parse_date(text):
+        date = datetime.datetime.strptime(text, '%Y%m%d').replace(tzinfo=datetime.timezone.utc)
+        return int(date.timestamp() * 1000)
+
+    @staticmethod
+    def _date(start):
+        return datetime.datetime.fromtimestamp(start / 1000, datetime.timezone.utc).strftime('%Y%m%d')
+
+    def start_of(self, ts):
+        """Начало периода шарда, в который попадает ts (мс эпохи, UTC)"""
+        return ts - (ts - self.offset) % self.length
+
+    def path(self, start):
+        path = Path(self.db_file)
+        return str(path.with_name(f"{path.stem}.metrics-{self._date(start)}.db"))
+
+    def schema(self, start):
+        """Имя подключенной базы шарда"""
+        return f"shard_{self._date(start)}"
+
+    def starts(self):
+        """Начала периодов существующих шардов по возрастанию"""
+        with self._lock:
+            return sorted(self._starts)
+
+    def overlapping(self, start_ms, end_ms=None):
+        """Шарды, пересекающиеся с [start_ms, end_ms], по возрастанию времени"""
+        return [start for start in self.starts()
+                if start + self.length > start_ms and (end_ms is None or start <= end_ms)]
+
+    def attach(self, conn, starts, readonly=False):
+        """Подключает шарды к соединению; возвращает имена подключенных баз
+
+        Вызывается вне транзакции: SQLite не выполняет ATTACH и DETACH внутри нее.
+        При записи отсутствующие шарды создаются, при чтении - пропускаются.
+        """
+        starts = list(starts)
+        wanted = {self.schema(start) for start in starts}
+        attached = [row[1] for row in conn.execute("PRAGMA database_list") if SHARD_NAME.match(row[1])]
+        with self._lock:
+            retired = {self.schema(start) for start in self._retired}
+        # Отключаем удаленные шарды и освобождаем место под нужные
+        free = MAX_ATTACHED - len(wanted)
+        for name in attached:
+            if name in retired or (name not in wanted and free <= 0):
+                conn.execute(f"DETACH DATABASE {name}")
+            elif name not in wanted:
+                free -= 1
+        attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+
+        names = []
+        for start in starts:
+            name = self.schema(start)
+            if name in attached:
+                names.append(name)
+                continue
+            path = self.path(start)
+            if readonly:
+                if not os.path.exists(path):
+                    continue
+                conn.execute("ATTACH DATABASE ? AS " + name, (Path(path).resolve().as_uri() + '?mode=ro',))
+                # Закрытые периоды только читаются - отображаем их в память
+                conn.execute(f"PRAGMA {name}.mmap_size = {self.mmap_size}")
+            else:
+                conn.execute("ATTACH DATABASE ? AS " + name, (path,))
+                conn.execute(f"PRAGMA {name}.journal_mode = WAL")
+                self.create_tables(conn.cursor(), name)
+                with self._lock:
+                    self._starts.add(start)
+                    self._retired.discard(start)
+            names.append(name)
+        return names
+
+    def drop_before(self, cutoff_ms):
+        """Удаляет шарды, период которых целиком старше cutoff_ms; возвращает (число, байты)
+
+        Файл, который еще открыт другим соединением (Windows), удаляется при следующем вызове.
+        """
+        dropped = 0
+        freed = 0
+        for start in self.starts():
+            if start + self.length > cutoff_ms:
+                continue
+            with self._lock:
+                self._starts.discard(start)
+                self._retired.add(start)
+            path = self.path(start)
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    size = os.path.getsize(path + suffix)
+                    os.remove(path + suffix)
+                    freed += size
+                except FileNotFoundError:
+                    pass
+                except PermissionError:
+                    with self._lock:
+                        self._starts.add(start)
+            if not os.path.exists(path):
+                dropped += 1
+        return dropped, freed
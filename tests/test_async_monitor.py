@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля async_monitor
+"""
+
+import unittest
+import time
+from unittest.mock import MagicMock
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.async_monitor import AsyncPrometheusMonitor
+from models.monitor import BATCH_LABEL, BATCH_QUERIES
+
+
+def _fake_prom(delay, up='1'):
+    """Заглушка PrometheusConnect, отвечающая с задержкой"""
+    prom = MagicMock()
+
+    def custom_query(query, timeout=None):
+        time.sleep(delay)
+        return [{'metric': {BATCH_LABEL: 'network:up'}, 'value': [0, up]}]
+
+    prom.custom_query.side_effect = custom_query
+    return prom
+
+
+class TestAsyncPrometheusMonitor(unittest.TestCase):
+    """Тестовый класс для AsyncPrometheusMonitor"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.pool = MagicMock()
+        self.delays = {}
+        self.pool.connect.side_effect = lambda url: _fake_prom(self.delays.get(url, 0))
+
+    def test_servers_scraped_in_parallel(self):
+        """Тест: серверы опрашиваются одновременно"""
+        urls = [f"http://server-{i}:9090" for i in range(5)]
+        for url in urls:
+            self.delays[url] = 0.2
+        monitor = AsyncPrometheusMonitor(max_concurrency=10, pool=self.pool)
+
+        started = time.monotonic()
+        results = monitor.run_tick(urls)
+        elapsed = time.monotonic() - started
+        monitor.close()
+
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(set(results), set(urls))
+        for instances in results.values():
+            self.assertEqual(instances['']['network'], '1')
+
+    def test_tick_deadline(self):
+        """Тест: медленный сервер не задерживает тик дольше срока"""
+        self.delays["http://slow:9090"] = 1.0
+        monitor = AsyncPrometheusMonitor(request_timeout=5, tick_deadline=0.2, pool=self.pool)
+
+        started = time.monotonic()
+        results = monitor.run_tick(["http://slow:9090", "http://fast:9090"])
+        elapsed = time.monotonic() - started
+        monitor.close()
+
+        self.assertLess(elapsed, 0.8)
+        self.assertIsNone(results["http://slow:9090"])
+        self.assertEqual(results["http://fast:9090"]['']['network'], '1')
+
+    def test_split_queries(self):
+        """Тест: в режиме split все запросы сервера выполняются отдельно"""
+        monitor = AsyncPrometheusMonitor(split_queries=True, pool=self.pool)
+        monitor.run_tick(["http://server:9090"])
+        monitor.close()
+        self.assertEqual(monitor.stats['queries'], len(BATCH_QUERIES))
+
+
+if __name__ == '__main__':
+    unittest.main()
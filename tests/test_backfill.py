@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля backfill
+"""
+
+import unittest
+import tempfile
+import datetime
+import sqlite3
+from unittest.mock import MagicMock
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.backfill import HistoryBackfill, split_matrix
+from models.monitor import BATCH_LABEL
+
+
+def _series(tag, points, **labels):
+    labels[BATCH_LABEL] = tag
+    return {'metric': labels, 'values': [[ts, value] for ts, value in points]}
+
+
+def _range_response(query, start_time, end_time, step, timeout=None):
+    """Заглушка query_range: значения на каждом шаге интервала"""
+    start, end, step = int(start_time.timestamp()), int(end_time.timestamp()), int(step)
+    stamps = range(start, end + 1, step)
+    return [
+        _series('cpu:usage_precent', [(ts, '0.25') for ts in stamps]),
+        _series('cpu:temperatur', [(ts, '60') for ts in stamps]),
+        _series('ram:available', [(ts, '4') for ts in stamps]),
+        _series('ram:all', [(ts, '16') for ts in stamps]),
+        _series('rom:available', [(ts, '25') for ts in stamps], volume='C:'),
+        _series('rom:all', [(ts, '100') for ts in stamps], volume='C:'),
+    ]
+
+
+class TestHistoryBackfill(unittest.TestCase):
+    """Тестовый класс для HistoryBackfill"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(self.temp_db.name)
+        self.url = "http://test-server:9090"
+        self.db.add_server(self.url)
+
+        self.prom = MagicMock()
+        self.prom.custom_query_range.side_effect = _range_response
+        pool = MagicMock()
+        pool.connect.return_value = self.prom
+        self.backfill = HistoryBackfill(self.db, lookback_hours=1, step=60, chunk_points=10, pool=pool)
+        self.now = 1_700_000_000
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.conn.close()
+        try:
+            os.unlink(self.temp_db.name)
+        except PermissionError:
+            pass
+
+    def test_split_matrix(self):
+        """Тест разбора матрицы query_range на снимки"""
+        start = datetime.datetime.fromtimestamp(0)
+        end = datetime.datetime.fromtimestamp(60)
+        snapshots = split_matrix(_range_response(None, start, end, '60'))
+        self.assertEqual([(instance, ts) for instance, ts, _ in snapshots], [('', 0), ('', 60)])
+        snapshot = snapshots[0][2]
+        self.assertEqual(snapshot['cpu']['usage_precent'], 0.25)
+        self.assertEqual(snapshot['ram']['usage_precent'], 75.0)
+        self.assertEqual(snapshot['rom']['C:']['usage_precent'], 75.0)
+
+    def test_split_matrix_by_instance(self):
+        """Тест: серии разных экземпляров дают отдельные снимки"""
+        data = [
+            _series('cpu:usage_precent', [(0, '0.1')], instance='node-1'),
+            _series('cpu:usage_precent', [(0, '0.9')], instance='node-2'),
+        ]
+        snapshots = split_matrix(data)
+        self.assertEqual([(instance, ts) for instance, ts, _ in snapshots], [('node-1', 0), ('node-2', 0)])
+        self.assertEqual(snapshots[1][2]['cpu']['usage_precent'], 0.9)
+
+    def test_backfill_chunks_and_progress(self):
+        """Тест: история загружается блоками и прогресс доходит до конца"""
+        inserted = self.backfill.backfill(self.url, now=self.now)
+
+        # Час с шагом 60 с - 61 точка, блоки по 10 точек
+        self.assertEqual(inserted, 61)
+        self.assertEqual(self.prom.custom_query_range.call_count, 7)
+        self.assertEqual(self.backfill.get_progress(self.url), 1.0)
+        self.assertEqual(self.db.get_backfill_progress(self.url), self.now // 60 * 60)
+
+    def test_backfill_resumes_and_skips_duplicates(self):
+        """Тест: повторный запуск продолжает с места остановки без дубликатов"""
+        self.backfill.backfill(self.url, now=self.now)
+        calls = self.prom.custom_query_range.call_count
+
+        # Повтор в тот же момент - загружать нечего
+        self.assertEqual(self.backfill.backfill(self.url, now=self.now), 0)
+        self.assertEqual(self.prom.custom_query_range.call_count, calls)
+
+        # Сброс прогресса - данные запрашиваются снова, но дубликаты не пишутся
+        self.db.set_backfill_progress(self.url, None)
+        self.assertEqual(self.backfill.backfill(self.url, now=self.now), 0)
+
+    def test_progress_committed_with_rows(self):
+        """Тест: прогресс фиксируется вместе со строками, в том числе при работающем потоке записи"""
+        self.db.start_writer()
+        try:
+            self.backfill.chunk_points = 100
+            self.backfill.backfill(self.url, now=self.now)
+            # Строки уже в базе без ожидания очереди записи
+            self.assertEqual(len(self.db.get_metric_timestamps(self.url, 0, self.now * 1000)), 61)
+        finally:
+            self.db.close_writer()
+
+    def test_failed_chunk_keeps_progress(self):
+        """Тест: при ошибке записи блока прогресс не сдвигается и блок загружается повторно"""
+        write_metrics = self.db._write_metrics
+        self.db._write_metrics = MagicMock(side_effect=sqlite3.OperationalError('disk I/O error'))
+        self.db.start_writer()
+        try:
+            with self.assertRaises(sqlite3.OperationalError):
+                self.backfill.backfill(self.url, now=self.now)
+            self.db.flush_writes()
+            self.assertIsNone(self.db.get_backfill_progress(self.url))
+        finally:
+            self.db.close_writer()
+
+        self.db._write_metrics = write_metrics
+        self.assertEqual(self.backfill.backfill(self.url, now=self.now), 61)
+
+    def test_skips_steps_with_own_points(self):
+        """Тест: шаги, в которых уже есть собственный опрос, не дублируются загрузкой"""
+        end = self.now // 60 * 60
+        # Опросы сдвинуты относительно сетки шагов на 7 с
+        polls = [(end - minutes * 60 + 7) * 1000 for minutes in (1, 2, 3)]
+        self.db.save_metrics_batch([(self.url, '', ts, 1.0, 1.0, 1.0, None) for ts in polls])
+        self.assertEqual(self.backfill.backfill(self.url, now=self.now), 58)
+        stamps = self.db.get_metric_timestamps(self.url, 0, self.now * 1000)
+        self.assertEqual(len({ts // 60000 for ts in stamps}), len(stamps))
+
+
+if __name__ == '__main__':
+    unittest.main()
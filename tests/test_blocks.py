@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля blocks
+"""
+
+import unittest
+import tempfile
+import math
+import random
+import time
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.retention import RetentionService
+from models.blocks import BLOCK_MS, block_start, decode_block, decode_rows_arrays, encode_block
+
+STEP = 5000
+
+
+class TestBlockCodec(unittest.TestCase):
+    """Тестовый класс для сжатия точек в блоки"""
+
+    def test_round_trip(self):
+        """Тест: точки восстанавливаются без потерь, включая пропуски и скачки времени"""
+        rng = random.Random(1)
+        ts = 1700000000000
+        samples = []
+        for i in range(500):
+            ts += STEP + rng.randint(-40, 40)
+            samples.append((ts, round(rng.uniform(0, 100), 1), 45.5 if i % 10 else 46.0,
+                            None if i % 7 == 0 else float(rng.randint(40, 45))))
+        samples.append((ts + BLOCK_MS // 2, 0.0, -1.5, 1e300))
+        self.assertEqual(decode_block(encode_block(samples)), samples)
+        self.assertEqual(decode_block(encode_block(samples[:1])), samples[:1])
+        self.assertEqual(decode_block(encode_block([])), [])
+
+        ts, values = decode_rows_arrays([(len(samples), encode_block(samples)), (0, encode_block([]))], samples[100][0])
+        self.assertEqual(ts.tolist(), [sample[0] for sample in samples[100:]])
+        for index, column in enumerate(values.tolist(), start=1):
+            self.assertEqual([None if math.isnan(value) else value for value in column],
+                             [sample[index] for sample in samples[100:]])
+
+    def test_regular_series_compact(self):
+        """Тест: ровный шаг и повторяющиеся значения занимают по нескольку бит на точку"""
+        samples = [(1700000000000 + i * STEP, 10.0, 50.0, 40.0) for i in range(1440)]
+        self.assertLess(len(encode_block(samples)), 1440)
+
+
+class TestBlockStorage(unittest.TestCase):
+    """Тестовый класс для хранения сырых метрик сжатыми блоками"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(self.temp_db.name, storage='blocks')
+        self.url = "http://test-server:9090"
+        self.db.add_server(self.url)
+        self.now = int(time.time() * 1000)
+        self.head = block_start(self.now)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+    def _count(self, table):
+        return self.db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _save(self, start, count, cpu=None):
+        self.db.save_metrics_batch([(self.url, '', start + i * STEP, float(i % 100) if cpu is None else cpu,
+                                     50.0, None, None) for i in range(count)])
+
+    def test_closed_blocks_sealed(self):
+        """Тест: точки открытого блока остаются строками, закрытые блоки сжимаются"""
+        self._save(self.head - 2 * BLOCK_MS, 100)
+        self.assertEqual(self._count('metric_blocks'), 0)
+        self._save(self.head, 3)
+
+        self.assertEqual(self._count('metrics'), 3)
+        self.assertEqual(self.db.conn.execute("SELECT block_start, count FROM metric_blocks").fetchall(),
+                         [(self.head - 2 * BLOCK_MS, 100)])
+
+        # Опоздавшая точка закрытого блока объединяется с ним и заменяет прежнее значение
+        self.db.save_metrics_batch([(self.url, '', self.head - 2 * BLOCK_MS, 99.0, 0.0, None, None)])
+        self.assertEqual(self._count('metrics'), 3)
+        data = self.db.conn.execute("SELECT data FROM metric_blocks").fetchone()[0]
+        samples = decode_block(data)
+        self.assertEqual(len(samples), 100)
+        self.assertEqual(samples[0], (self.head - 2 * BLOCK_MS, 99.0, 0.0, None))
+
+    def test_readers_match_row_storage(self):
+        """Тест: история, потоковое чтение, массивы и метки совпадают с хранением строками"""
+        start = self.head - BLOCK_MS - 50 * STEP
+        self._save(start, 100)
+        self._save(self.head, 5, cpu=7.0)
+        hours = (self.now - start) / 3600000 + 1
+
+        history = self.db.get_metrics_history(self.url, hours=hours)
+        expected = [(start + i * STEP, float(i % 100), 50.0, None) for i in range(100)]
+        expected += [(self.head + i * STEP, 7.0, 50.0, None) for i in range(5)]
+        self.assertEqual(history, expected)
+        self.assertEqual(list(self.db.iter_metrics_history(self.url, hours=hours, batch_size=1)), expected)
+
+        arrays = self.db.get_metrics_history_arrays(self.url, hours=hours)
+        self.assertEqual(arrays['ts'].tolist(), [row[0] for row in expected])
+        self.assertEqual(arrays['cpu_usage'].tolist(), [row[1] for row in expected])
+        self.assertTrue(all(math.isnan(value) for value in arrays['temperature'].tolist()))
+        # Точки сжатого блока раньше начала периода отбрасываются
+        arrays = self.db.get_metrics_history_arrays(self.url, hours=(self.now - start - 60 * STEP - STEP // 2) / 3600000)
+        self.assertEqual(arrays['ts'].tolist(), [row[0] for row in expected[61:]])
+        self.assertEqual(arrays['ram_usage'].tolist(), [50.0] * len(expected[61:]))
+
+        # Начало интервала внутри сжатого блока
+        stamps = self.db.get_metric_timestamps(self.url, start + 60 * STEP, self.head)
+        self.assertEqual(stamps, {start + i * STEP for i in range(60, 100)} | {self.head})
+
+    def test_retention_drops_blocks(self):
+        """Тест: блок удаляется, когда срок хранения вышел у его последней точки"""
+        self._save(self.head - 10 * 24 * 3600 * 1000, 10)
+        self._save(self.head, 1)
+        report = RetentionService(self.db, {'metrics': 7, 'metric_blocks': 7}, pause=0).run_once()
+
+        self.assertEqual(report['rows']['metric_blocks'], 1)
+        self.assertEqual(self._count('metric_blocks'), 0)
+        self.assertEqual(self._count('metrics'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
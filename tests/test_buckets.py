@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля buckets
+"""
+
+import unittest
+import tempfile
+import math
+import random
+import time
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database, HISTORY_COLUMNS
+from models.buckets import HOUR_MS, MINUTE_MS, bucket_columns, pick_bucket_tier, pick_width
+
+STEP = 5000
+
+
+def nearest_rank(values, percentile=95):
+    values = sorted(value for value in values if value is not None)
+    return values[math.ceil(len(values) * percentile / 100) - 1] if values else None
+
+
+class TestBuckets(unittest.TestCase):
+    """Тестовый класс для сводок истории по интервалам"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = self._open()
+        self.url = "http://test-server:9090"
+        self.db.add_server(self.url)
+        self.now = int(time.time() * 1000)
+
+    def _open(self, **kwargs):
+        return Database(self.temp_db.name, **kwargs)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+    def _save(self, minutes):
+        """Сохраняет точки за последние minutes минут; каждая десятая температура пропущена"""
+        rng = random.Random(1)
+        rows = []
+        start = self.now - minutes * MINUTE_MS + 1000
+        for i in range(minutes * MINUTE_MS // STEP):
+            rows.append((self.url, '', start + i * STEP, round(rng.uniform(0, 100), 1), 50.0 + i % 7,
+                         None if i % 10 == 0 else 40.0 + i % 3, {"C:": {"usage_precent": 10.0 + i % 5}}))
+        self.db.save_metrics_batch(rows)
+        return rows
+
+    def test_pick_width_and_tier(self):
+        """Тест: ширина - наименьшая допустимая, широкие интервалы берутся из агрегатов"""
+        self.assertEqual(pick_width(HOUR_MS, 1000), 5000)
+        self.assertEqual(pick_width(168 * HOUR_MS, 1000), 15 * MINUTE_MS)
+        self.assertEqual(pick_width(1000 * 24 * HOUR_MS, 100), 10 * 24 * HOUR_MS)
+        self.assertIsNone(pick_bucket_tier(2 * MINUTE_MS))
+        self.assertEqual(pick_bucket_tier(15 * MINUTE_MS), 'metrics_1m')
+        self.assertEqual(pick_bucket_tier(30 * MINUTE_MS), 'metrics_5m')
+        self.assertEqual(pick_bucket_tier(6 * HOUR_MS), 'metrics_1h')
+
+    def test_raw_buckets_match_python(self):
+        """Тест: min/avg/max/p95 по сырым точкам совпадают с расчетом в Python, пропуски не учитываются"""
+        rows = self._save(60)
+        width, buckets = self.db.get_metrics_buckets(self.url, hours=1, buckets=100)
+        self.assertEqual(width, 60000)
+        self.assertLessEqual(len(buckets), 100)
+        self.assertEqual(sum(row[1] for row in buckets), len(rows))
+
+        self._assert_matches(rows, width, buckets)
+
+        width, disks = self.db.get_disk_buckets(self.url, hours=1, buckets=100)
+        self.assertEqual(sum(row[1] for row in disks['C:']), len(rows))
+        self.assertEqual({row[4] for row in disks['C:'] if row[1] >= 5}, {14.0})
+
+    def _assert_matches(self, rows, width, buckets):
+        """Сводки совпадают с расчетом в Python по сохраненным точкам"""
+        by_bucket = {}
+        for row in rows:
+            by_bucket.setdefault(row[2] - row[2] % width, []).append(row)
+        columns = bucket_columns(HISTORY_COLUMNS)
+        for bucket in buckets:
+            summary = dict(zip(columns, bucket))
+            samples = by_bucket[summary['ts']]
+            for index, metric in enumerate(HISTORY_COLUMNS, start=3):
+                values = [sample[index] for sample in samples if sample[index] is not None]
+                if not values:
+                    # В интервале только пропуски
+                    self.assertEqual([summary[f'{metric}_{stat}'] for stat in ('min', 'avg', 'max', 'p95')],
+                                     [None] * 4)
+                    continue
+                self.assertEqual(summary[f'{metric}_min'], min(values))
+                self.assertEqual(summary[f'{metric}_max'], max(values))
+                self.assertAlmostEqual(summary[f'{metric}_avg'], sum(values) / len(values))
+                self.assertEqual(summary[f'{metric}_p95'], nearest_rank(values))
+
+    def test_disk_buckets_own_volumes(self):
+        """Тест: сводки томов читаются только по томам этого сервера"""
+        other = "http://other-server:9090"
+        self.db.add_server(other)
+        self.db.save_metrics(self.url, 1.0, 1.0, 1.0, {"C:": {"usage_precent": 10.0}})
+        self.db.save_metrics(other, 1.0, 1.0, 1.0, {"D:": {"usage_precent": 20.0}, "E:": {"usage_precent": 30.0}})
+        server_id = self.db.get_server_id(self.url)
+        self.assertEqual([name for name, _ in self.db._server_volumes(self.db.conn.cursor(), 'main', server_id)],
+                         ['C:'])
+        _, disks = self.db.get_disk_buckets(other, hours=1)
+        self.assertEqual(sorted(disks), ['D:', 'E:'])
+        self.assertEqual([row[3] for row in disks['E:']], [30.0])
+
+    def test_tier_buckets_weighted(self):
+        """Тест: по агрегатам среднее взвешено числом точек, min/max - точные"""
+        rows = self._save(180)
+        width, buckets = self.db.get_metrics_buckets(self.url, hours=3, buckets=20)
+        self.assertEqual(width, 10 * MINUTE_MS)
+        self.assertEqual(sum(row[1] for row in buckets), len(rows))
+        summary = dict(zip(bucket_columns(HISTORY_COLUMNS), buckets[len(buckets) // 2]))
+        samples = [row for row in rows if summary['ts'] <= row[2] < summary['ts'] + width]
+        cpu = [row[3] for row in samples]
+        self.assertEqual((summary['cpu_usage_min'], summary['cpu_usage_max']), (min(cpu), max(cpu)))
+        self.assertAlmostEqual(summary['cpu_usage_avg'], sum(cpu) / len(cpu))
+        self.assertLessEqual(summary['cpu_usage_p95'], summary['cpu_usage_max'])
+
+    def test_block_storage_buckets(self):
+        """Тест: при хранении блоками сводки считаются по распакованным в numpy точкам"""
+        self.db.close()
+        self.db = self._open(storage='blocks')
+        rows = self._save(150)
+        self.assertGreater(self.db.conn.execute("SELECT COUNT(*) FROM metric_blocks").fetchone()[0], 0)
+        width, buckets = self.db.get_metrics_buckets(self.url, hours=3, buckets=1000)
+        self.assertIsNone(pick_bucket_tier(width))
+        self.assertEqual(sum(row[1] for row in buckets), len(rows))
+        # Сводки блоков (numpy) и открытого блока (SQLite) совпадают с расчетом по точкам
+        self._assert_matches(rows, width, buckets)
+        self.assertEqual(self.db.get_metrics_buckets("http://unknown:9090")[1], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
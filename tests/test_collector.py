@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля collector
+"""
+
+import unittest
+import tempfile
+import time
+import threading
+from unittest.mock import MagicMock
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.collector import MetricsCollector
+
+
+SNAPSHOT = {
+    'network': '1',
+    'cpu': {'usage_precent': 12.5, 'temperatur': '50'},
+    'ram': {'usage_precent': '40'},
+    'rom': {'C:': {'usage_precent': '70'}},
+}
+
+
+class TestMetricsCollector(unittest.TestCase):
+    """Тестовый класс для MetricsCollector"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(self.temp_db.name)
+        self.db.add_server("http://server-a:9090")
+        self.db.add_server("http://server-b:9090")
+        self.polled = []
+
+        def factory(url):
+            monitor = MagicMock()
+
+            def get_all_instances():
+                self.polled.append(url)
+                return {'': SNAPSHOT}
+
+            monitor.get_all_instances.side_effect = get_all_instances
+            return monitor
+
+        self.collector = MetricsCollector(self.db, interval=5, monitor_factory=factory)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.conn.close()
+        try:
+            os.unlink(self.temp_db.name)
+        except PermissionError:
+            pass
+
+    def _wait_idle(self):
+        deadline = time.monotonic() + 2
+        while self.collector._running and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_polls_all_servers(self):
+        """Тест: опрашиваются все серверы, а не только выбранный"""
+        # Первые опросы разнесены по интервалу - проходим его целиком
+        now = time.monotonic()
+        self.collector.tick(now=now)
+        self.collector.tick(now=now + 4)
+        self._wait_idle()
+        self.collector.stop()
+
+        self.assertEqual(sorted(set(self.polled)), sorted(self.db.servers))
+        for url in self.db.servers:
+            self.assertEqual(self.collector.get_latest(url)['network'], '1')
+            self.assertEqual(len(self.db.get_metrics_history(url, hours=1)), 1)
+
+    def test_writes_are_batched(self):
+        """Тест: метрики записываются пачкой при сбросе буфера"""
+        self.db.save_metrics_batch = MagicMock()
+        self.collector.flush_interval = 60
+        now = time.monotonic()
+        self.collector.tick(now=now)
+        self._wait_idle()
+        self.collector.tick(now=now + 4)
+        self._wait_idle()
+        self.db.save_metrics_batch.assert_not_called()
+
+        self.collector.flush()
+        self.db.save_metrics_batch.assert_called_once()
+        rows = self.db.save_metrics_batch.call_args[0][0]
+        self.assertEqual(len(rows), len(self.db.servers))
+
+    def test_server_not_polled_twice_while_running(self):
+        """Тест: сервер не опрашивается повторно, пока идет предыдущий опрос"""
+        release = threading.Event()
+        monitor = MagicMock()
+        monitor.get_all_instances.side_effect = lambda: release.wait(2) and {'': SNAPSHOT}
+        self.collector._monitors = {url: monitor for url in self.db.servers}
+
+        now = time.monotonic()
+        self.collector.tick(now=now)
+        self.collector.tick(now=now + 4)
+        self.collector.tick(now=now + 10)
+        release.set()
+        self._wait_idle()
+        self.collector.stop()
+
+        self.assertEqual(monitor.get_all_instances.call_count, len(self.db.servers))
+
+    def test_instances_stored_separately(self):
+        """Тест: экземпляры за одним адресом сохраняются и проверяются отдельно"""
+        url = "http://server-a:9090"
+        monitor = MagicMock()
+        monitor.get_all_instances.return_value = {'node-1:9182': SNAPSHOT, 'node-2:9182': SNAPSHOT}
+        self.collector._monitors = {url: monitor}
+        self.collector.alert_manager = MagicMock()
+
+        self.collector._poll(url)
+        self.collector.flush()
+
+        self.assertEqual(self.collector.get_instances(url), ['node-1:9182', 'node-2:9182'])
+        self.assertIs(self.collector.get_latest(url, 'node-2:9182'), SNAPSHOT)
+        self.assertEqual(self.db.get_instances(url), ['node-1:9182', 'node-2:9182'])
+        self.assertEqual(len(self.db.get_metrics_history(url, hours=1, instance='node-1:9182')), 1)
+        self.assertEqual(self.collector.alert_manager.check_alerts.call_count, 2)
+
+    def test_unreachable_server_probed(self):
+        """Тест: недоступный сервер после серии неудач проверяется только запросом up"""
+        url = "http://server-a:9090"
+        monitor = MagicMock()
+        monitor.get_all_instances.side_effect = ConnectionError("unreachable")
+        monitor.probe.return_value = False
+        self.collector._monitors = {url: monitor}
+
+        for _ in range(self.collector.scheduler.failure_threshold):
+            self.collector._poll(url)
+        self.collector._poll(url, probe=True)
+
+        self.assertEqual(monitor.get_all_instances.call_count, self.collector.scheduler.failure_threshold)
+        monitor.probe.assert_called_once()
+        self.assertEqual(self.collector.get_stats()['failures'], self.collector.scheduler.failure_threshold + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
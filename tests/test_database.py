@@ -10,13 +10,14 @@ import os
 import sqlite3
 import datetime
 import json
+import threading
 from unittest.mock import patch, MagicMock
 
 # Добавляем путь к модулям проекта
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.database import Database
+from models.database import Database, METRICS_HISTORY_SQL, DISK_HISTORY_SQL, UNACKNOWLEDGED_ALERTS_SQL, INCIDENTS_SQL, KEYSET_PAGE_SQL
 
 
 class TestDatabase(unittest.TestCase):
@@ -89,6 +90,18 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(result[0], "http://test-server:9090")
         conn.close()
     
+    def test_servers_list_replaced_whole(self):
+        """Тест: список серверов при обновлении подменяется целиком, прежний не меняется"""
+        assert self.db is not None
+        self.db.add_server("http://server1:9090")
+        servers = self.db.servers
+        before = list(servers)
+        self.db.add_server("http://server2:9090")
+        self.db.delete_server("http://server1:9090")
+        self.assertEqual(servers, before)
+        self.assertNotIn("http://server1:9090", self.db.servers)
+        self.assertIn("http://server2:9090", self.db.servers)
+
     def test_delete_server(self):
         """Тест удаления сервера"""
         assert self.db is not None
@@ -138,10 +151,10 @@ class TestDatabase(unittest.TestCase):
         conn = sqlite3.connect(self.temp_db.name)
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT cpu_usage, ram_usage, temperature, disk_usage 
+            SELECT cpu_usage, ram_usage, temperature 
             FROM metrics 
             WHERE server_id = (SELECT id FROM servers WHERE url = ?)
-            ORDER BY timestamp DESC 
+            ORDER BY ts DESC 
             LIMIT 1
         """, ("http://test-server:9090",))
         result = cursor.fetchone()
@@ -149,7 +162,12 @@ class TestDatabase(unittest.TestCase):
         self.assertEqual(result[0], 45.2)  # cpu_usage
         self.assertEqual(result[1], 60.8)  # ram_usage
         self.assertEqual(result[2], 65.0)  # temperature
-        self.assertEqual(result[3], json.dumps(disk_usage))  # disk_usage
+        # Диски - отдельные строки по томам
+        cursor.execute("""
+            SELECT volumes.name, used_pct, free_gb, total_gb
+            FROM disk_metrics JOIN volumes ON volumes.id = disk_metrics.volume_id
+        """)
+        self.assertEqual(cursor.fetchall(), [("C:", 75.5, None, None)])
         conn.close()
     
     def test_add_incident(self):
@@ -220,7 +238,7 @@ class TestDatabase(unittest.TestCase):
         
         # Проверяем структуру данных
         for record in history:
-            self.assertEqual(len(record), 5)  # timestamp, cpu_usage, ram_usage, temperature, disk_usage
+            self.assertEqual(len(record), 4)  # ts, cpu_usage, ram_usage, temperature
             self.assertIsInstance(record[1], (int, float))  # cpu_usage
             self.assertIsInstance(record[2], (int, float))  # ram_usage
             self.assertIsInstance(record[3], (int, float))  # temperature
@@ -329,6 +347,9 @@ class TestDatabase(unittest.TestCase):
         server_alerts = self.db.get_unacknowledged_alerts("http://test-server:9090")  # type: ignore[attr-defined]
         self.assertIsInstance(server_alerts, list)
         self.assertGreaterEqual(len(server_alerts), 2)
+        # Выдается не больше limit последних
+        latest = self.db.get_unacknowledged_alerts(limit=1)
+        self.assertEqual([alert[0] for alert in latest], [max(alert[0] for alert in alerts)])
         
         # Проверяем, что все оповещения неподтвержденные (работаем с кортежами)
         for alert in server_alerts:
@@ -424,9 +445,9 @@ class TestDatabase(unittest.TestCase):
         conn = self.db.get_connection()  # type: ignore[attr-defined]
         cursor = conn.cursor()
         server_id = self.db.get_server_id("http://test-server:9090")  # type: ignore[attr-defined]
-        old_time = (datetime.datetime.now() - datetime.timedelta(days=10)).strftime('%Y-%m-%d %H:%M:%S')
-        cursor.execute("INSERT INTO metrics (server_id, timestamp, cpu_usage, ram_usage, temperature, disk_usage) VALUES (?, ?, ?, ?, ?, ?)",
-                       (server_id, old_time, 10.0, 20.0, 30.0, None))
+        old_time = int((datetime.datetime.now() - datetime.timedelta(days=10)).timestamp() * 1000)
+        cursor.execute("INSERT INTO metrics (server_id, ts, cpu_usage, ram_usage, temperature) VALUES (?, ?, ?, ?, ?)",
+                       (server_id, old_time, 10.0, 20.0, 30.0))
         conn.commit()
         conn.close()
         
@@ -486,16 +507,10 @@ class TestDatabase(unittest.TestCase):
         # Проверяем в базе данных
         conn = sqlite3.connect(self.temp_db.name)
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT disk_usage 
-            FROM metrics 
-            WHERE server_id = (SELECT id FROM servers WHERE url = ?)
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        """, ("http://test-server:9090",))
-        result = cursor.fetchone()
-        self.assertIsNotNone(result)
-        self.assertIsNone(result[0])  # disk_usage должен быть None
+        cursor.execute("SELECT COUNT(*) FROM metrics")
+        self.assertEqual(cursor.fetchone()[0], 1)
+        cursor.execute("SELECT COUNT(*) FROM disk_metrics")
+        self.assertEqual(cursor.fetchone()[0], 0)  # строк по дискам нет
         conn.close()
     
     def test_save_metrics_with_nonexistent_server(self):
@@ -514,6 +529,397 @@ class TestDatabase(unittest.TestCase):
         
         self.assertEqual(count, 0)
 
+    def test_instances_of_server(self):
+        """Тест: экземпляры сервера создаются при первой записи и хранятся раздельно"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        self.db.save_metrics(url, 10.0, 20.0, 50.0, None, instance="node-1:9182")
+        self.db.save_metrics(url, 30.0, 40.0, 60.0, None, instance="node-2:9182")
+        self.db.save_metrics("http://nonexistent-server:9090", 1.0, 1.0, 1.0, None, instance="node-1:9182")
+
+        self.assertEqual(self.db.get_instances(url), ["node-1:9182", "node-2:9182"])
+        self.assertNotIn("http://nonexistent-server:9090", self.db.servers)
+        self.assertIsNone(self.db.get_server_id("http://nonexistent-server:9090", "node-1:9182"))
+        history = self.db.get_metrics_history(url, hours=1, instance="node-2:9182")
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0][1], 30.0)
+        self.assertEqual(self.db.get_metrics_history(url, hours=1), [])
+
+    def test_history_without_instance(self):
+        """Тест: история, записанная до появления экземпляров, остается доступной по пустому экземпляру"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        self.assertFalse(self.db.has_history(url))
+        self.db.save_metrics(url, 10.0, 20.0, 50.0, None)
+        self.db.save_metrics(url, 30.0, 40.0, 60.0, None, instance="node-1:9182")
+        self.assertEqual(self.db.get_instances(url), ["node-1:9182"])
+        self.assertTrue(self.db.has_history(url))
+        self.assertFalse(self.db.has_history(url, "node-2:9182"))
+        self.assertFalse(self.db.has_history("http://unknown:9090"))
+
+    def test_migrate_servers_without_instance(self):
+        """Тест перевода старой таблицы servers на ключ (url, instance)"""
+        self.db.conn.close()
+        os.unlink(self.temp_db.name)
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("CREATE TABLE servers (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE)")
+        conn.execute("INSERT INTO servers (id, url) VALUES (7, 'http://old-server:9090')")
+        conn.commit()
+        conn.close()
+
+        self.db = Database(self.temp_db.name)
+        self.assertEqual(self.db.servers, ["http://old-server:9090"])
+        self.assertEqual(self.db.get_server_id("http://old-server:9090"), 7)
+
+    def test_wal_and_tuning_profile(self):
+        """Тест: база переводится в WAL и настраивается профилем"""
+        assert self.db is not None
+        self.assertEqual(self.db.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn = self.db.get_connection()
+        try:
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA temp_store").fetchone()[0], 2)  # MEMORY
+        finally:
+            conn.close()
+
+    def test_read_pool_reuses_connections(self):
+        """Тест: читатели берут соединения из пула, а не открывают новые"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        for _ in range(5):
+            self.db.get_metrics_history(url)
+            self.db.get_incidents()
+        stats = self.db.get_contention_stats()
+        self.assertEqual(stats['read_pool_checkouts'], 10)
+        self.assertEqual(stats['read_pool_size'], 1)
+
+        # Соединения пула только для чтения
+        conn = self.db.read_pool.acquire()
+        try:
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM servers")
+        finally:
+            self.db.read_pool.release(conn)
+
+    def test_lock_wait_measured(self):
+        """Тест: запись дожидается освобождения базы, время ожидания учитывается"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        blocker = sqlite3.connect(self.temp_db.name, check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE")
+        timer = threading.Timer(0.1, blocker.commit)
+        timer.start()
+        try:
+            self.db.save_metrics(url, 1.0, 2.0, 3.0, None)
+        finally:
+            timer.join()
+            blocker.close()
+
+        stats = self.db.get_contention_stats()
+        self.assertGreater(stats['lock_waits'], 0)
+        self.assertGreater(stats['lock_wait_time'], 0)
+        self.assertEqual(len(self.db.get_metrics_history(url, hours=1)), 1)
+
+    def test_server_id_map(self):
+        """Тест: id серверов берутся из памяти и обновляются при добавлении и удалении"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        server_id = self.db.get_server_id(url)
+        self.assertIsNotNone(server_id)
+        self.assertEqual(self.db.get_server_key(server_id), (url, ''))
+
+        cursor = MagicMock()
+        self.assertEqual(self.db.get_server_id_threadsafe(url, cursor), server_id)
+        cursor.execute.assert_not_called()
+
+        self.db.add_alert(url, "ram_usage", "RAM", instance="node-1")
+        instance_id = self.db.get_server_id(url, "node-1")
+        self.assertIsNotNone(instance_id)
+        alerts = self.db.get_all_alerts(url)
+        self.assertEqual(alerts[0][1], instance_id)
+        self.assertEqual(alerts[0][-1], f"{url} / node-1")
+
+        self.db.delete_server(url)
+        self.assertIsNone(self.db.get_server_id(url))
+        self.assertIsNone(self.db.get_server_key(server_id))
+        self.assertEqual(self.db.get_all_alerts(), [])
+
+    def test_server_id_map_rollback(self):
+        """Тест: экземпляр из отмененной транзакции не остается в соответствии"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+
+        def write(cursor):
+            self.db.get_server_id_threadsafe(url, cursor, "node-1", create=True)
+            raise ValueError("сбой записи")
+
+        conn = self.db.get_connection()
+        try:
+            with self.assertRaises(ValueError):
+                self.db.run_write(conn, write)
+        finally:
+            conn.close()
+        self.assertIsNone(self.db.get_server_id(url, "node-1"))
+
+    def test_migrate_legacy_metrics(self):
+        """Тест переноса метрик со строковыми метками в таблицу (server_id, ts) порциями"""
+        self.db.conn.close()
+        os.unlink(self.temp_db.name)
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("CREATE TABLE servers (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE)")
+        conn.execute("INSERT INTO servers (id, url) VALUES (1, 'http://old-server:9090')")
+        conn.execute("""CREATE TABLE metrics (id INTEGER PRIMARY KEY AUTOINCREMENT, server_id INTEGER,
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, cpu_usage REAL, ram_usage REAL,
+                        temperature REAL, disk_usage TEXT)""")
+        conn.execute("CREATE INDEX idx_metrics_timestamp ON metrics(timestamp)")
+        start = datetime.datetime(2024, 1, 1, 12, 0, 0)
+        for i in range(10):
+            stamp = (start + datetime.timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')
+            conn.execute("INSERT INTO metrics (server_id, timestamp, cpu_usage, ram_usage, temperature, disk_usage) "
+                         "VALUES (1, ?, ?, 20.0, 30.0, ?)",
+                         (stamp, float(i), json.dumps({"C:": {"usage_precent": 50.0, "available": 10, "all": 20}})))
+        conn.commit()
+        conn.close()
+
+        self.db = Database(self.temp_db.name, migrate_in_background=False)
+        self.assertTrue(self.db.has_legacy_metrics())
+        # Первая порция - самые новые строки
+        self.assertTrue(self.db.migrate_legacy_metrics(chunk_size=4))
+        conn = self.db.get_connection()
+        try:
+            newest = conn.execute("SELECT MIN(cpu_usage) FROM metrics").fetchone()[0]
+            self.assertEqual(newest, 6.0)
+        finally:
+            conn.close()
+
+        # Прерванный перенос продолжается при следующем открытии базы
+        self.db.conn.close()
+        self.db = Database(self.temp_db.name, migrate_in_background=False)
+        while self.db.migrate_legacy_metrics(chunk_size=4):
+            pass
+        self.assertFalse(self.db.has_legacy_metrics())
+        stamps = self.db.get_metric_timestamps("http://old-server:9090", start, start + datetime.timedelta(hours=1))
+        self.assertEqual(len(stamps), 10)
+        self.assertIn(int(start.timestamp() * 1000), stamps)
+        conn = self.db.get_connection()
+        try:
+            self.assertEqual(conn.execute("SELECT COUNT(*), MIN(total_gb) FROM disk_metrics").fetchone(), (10, 20.0))
+        finally:
+            conn.close()
+
+    def test_history_query_plan_uses_primary_key(self):
+        """Тест: запрос истории за 168 часов идет по ключу (server_id, ts) без временной сортировки"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        start = int((datetime.datetime.now() - datetime.timedelta(hours=168)).timestamp() * 1000)
+        conn = self.db.get_connection()
+        try:
+            plan = " ".join(row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN " + METRICS_HISTORY_SQL.format(schema="main"), (self.db.get_server_id(url), start)))
+        finally:
+            conn.close()
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertIn("PRIMARY KEY", plan)
+        self.assertIn("ts>?", plan)
+
+    def test_alert_and_incident_query_plans(self):
+        """Тест: опрос оповещений идет по частичным индексам, инциденты сервера - без сортировки"""
+        assert self.db is not None
+        urls = ["http://server1:9090", "http://server2:9090"]
+        for url in urls:
+            self.db.add_server(url)
+
+        def plan(sql, url, params=()):
+            condition, ids = self.db._server_filter(url)
+            conn = self.db.get_connection()
+            try:
+                return " ".join(row[-1] for row in conn.execute(
+                    "EXPLAIN QUERY PLAN " + sql.format(condition=condition), ids + list(params)))
+            finally:
+                conn.close()
+
+        # Все серверы - без списка id, по индексу времени неподтвержденных и без сортировки
+        self.assertEqual(self.db._server_filter(None), ("TRUE", []))
+        every = plan(UNACKNOWLEDGED_ALERTS_SQL, None, [100])
+        self.assertIn("idx_alerts_unacknowledged_time", every)
+        self.assertNotIn("TEMP B-TREE", every)
+        single = plan(UNACKNOWLEDGED_ALERTS_SQL, urls[0], [100])
+        self.assertIn("idx_alerts_unacknowledged", single)
+        self.assertNotIn("TEMP B-TREE", single)
+        incidents = plan(INCIDENTS_SQL, urls[0], [100])
+        self.assertIn("idx_incidents_server_time", incidents)
+        self.assertNotIn("TEMP B-TREE", incidents)
+
+    def test_disk_history_per_volume(self):
+        """Тест: тома хранятся отдельными строками и читаются диапазоном по ключу"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        rom_info = {"C:": {"available": "20", "all": "100", "use": 80.0, "usage_precent": 80.0},
+                    "D:": {"available": "150", "all": "200", "use": 50.0, "usage_precent": 25.0}}
+        self.db.save_metrics(url, 10.0, 20.0, 30.0, rom_info)
+        self.db.save_metrics(url, 11.0, 21.0, 31.0, rom_info)
+
+        history = self.db.get_disk_history(url, hours=1)
+        self.assertEqual(sorted(history), ["C:", "D:"])
+        self.assertEqual(len(history["C:"]), 2)
+        ts, used_pct, free_gb, total_gb = history["D:"][0]
+        self.assertEqual((used_pct, free_gb, total_gb), (25.0, 150.0, 200.0))
+        self.assertEqual(self.db.get_disk_history("http://unknown:9090"), {})
+        # Тома другого сервера не читаются
+        other = "http://other-server:9090"
+        self.db.add_server(other)
+        self.db.save_metrics(other, 1.0, 1.0, 1.0, {"E:": {"usage_precent": 5.0}})
+        self.assertEqual(sorted(self.db.get_disk_history(url, hours=1)), ["C:", "D:"])
+        self.assertEqual(list(self.db.get_disk_history(other, hours=1)), ["E:"])
+
+        conn = self.db.get_connection()
+        try:
+            plan = " ".join(row[-1] for row in conn.execute(
+                "EXPLAIN QUERY PLAN " + DISK_HISTORY_SQL.format(schema="main"), (1, 1, 0)))
+        finally:
+            conn.close()
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertIn("PRIMARY KEY", plan)
+
+
+    def test_metrics_history_arrays(self):
+        """Тест: история по столбцам совпадает со строками, пропуски - NaN"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        start = int(datetime.datetime.now().timestamp() * 1000) - 3600 * 1000
+        self.db.save_metrics_batch([(url, '', start + i * 5000, float(i), 50.0, None if i == 3 else 40.0, None)
+                                    for i in range(100)])
+
+        rows = self.db.get_metrics_history(url, hours=2)
+        arrays = self.db.get_metrics_history_arrays(url, hours=2, chunk_size=16)
+        self.assertEqual(str(arrays['ts'].dtype), 'int64')
+        self.assertEqual(str(arrays['cpu_usage'].dtype), 'float32')
+        self.assertEqual(arrays['ts'].tolist(), [row[0] for row in rows])
+        self.assertEqual(arrays['cpu_usage'].tolist(), [row[1] for row in rows])
+        self.assertTrue(arrays['temperature'].flags['C_CONTIGUOUS'])
+        self.assertNotEqual(arrays['temperature'][3], arrays['temperature'][3])  # NaN
+        self.assertEqual(int(arrays['time'][0].astype('int64')), start)
+
+        empty = self.db.get_metrics_history_arrays("http://unknown:9090")
+        self.assertEqual(len(empty['ts']), 0)
+        self.assertEqual(len(empty['ram_usage']), 0)
+
+
+    def test_iter_metrics_history_streams_batches(self):
+        """Тест: потоковое чтение истории порциями на отдельном соединении"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        start = int(datetime.datetime.now().timestamp() * 1000) - 3600 * 1000
+        self.db.save_metrics_batch([(url, '', start + i * 1000, float(i), 1.0, 2.0, None) for i in range(250)])
+
+        opened = []
+        open_connection = self.db.read_pool.open_connection
+
+        def track():
+            conn = open_connection()
+            opened.append(conn)
+            return conn
+
+        with patch.object(self.db.read_pool, 'open_connection', side_effect=track):
+            rows = list(self.db.iter_metrics_history(url, hours=2, batch_size=32))
+            self.assertEqual(rows, self.db.get_metrics_history(url, hours=2))
+
+            # Прерывание: закрытие генератора закрывает соединение
+            stream = self.db.iter_metrics_history(url, hours=2, batch_size=32)
+            self.assertEqual(next(stream)[1], 0.0)
+            stream.close()
+
+            cancel = threading.Event()
+            count = 0
+            for _ in self.db.iter_metrics_history(url, hours=2, batch_size=10, cancel=cancel):
+                count += 1
+                if count == 15:
+                    cancel.set()
+            self.assertEqual(count, 20)  # текущая порция дочитывается, следующая не запрашивается
+
+        self.assertEqual(len(opened), 3)
+        for conn in opened:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        self.assertEqual(list(self.db.iter_metrics_history("http://unknown:9090")), [])
+
+    def test_iter_incidents_and_alerts(self):
+        """Тест: потоковые выборки инцидентов и оповещений с именем сервера"""
+        assert self.db is not None
+        url = "http://test-server:9090"
+        self.db.add_server(url)
+        for i in range(5):
+            self.db.add_alert(url, "cpu_temp", f"alert {i}")
+            self.db.add_incident(url, "cpu_temp", "warning", f"incident {i}")
+        alerts = self.db.get_all_alerts()
+        self.db.acknowledge_alert(alerts[0][0])
+
+        self.assertEqual(list(self.db.iter_alerts(batch_size=2)), self.db.get_all_alerts())
+        self.assertEqual(len(list(self.db.iter_alerts(acknowledged=False))), 4)
+        self.assertEqual(len(self.db.get_all_alerts(limit=2)), 2)
+        incidents = list(self.db.iter_incidents(url, batch_size=2))
+        self.assertEqual(len(incidents), 5)
+        self.assertEqual(incidents[0][-1], url)
+
+    def test_keyset_pages(self):
+        """Тест: страницы по курсору (timestamp, id) без пропусков и повторов, фильтры на стороне базы"""
+        assert self.db is not None
+        urls = ["http://server1:9090", "http://server2:9090"]
+        for url in urls:
+            self.db.add_server(url)
+        # Одинаковые метки времени различаются по id
+        for i in range(7):
+            self.db.add_incident(urls[i % 2], "cpu_temp" if i % 3 else "disk_usage",
+                                 "critical" if i < 2 else "warning", f"incident {i}")
+            self.db.add_alert(urls[i % 2], "cpu_temp", f"alert {i}")
+        newest = self.db.get_incidents()
+        self.db.resolve_incident(newest[0][0])
+
+        pages, after = [], None
+        while True:
+            page, after = self.db.get_incidents_page(after=after, limit=2)
+            pages.append(page)
+            if after is None:
+                break
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertEqual([row[0] for page in pages for row in page], [row[0] for row in self.db.get_incidents()])
+
+        page, after = self.db.get_incidents_page(urls[0], incident_type="cpu_temp", limit=10)
+        self.assertEqual({(row[-1], row[3]) for row in page}, {(urls[0], "cpu_temp")})
+        self.assertIsNone(after)
+        self.assertEqual(len(self.db.get_incidents_page(severity="critical")[0]), 2)
+        self.assertEqual(len(self.db.get_incidents_page(resolved=False)[0]), 6)
+        self.assertEqual([row[0] for row in self.db.get_incidents_page(resolved=True)[0]], [newest[0][0]])
+
+        alerts, after = self.db.get_alerts_page(urls[1], limit=2)
+        rest, _ = self.db.get_alerts_page(urls[1], after=after, limit=10)
+        self.assertEqual([row[0] for row in alerts + rest], [row[0] for row in self.db.get_all_alerts(urls[1])])
+        self.assertEqual(len(self.db.get_alerts_page(acknowledged=False, alert_type="cpu_temp")[0]), 7)
+
+        # Активные инциденты всех серверов - по частичному индексу и без сортировки, и на следующих страницах
+        for after in (None, ("2026-01-01 00:00:00", 5)):
+            conditions, params = self.db._page_filters(None, ('resolved', False))
+            if after is not None:
+                conditions, params = conditions + ["(timestamp, id) < (?, ?)"], params + list(after)
+            conn = self.db.get_connection()
+            try:
+                plan = " ".join(row[-1] for row in conn.execute(
+                    "EXPLAIN QUERY PLAN " + KEYSET_PAGE_SQL.format(table='incidents', where=" AND ".join(conditions)),
+                    params + [51]))
+            finally:
+                conn.close()
+            self.assertIn("idx_incidents_active_time", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля db_writer
+"""
+
+import unittest
+import tempfile
+import threading
+import time
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.db_writer import DatabaseWriter
+
+
+class TestDatabaseWriter(unittest.TestCase):
+    """Тестовый класс для DatabaseWriter"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(self.temp_db.name)
+        self.url = "http://test-server:9090"
+        self.db.add_server(self.url)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close_writer()
+        self.db.conn.close()
+        try:
+            os.unlink(self.temp_db.name)
+        except PermissionError:
+            pass
+
+    def _count(self, table):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_writes_grouped_into_transactions(self):
+        """Тест: записи из очереди объединяются в небольшое число транзакций"""
+        writer = self.db.start_writer(flush_interval=0.2, batch_size=100)
+        for i in range(250):
+            self.db.save_metrics(self.url, float(i), 20.0, 50.0, {"C:": {"usage_precent": 10}})
+        self.db.add_alert(self.url, "ram_usage", "RAM")
+        self.db.add_incident(self.url, "ram_usage", "warning", "RAM")
+        self.db.flush_writes()
+
+        self.assertEqual(self._count('metrics'), 250)
+        self.assertEqual(self._count('alerts'), 1)
+        self.assertEqual(self._count('incidents'), 1)
+        stats = writer.get_stats()
+        self.assertEqual(stats['rows'], 252)
+        self.assertLessEqual(stats['transactions'], 5)
+        self.assertGreater(stats['rows_per_sec'], 0)
+
+    def test_bad_row_does_not_drop_batch(self):
+        """Тест: при ошибке пачки записи повторяются по одной, теряется только ошибочная"""
+        writer = self.db.start_writer(flush_interval=0.2, batch_size=100)
+        self.db.save_metrics(self.url, 10.0, 20.0, 50.0, None)
+        self.db.save_metrics_batch([(self.url, '', "не метка", 10.0, 20.0, 50.0, None)])
+        self.db.add_alert(self.url, "ram_usage", "RAM")
+        self.db.save_metrics(self.url, 11.0, 20.0, 50.0, None)
+        self.db.flush_writes()
+
+        self.assertEqual(self._count('metrics'), 2)
+        self.assertEqual(self._count('alerts'), 1)
+        stats = writer.get_stats()
+        self.assertEqual((stats['rows'], stats['errors']), (3, 1))
+
+    def test_backpressure_when_queue_full(self):
+        """Тест: при заполненной очереди источник ждет поток записи"""
+        writer = DatabaseWriter(self.db, max_queue=2)
+        rows = [(self.url, '', 1704067200000 + i * 1000, 1.0, 2.0, 3.0, None) for i in range(3)]
+        writer.submit('metrics', rows[0])
+        writer.submit('metrics', rows[1])
+
+        blocked = threading.Thread(target=writer.submit, args=('metrics', rows[2]))
+        blocked.start()
+        time.sleep(0.1)
+        self.assertTrue(blocked.is_alive())
+
+        writer.start()
+        blocked.join(timeout=2)
+        self.assertFalse(blocked.is_alive())
+        writer.close()
+        self.assertEqual(writer.get_stats()['backpressure'], 1)
+        self.assertEqual(self._count('metrics'), 3)
+
+    def test_close_flushes_queue(self):
+        """Тест: при остановке остаток очереди записывается"""
+        self.db.start_writer(flush_interval=5, batch_size=1000)
+        self.db.save_metrics_batch([(self.url, '', 1704067200000 + i * 1000, 1.0, 2.0, 3.0, None) for i in range(10)])
+        self.db.close_writer()
+        self.assertIsNone(self.db.writer)
+        self.assertEqual(self._count('metrics'), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля exporter
+"""
+
+import unittest
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.exporter import ExporterScraper, parse_exposition, is_exporter_url
+from models.http_pool import SessionPool
+from models.monitor import PrometheusMonitor
+
+
+def _exposition(utility, rtc):
+    """Ответ windows_exporter с двумя ядрами и посторонними семействами"""
+    return f'''# HELP go_goroutines Number of goroutines that currently exist.
+# TYPE go_goroutines gauge
+go_goroutines 12
+windows_cpu_info{{core_count="2",description="Intel64 Family 6",name="Intel(R) Xeon(R) \\"Gold\\""}} 1
+windows_cpu_core_frequency_mhz{{core="0,0"}} 2400
+windows_cpu_core_frequency_mhz{{core="0,1"}} 2300
+windows_cpu_processor_utility_total{{core="0,0"}} {utility}
+windows_cpu_processor_rtc_total{{core="0,0"}} {rtc}
+windows_cpu_processor_utility_total{{core="0,1"}} {utility / 2}
+windows_cpu_processor_rtc_total{{core="0,1"}} {rtc}
+windows_memory_available_bytes 4.294967296e+09
+windows_memory_physical_total_bytes 1.7179869184e+10
+windows_logical_disk_free_bytes{{volume="C:"}} 2.68435456e+10
+windows_logical_disk_size_bytes{{volume="C:"}} 1.073741824e+11
+windows_net_bytes_total{{nic="eth0"}} 123456
+windows_thermalzone_temperature_celsius{{name="zone0"}} 45
+windows_thermalzone_temperature_celsius{{name="zone1"}} 52.5
+'''
+
+
+class _ExporterHandler(BaseHTTPRequestHandler):
+    """Минимальный windows_exporter: каждый запрос продвигает счетчики CPU"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.scrapes += 1
+        body = _exposition(50 * self.server.scrapes, 100 * self.server.scrapes).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestExporter(unittest.TestCase):
+    """Тестовый класс для прямого опроса windows_exporter"""
+
+    def test_is_exporter_url(self):
+        """Тест определения режима по адресу"""
+        self.assertTrue(is_exporter_url("http://host:9182/metrics"))
+        self.assertTrue(is_exporter_url("http://host:9182/metrics/"))
+        self.assertFalse(is_exporter_url("http://host:9090"))
+        self.assertFalse(is_exporter_url(""))
+
+    def test_parse_exposition_keeps_needed_families(self):
+        """Тест: разбираются только нужные семейства, метки с экранированием"""
+        samples = list(parse_exposition(_exposition(10, 20).splitlines()))
+        names = {name for name, _, _ in samples}
+        self.assertNotIn('go_goroutines', names)
+        self.assertNotIn('windows_net_bytes_total', names)
+        self.assertEqual(len(samples), 13)
+        name, labels, value = samples[0]
+        self.assertEqual(name, 'windows_cpu_info')
+        self.assertEqual(labels['name'], 'Intel(R) Xeon(R) "Gold"')
+        self.assertEqual(value, '1')
+
+    def test_cpu_usage_from_consecutive_samples(self):
+        """Тест: загрузка CPU считается по приращениям счетчиков между опросами"""
+        scraper = ExporterScraper("http://host:9182/metrics")
+        first = scraper.to_result(parse_exposition(_exposition(100, 200).splitlines()))
+        self.assertNotIn('usage_precent', first['cpu'])
+
+        second = scraper.to_result(parse_exposition(_exposition(150, 300).splitlines()))
+        # Ядро 0: 50/100, ядро 1: 25/100
+        self.assertAlmostEqual(second['cpu']['usage_precent'], 0.375)
+        self.assertEqual(second['cpu']['temperatur'], '52.5')
+        self.assertEqual(second['cpu']['frequency_mhz'], '2400')
+        self.assertEqual(float(second['ram']['all']), 16.0)
+        self.assertEqual(float(second['rom']['C:']['available']), 25.0)
+
+        # Сброс счетчиков (перезапуск экспортера) не дает отрицательной загрузки
+        third = scraper.to_result(parse_exposition(_exposition(1, 2).splitlines()))
+        self.assertNotIn('usage_precent', third['cpu'])
+
+    def test_monitor_scrapes_exporter_directly(self):
+        """Тест: PrometheusMonitor с адресом /metrics опрашивает экспортер без Prometheus"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _ExporterHandler)
+        server.scrapes = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        pool = SessionPool()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            monitor = PrometheusMonitor(url, pool=pool)
+            monitor.get_all_info()
+            result = monitor.get_all_info()
+            self.assertEqual(server.scrapes, 2)
+            self.assertEqual(result['network'], '1')
+            self.assertAlmostEqual(result['cpu']['usage_precent'], 0.375)
+            self.assertAlmostEqual(result['ram']['usage_precent'], 75.0)
+            self.assertAlmostEqual(result['rom']['C:']['use'], 75.0)
+        finally:
+            pool.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_probe_requires_values(self):
+        """Тест: проверка экспортера успешна, только если опрос вернул значения"""
+        pool = SessionPool()
+        try:
+            monitor = PrometheusMonitor("http://host:9182/metrics", pool=pool)
+            scraper = monitor.exporter
+            monitor.exporter.scrape = lambda: scraper.to_result(parse_exposition(_exposition(10, 20).splitlines()))
+            self.assertTrue(monitor.probe())
+            monitor.exporter.scrape = lambda: scraper.to_result([])
+            self.assertFalse(monitor.probe())
+
+            def fail():
+                raise ConnectionError("нет связи")
+            monitor.exporter.scrape = fail
+            self.assertFalse(monitor.probe())
+        finally:
+            pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
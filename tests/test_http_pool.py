@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля http_pool
+"""
+
+import unittest
+import threading
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.http_pool import SessionPool
+from models.monitor import PrometheusMonitor
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    """Минимальный обработчик /api/v1/query с поддержкой keep-alive"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.headers_seen.append(dict(self.headers))
+        body = json.dumps({'status': 'success', 'data': {'resultType': 'vector', 'result': []}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSessionPool(unittest.TestCase):
+    """Тестовый класс для SessionPool"""
+
+    def setUp(self):
+        """Запуск локального HTTP-сервера"""
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _QueryHandler)
+        self.server.headers_seen = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.pool = SessionPool()
+
+    def tearDown(self):
+        """Остановка сервера и закрытие пула"""
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_reused_across_change_url(self):
+        """Тест: одна сессия на хост, переиспользуется при change_url"""
+        monitor = PrometheusMonitor(self.url, pool=self.pool)
+        session = monitor.prom._session
+        monitor.change_url(self.url + '/')
+        self.assertIs(monitor.prom._session, session)
+        self.assertEqual(self.pool.get_stats()['sessions'], 1)
+
+    def test_keep_alive_and_stats(self):
+        """Тест: соединение переиспользуется и статистика считается"""
+        monitor = PrometheusMonitor(self.url, pool=self.pool)
+        for _ in range(3):
+            monitor.get_all_info()
+
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertGreater(stats['bytes_received'], 0)
+        self.assertIn('gzip', self.server.headers_seen[0].get('Accept-Encoding', ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
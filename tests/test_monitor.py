@@ -12,7 +12,7 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models.monitor import PrometheusMonitor
+from models.monitor import PrometheusMonitor, MetadataCache, BATCH_LABEL, BATCH_QUERIES, build_batch_query, demultiplex
 
 
 class TestPrometheusMonitor(unittest.TestCase):
@@ -21,7 +21,7 @@ class TestPrometheusMonitor(unittest.TestCase):
     def setUp(self):
         """Настройка перед каждым тестом"""
         self.test_url = "http://test-server:9090"
-        self.monitor = PrometheusMonitor(self.test_url)
+        self.monitor = PrometheusMonitor(self.test_url, metadata_cache=MetadataCache())
     
     def tearDown(self):
         """Очистка после каждого теста"""
@@ -53,6 +53,117 @@ class TestPrometheusMonitor(unittest.TestCase):
         result = self.monitor._parse_metric_value("invalid")  # type: ignore[attr-defined]
         self.assertEqual(result, 0.0)
 
+    def test_build_batch_query(self):
+        """Тест сборки пакетного запроса"""
+        query = build_batch_query(BATCH_QUERIES)
+        self.assertEqual(query.count('label_replace('), len(BATCH_QUERIES))
+        self.assertEqual(query.count(' or '), len(BATCH_QUERIES) - 1)
+        self.assertIn(f'"{BATCH_LABEL}", "cpu:usage_precent"', query)
+
+    def test_demultiplex(self):
+        """Тест разбора результата пакетного запроса"""
+        def sample(tag, value, **labels):
+            labels[BATCH_LABEL] = tag
+            return {'metric': labels, 'value': [0, value]}
+
+        data = [
+            sample('cpu:usage_precent', '10'),
+            sample('cpu:usage_precent', '30'),
+            sample('cpu:name', '1', name='Xeon', description='Intel64'),
+            sample('cpu:temperatur', '55'),
+            sample('ram:all', '16'),
+            sample('rom:available', '20', volume='C:'),
+            sample('rom:usage_precent', '80', volume='C:'),
+            sample('network:up', '1'),
+        ]
+        result = demultiplex(data)
+        self.assertEqual(result['cpu']['usage_precent'], 20.0)
+        self.assertEqual(result['cpu']['name'], 'Xeon')
+        self.assertEqual(result['cpu']['description'], 'Intel64')
+        self.assertEqual(result['cpu']['temperatur'], '55')
+        self.assertEqual(result['ram'], {'all': '16'})
+        self.assertEqual(result['rom'], {'C:': {'available': '20', 'usage_precent': '80'}})
+        self.assertEqual(result['network'], '1')
+
+    def test_get_all_info_single_query(self):
+        """Тест: все метрики получаются одним запросом"""
+        self.monitor.prom = MagicMock()  # type: ignore[attr-defined]
+        self.monitor.prom.custom_query.return_value = []  # type: ignore[attr-defined]
+        result = self.monitor.get_all_info()  # type: ignore
+        self.assertEqual(self.monitor.prom.custom_query.call_count, 1)  # type: ignore[attr-defined]
+        self.assertEqual(self.monitor.queries_sent, 1)  # type: ignore[attr-defined]
+        self.assertEqual(result, {'cpu': {}, 'ram': {}, 'rom': {}, 'network': None, 'start_time': None})
+
+    def _sample(self, tag, value, **labels):
+        labels[BATCH_LABEL] = tag
+        return {'metric': labels, 'value': [0, value]}
+
+    def _respond(self, start_time='100', volumes=('C:',)):
+        """Заглушка Prometheus, отвечающая только на запрошенные выражения"""
+        def custom_query(query, timeout=None):
+            data = [
+                self._sample('cpu:usage_precent', '10'),
+                self._sample('cpu:core', '8'),
+                self._sample('ram:available', '4'),
+                self._sample('ram:all', '16'),
+                self._sample('network:up', '1'),
+                self._sample('meta:start_time', start_time),
+            ]
+            for volume in volumes:
+                data.append(self._sample('rom:available', '30', volume=volume))
+                data.append(self._sample('rom:all', '100', volume=volume))
+            return [d for d in data if f'"{d["metric"][BATCH_LABEL]}"' in query]
+        self.monitor.prom = MagicMock(url=self.test_url)  # type: ignore[attr-defined]
+        self.monitor.prom.custom_query.side_effect = custom_query  # type: ignore[attr-defined]
+
+    def test_static_metadata_cached(self):
+        """Тест: статические метаданные запрашиваются только при первом тике"""
+        self._respond()
+        first = self.monitor.get_all_info()  # type: ignore
+        second = self.monitor.get_all_info()  # type: ignore
+
+        first_query = self.monitor.prom.custom_query.call_args_list[0][0][0]  # type: ignore[attr-defined]
+        second_query = self.monitor.prom.custom_query.call_args_list[1][0][0]  # type: ignore[attr-defined]
+        self.assertIn('windows_cpu_info_core', first_query)
+        self.assertNotIn('windows_cpu_info_core', second_query)
+        self.assertLess(second_query.count('label_replace('), first_query.count('label_replace(') / 2)
+        self.assertEqual(second['cpu']['core'], '8')
+        self.assertEqual(second['ram']['all'], '16')
+        self.assertEqual(second['rom']['C:']['all'], '100')
+        self.assertEqual(second['ram']['usage_precent'], 75.0)
+        self.assertEqual(second['rom']['C:']['use'], 70.0)
+        self.assertEqual(first['cpu'], second['cpu'])
+
+    def test_metadata_invalidated_on_restart(self):
+        """Тест: перезапуск экспортера или новый диск сбрасывают кэш"""
+        self._respond()
+        self.monitor.get_all_info()  # type: ignore
+
+        self._respond(start_time='200')
+        self.monitor.get_all_info()  # type: ignore
+        self.assertEqual(self.monitor.prom.custom_query.call_count, 2)  # type: ignore[attr-defined]
+        self.assertIn('windows_cpu_info_core', self.monitor.prom.custom_query.call_args[0][0])  # type: ignore[attr-defined]
+
+        self._respond(start_time='200', volumes=('C:', 'D:'))
+        result = self.monitor.get_all_info()  # type: ignore
+        self.assertEqual(self.monitor.prom.custom_query.call_count, 2)  # type: ignore[attr-defined]
+        self.assertEqual(result['rom']['D:']['all'], '100')
+
+    def test_get_all_instances(self):
+        """Тест: экземпляры за одним Prometheus разделяются по метке instance"""
+        self.monitor.prom = MagicMock(url=self.test_url)  # type: ignore[attr-defined]
+        self.monitor.prom.custom_query.return_value = [  # type: ignore[attr-defined]
+            self._sample('cpu:usage_precent', '10', instance='node-2:9182'),
+            self._sample('cpu:usage_precent', '30', instance='node-1:9182'),
+            self._sample('network:up', '1', instance='node-1:9182'),
+        ]
+        instances = self.monitor.get_all_instances()  # type: ignore
+        self.assertEqual(sorted(instances), ['node-1:9182', 'node-2:9182'])
+        self.assertEqual(instances['node-2:9182']['cpu']['usage_precent'], 10.0)
+        self.assertEqual(self.monitor.prom.custom_query.call_count, 1)  # type: ignore[attr-defined]
+        # Без выбранного экземпляра показывается первый по имени
+        self.assertEqual(self.monitor.get_all_info()['cpu']['usage_precent'], 30.0)  # type: ignore
+
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля recent_cache
+"""
+
+import unittest
+import tempfile
+import time
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.recent_cache import RecentMetricsCache, RingBuffer
+
+STEP = 5000
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Тестовый класс для кольца последних точек"""
+
+    def test_wrap_and_late_points(self):
+        """Тест: затертые и опоздавшие точки сужают покрытие, повтор метки заменяет значение"""
+        buffer = RingBuffer(3, 1)
+        for ts in (10, 20, 30, 40):
+            buffer.append(ts, [float(ts)])
+        self.assertEqual(buffer.covered_from, 11)
+        ts, values = buffer.window(0)
+        self.assertEqual(ts.tolist(), [20, 30, 40])
+
+        buffer.append(40, [None])
+        buffer.append(25, [1.0])
+        self.assertEqual(buffer.covered_from, 26)
+        ts, values = buffer.window(0)
+        self.assertEqual(ts.tolist(), [30, 40])
+        self.assertNotEqual(values[-1, 0], values[-1, 0])
+
+    def test_lru_eviction_by_reads(self):
+        """Тест: при нехватке памяти вытесняется кольцо, которое дольше всех не читали"""
+        cache = RecentMetricsCache(0, capacity=10, max_bytes=2 * 10 * 16, columns=1)
+        cache.fill(1, [(100, 1.0)], 0, cache.version(1))
+        cache.fill(2, [(100, 2.0)], 0, cache.version(2))
+        cache.window(1, 0)
+        cache.fill(3, [(100, 3.0)], 0, cache.version(3))
+        self.assertIsNone(cache.window(2, 0))
+        self.assertIsNotNone(cache.window(1, 0))
+        # Запись, пришедшая после чтения из SQLite, делает прочитанные строки устаревшими
+        version = cache.version(4)
+        cache.add([(4, 200, 1.0)])
+        cache.fill(4, [(100, 4.0)], 0, version)
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+        self.assertEqual(cache.get_stats()['servers'], 2)
+
+
+class TestRecentCache(unittest.TestCase):
+    """Тестовый класс для чтения истории через кольца последних точек"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.url = "http://test-server:9090"
+        self.db = Database(self.temp_db.name, cache_points=60)
+        self.db.add_server(self.url)
+        self.now = int(time.time() * 1000)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+    def _save(self, start, count):
+        self.db.save_metrics_batch([(self.url, '', start + i * STEP, float(i % 100), 50.0,
+                                     None if i % 4 == 0 else 40.0, None) for i in range(count)])
+
+    def _uncached(self, func, *args, **kwargs):
+        """Тот же запрос напрямую к SQLite"""
+        recent, self.db.recent = self.db.recent, None
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.db.recent = recent
+
+    def test_read_through(self):
+        """Тест: первое чтение заполняет кольцо из SQLite, следующие и новые точки берутся из памяти"""
+        self._save(self.now - 40 * STEP, 30)
+        self.assertEqual(self.db.get_cache_stats()['servers'], 0)
+        first = self.db.get_metrics_history(self.url, hours=1)
+        self.assertEqual(first, self._uncached(self.db.get_metrics_history, self.url, hours=1))
+        self.assertEqual(self.db.get_cache_stats()['misses'], 1)
+
+        self._save(self.now, 5)
+        history = self.db.get_metrics_history(self.url, hours=1)
+        self.assertEqual(len(history), 35)
+        self.assertEqual(history, self._uncached(self.db.get_metrics_history, self.url, hours=1))
+        arrays = self.db.get_metrics_history_arrays(self.url, hours=1)
+        self.assertEqual(arrays['ts'].tolist(), [row[0] for row in history])
+        stats = self.db.get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+    def test_older_range_from_sqlite(self):
+        """Тест: точки старше кольца дочитываются из SQLite"""
+        self._save(self.now - 100 * STEP, 100)
+        self.db.get_metrics_history(self.url, hours=1)
+        history = self.db.get_metrics_history(self.url, hours=1)
+        self.assertEqual(len(history), 100)
+        self.assertEqual(history, self._uncached(self.db.get_metrics_history, self.url, hours=1))
+        self.assertEqual(self.db.get_cache_stats()['misses'], 2)
+
+        # Последние 4 минуты целиком в кольце из 60 точек
+        arrays = self.db.get_metrics_history_arrays(self.url, hours=4 / 60)
+        self.assertEqual(arrays['ts'].tolist(), [row[0] for row in history if row[0] >= arrays['ts'][0]])
+        self.assertGreater(len(arrays['ts']), 40)
+        self.assertEqual(self.db.get_cache_stats()['hits'], 1)
+
+    def test_recent_arrays_only_when_covered(self):
+        """Тест: из памяти отдается только период, целиком покрытый кольцом"""
+        # Граница окна приходится между точками
+        self._save(self.now - 100 * STEP + STEP // 2, 100)
+        self.assertIsNone(self.db.get_recent_arrays(self.url, hours=1))
+        self.db.get_metrics_history(self.url, hours=1)
+        self.assertIsNone(self.db.get_recent_arrays(self.url, hours=1))
+        arrays = self.db.get_recent_arrays(self.url, hours=4 / 60)
+        expected = self._uncached(self.db.get_metrics_history_arrays, self.url, hours=4 / 60)
+        self.assertEqual(arrays['ts'].tolist(), expected['ts'].tolist())
+        self.assertEqual(arrays['cpu_usage'].tolist(), expected['cpu_usage'].tolist())
+        self.assertIsNone(self._uncached(self.db.get_recent_arrays, self.url, hours=4 / 60))
+
+    def test_writer_fills_buffer(self):
+        """Тест: точки, записанные потоком записи, попадают в кольцо после фиксации"""
+        self.db.start_writer()
+        self._save(self.now, 3)
+        self.db.flush_writes()
+        # Кольцо создано записью и полно только с ее первой точки: более ранний час читается из SQLite
+        ts, _, covered_from = self.db.recent.window(self.db.get_server_id(self.url), 0)
+        self.assertEqual(ts.tolist(), [self.now + i * STEP for i in range(3)])
+        self.assertEqual(covered_from, self.now)
+        self.assertEqual([row[0] for row in self.db.get_metrics_history(self.url, hours=1)], ts.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
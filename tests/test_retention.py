@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля retention
+"""
+
+import unittest
+import tempfile
+import datetime
+import sqlite3
+import threading
+import time
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.retention import RetentionService
+
+DAY = 86400 * 1000
+
+
+class TestRetentionService(unittest.TestCase):
+    """Тестовый класс для RetentionService"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(self.temp_db.name)
+        self.url = "http://test-server:9090"
+        self.db.add_server(self.url)
+        self.now = time.time()
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+    def _count(self, table):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _save_days(self, days_ago, count=1):
+        """Сохраняет count точек с диском, начиная с days_ago дней назад"""
+        start = int(self.now * 1000) - days_ago * DAY
+        self.db.save_metrics_batch([(self.url, '', start + i * 5000, 10.0, 20.0, 30.0,
+                                     {"C:": {"usage_precent": 50.0}}) for i in range(count)])
+
+    def test_incremental_vacuum_enabled(self):
+        """Тест: новая база создается в режиме auto_vacuum=INCREMENTAL"""
+        self.assertEqual(self.db.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+
+    def _open_legacy(self, filler_bytes=0, **kwargs):
+        """Открывает базу, созданную до режима auto_vacuum=INCREMENTAL"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+        conn = sqlite3.connect(self.temp_db.name)
+        conn.execute("CREATE TABLE servers (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT)")
+        if filler_bytes:
+            # Объем, на перестройку которого VACUUM тратит заметное время
+            conn.execute("CREATE TABLE filler (data BLOB)")
+            conn.executemany("INSERT INTO filler VALUES (randomblob(?))", [(65536,)] * (filler_bytes // 65536))
+        conn.commit()
+        conn.close()
+        self.db = Database(self.temp_db.name, **kwargs)
+        self.db.add_server(self.url)
+
+    def test_existing_database_converted_on_request(self):
+        """Тест: существующая база не перестраивается ни при открытии, ни фоновой очисткой - только по запросу"""
+        self._open_legacy()
+        self.assertTrue(self.db.needs_incremental_vacuum())
+        retention = RetentionService(self.db, {'metrics': 7}, pause=0)
+        self.assertEqual(retention.run_once(self.now)['bytes_freed'], 0)
+        self.assertTrue(self.db.needs_incremental_vacuum())
+        self.assertTrue(self.db.convert_incremental_vacuum())
+        self.assertFalse(self.db.needs_incremental_vacuum())
+        self.assertFalse(self.db.convert_incremental_vacuum())
+
+    def test_conversion_keeps_queued_rows(self):
+        """Тест: записи, поставленные во время VACUUM, ждут в очереди и не теряются по lock_timeout"""
+        self._open_legacy(filler_bytes=64 * 1024 * 1024, lock_timeout=0.01)
+        writer = self.db.start_writer(flush_interval=0.001)
+        start = int(self.now * 1000)
+        converter = threading.Thread(target=self.db.convert_incremental_vacuum)
+        converter.start()
+        for i in range(20):
+            self.db.save_metrics_batch([(self.url, '', start + i * 5000, 10.0, 20.0, 30.0, None)])
+            time.sleep(0.005)
+        converter.join()
+        self.db.flush_writes()
+        self.assertFalse(self.db.needs_incremental_vacuum())
+        self.assertEqual(self._count('metrics'), 20)
+        self.assertEqual(writer.get_stats()['errors'], 0)
+
+    def test_disk_ranges_only_for_existing_volumes(self):
+        """Тест: тома очищаются только у серверов, у которых они есть"""
+        other = "http://other-server:9090"
+        self.db.add_server(other)
+        start = int(self.now * 1000) - 10 * DAY
+        self.db.save_metrics_batch([(self.url, '', start, 1.0, 1.0, 1.0, {"C:": {"usage_precent": 1.0}}),
+                                    (other, '', start, 1.0, 1.0, 1.0, {"D:": {"usage_precent": 1.0},
+                                                                      "E:": {"usage_precent": 1.0}})])
+        retention = RetentionService(self.db, {'disk_metrics': 7}, pause=0)
+        conn = self.db.get_connection()
+        try:
+            _, prefixes = retention._prefixes(conn, 'disk_metrics')
+        finally:
+            conn.close()
+        self.assertEqual(len(prefixes), 3)
+        report = retention.run_once(self.now)
+        self.assertEqual(report['rows']['disk_metrics'], 3)
+        self.assertEqual(report['chunks'], 3)
+
+    def test_policies_per_tier(self):
+        """Тест: у каждой таблицы свой срок хранения"""
+        self._save_days(10)
+        self._save_days(1)
+        report = RetentionService(self.db, pause=0).run_once(self.now)
+
+        self.assertEqual(report['rows']['metrics'], 1)
+        self.assertEqual(report['rows']['disk_metrics'], 1)
+        self.assertEqual(report['rows']['metrics_5m'], 0)
+        self.assertEqual(self._count('metrics'), 1)
+        self.assertEqual(self._count('disk_metrics'), 1)
+        # Агрегаты десятидневной давности хранятся дольше сырых данных
+        self.assertEqual(self._count('metrics_5m'), 2)
+
+    def test_chunked_delete_and_bytes_freed(self):
+        """Тест: удаление порциями, освобожденные страницы возвращаются файлу"""
+        self._save_days(20, count=5000)
+        retention = RetentionService(self.db, {'metrics': 7, 'disk_metrics': 7}, chunk_rows=500,
+                                     max_chunk_time=60, pause=0)
+        report = retention.run_once(self.now)
+
+        self.assertEqual(report['rows'], {'metrics': 5000, 'disk_metrics': 5000})
+        self.assertGreater(report['chunks'], 2)
+        self.assertGreater(report['bytes_freed'], 0)
+        self.assertEqual(self.db.conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+        self.assertIs(retention.get_report(), report)
+
+    def test_closed_events_only(self):
+        """Тест: удаляются только закрытые старые инциденты; время сравнивается как локальное"""
+        self.db.add_incident(self.url, "cpu_temp", "warning", "старый")
+        self.db.add_incident(self.url, "cpu_temp", "warning", "открытый")
+        old = (datetime.datetime.now() - datetime.timedelta(days=100)).strftime('%Y-%m-%d %H:%M:%S')
+        conn = self.db.get_connection()
+        try:
+            conn.execute("UPDATE incidents SET timestamp = ?", (old,))
+            conn.execute("UPDATE incidents SET resolved = TRUE WHERE description = 'старый'")
+            conn.commit()
+        finally:
+            conn.close()
+
+        report = RetentionService(self.db, {'incidents': 90}, pause=0).run_once(self.now)
+        self.assertEqual(report['rows']['incidents'], 1)
+        self.assertEqual(self._count('incidents'), 1)
+
+    def test_unacknowledged_alerts_kept_longer(self):
+        """Тест: неподтвержденные оповещения удаляются по своему, более долгому сроку"""
+        for age in (100, 200):
+            for acknowledged in (False, True):
+                self.db.add_alert(self.url, "cpu_temp", f"{age} {acknowledged}")
+                stamp = (datetime.datetime.now() - datetime.timedelta(days=age)).strftime('%Y-%m-%d %H:%M:%S')
+                conn = self.db.get_connection()
+                try:
+                    conn.execute("UPDATE alerts SET timestamp = ?, acknowledged = ? WHERE message = ?",
+                                 (stamp, acknowledged, f"{age} {acknowledged}"))
+                    conn.commit()
+                finally:
+                    conn.close()
+
+        report = RetentionService(self.db, pause=0).run_once(self.now)
+        self.assertEqual((report['rows']['alerts'], report['rows']['alerts_unacknowledged']), (2, 1))
+        self.assertEqual([row[4] for row in self.db.get_all_alerts()], ["100 False"])
+
+
+if __name__ == '__main__':
+    unittest.main()
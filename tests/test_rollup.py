@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля rollup
+"""
+
+import unittest
+import tempfile
+import time
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.rollup import ROLLUP_COLUMNS, aggregate, pick_tier
+
+MINUTE = 60 * 1000
+
+
+class TestRollup(unittest.TestCase):
+    """Тестовый класс для агрегатов метрик по интервалам"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.db = Database(self.temp_db.name)
+        self.url = "http://test-server:9090"
+        self.db.add_server(self.url)
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close()
+        os.unlink(self.temp_db.name)
+
+    def _row(self, table, bucket):
+        conn = self.db.get_connection()
+        try:
+            row = conn.execute(f"SELECT * FROM {table} WHERE bucket = ?", (bucket,)).fetchone()
+            return dict(zip(ROLLUP_COLUMNS, row)) if row else None
+        finally:
+            conn.close()
+
+    def test_aggregate_bucket(self):
+        """Тест: min/max/avg/last/count по интервалу, пропуск пустых значений"""
+        samples = [(1, 5000, 10.0, 50.0, None), (1, 65000, 40.0, 60.0, 30.0), (1, 30000, 20.0, 40.0, 35.0)]
+        rows = {row[1]: dict(zip(ROLLUP_COLUMNS, row)) for row in aggregate(samples, MINUTE)}
+        self.assertEqual(sorted(rows), [0, MINUTE])
+        first = rows[0]
+        self.assertEqual((first['count'], first['last_ts']), (2, 30000))
+        self.assertEqual((first['cpu_usage_min'], first['cpu_usage_max'], first['cpu_usage_avg']), (10.0, 20.0, 15.0))
+        self.assertEqual(first['ram_usage_last'], 40.0)
+        self.assertEqual((first['temperature_avg'], first['temperature_last']), (35.0, 35.0))
+
+    def test_pick_tier(self):
+        """Тест: выбирается самый крупный уровень с достаточным числом точек"""
+        self.assertEqual(pick_tier(168, 300), ('metrics_5m', 5 * MINUTE))
+        self.assertEqual(pick_tier(168, 100), ('metrics_1h', 60 * MINUTE))
+        self.assertEqual(pick_tier(24, 300), ('metrics_1m', MINUTE))
+        self.assertIsNone(pick_tier(1, 300))
+
+    def test_rollups_maintained_incrementally(self):
+        """Тест: агрегаты обновляются при каждой записи, в том числе для уже начатого интервала"""
+        bucket = (int(time.time() * 1000) // (60 * MINUTE) - 1) * 60 * MINUTE
+        self.db.save_metrics_batch([(self.url, '', bucket + 1000, 10.0, 20.0, 30.0, None),
+                                    (self.url, '', bucket + 2000, 30.0, 40.0, 50.0, None)])
+        self.db.save_metrics_batch([(self.url, '', bucket + 3000, 50.0, 60.0, 70.0, None)])
+
+        for table in ('metrics_1m', 'metrics_5m', 'metrics_1h'):
+            row = self._row(table, bucket)
+            self.assertEqual(row['count'], 3)
+            self.assertEqual((row['cpu_usage_min'], row['cpu_usage_max']), (10.0, 50.0))
+            self.assertAlmostEqual(row['cpu_usage_avg'], 30.0)
+            self.assertEqual((row['cpu_usage_last'], row['last_ts']), (50.0, bucket + 3000))
+
+        # Запоздавшая точка не меняет last
+        self.db.save_metrics_batch([(self.url, '', bucket + 500, 90.0, 0.0, 0.0, None)])
+        row = self._row('metrics_1m', bucket)
+        self.assertEqual((row['count'], row['cpu_usage_last'], row['cpu_usage_max']), (4, 50.0, 90.0))
+
+        history = self.db.get_metrics_history(self.url, hours=24, points=300)
+        self.assertEqual(len(history), 1)
+        self.assertEqual(history[0][0], bucket)
+        self.assertAlmostEqual(history[0][1], 45.0)
+
+    def test_rollups_rebuilt_for_existing_metrics(self):
+        """Тест: при первом создании агрегатов они заполняются из уже собранных метрик"""
+        self.db.save_metrics_batch([(self.url, '', i * MINUTE, float(i), 0.0, 0.0, None) for i in range(10)])
+        conn = self.db.get_connection()
+        try:
+            conn.execute("DROP TABLE metrics_5m")
+            conn.commit()
+        finally:
+            conn.close()
+        self.db.close()
+
+        self.db = Database(self.temp_db.name)
+        row = self._row('metrics_5m', 5 * MINUTE)
+        self.assertEqual((row['count'], row['cpu_usage_avg']), (5, 7.0))
+        self.assertEqual(self._row('metrics_1h', 0)['count'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
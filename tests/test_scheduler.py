@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля scheduler
+"""
+
+import unittest
+import random
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.scheduler import PollScheduler, CLOSED, OPEN, HALF_OPEN
+
+
+class TestPollScheduler(unittest.TestCase):
+    """Тестовый класс для PollScheduler"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.url = "http://test-server:9090"
+        self.scheduler = PollScheduler(interval=5, max_backoff=60, jitter=0, failure_threshold=3)
+
+    def test_first_polls_staggered(self):
+        """Тест: первые опросы разнесены по интервалу"""
+        urls = [f"http://server-{i}:9090" for i in range(5)]
+        due = self.scheduler.due(urls, set(), now=0)
+        self.assertEqual(due, [(urls[0], False)])
+        due = self.scheduler.due(urls, set(), now=4)
+        self.assertEqual([url for url, _ in due], urls[1:])
+
+    def test_skips_running_server(self):
+        """Тест: сервер с незавершенным опросом пропускает тик, пропуск учитывается"""
+        self.scheduler.due([self.url], set(), now=0)
+        self.assertEqual(self.scheduler.due([self.url], {self.url}, now=5), [])
+        self.assertEqual(self.scheduler.due([self.url], {self.url}, now=7), [])
+        self.assertEqual(self.scheduler.get_skipped(self.url), 1)
+        self.assertEqual(self.scheduler.get_stats()['skipped'], 1)
+        self.assertEqual(self.scheduler.due([self.url], set(), now=10), [(self.url, False)])
+
+    def test_exponential_backoff(self):
+        """Тест: задержка удваивается с каждой неудачей и ограничена сверху"""
+        self.scheduler.due([self.url], set(), now=0)
+        delays = []
+        now = 0
+        for _ in range(6):
+            self.scheduler.report(self.url, False, now=now)
+            delays.append(self.scheduler._next_due[self.url] - now)
+        self.assertEqual(delays, [10, 20, 40, 60, 60, 60])
+
+    def test_jitter_bounds(self):
+        """Тест: разброс не выходит за заданную долю интервала"""
+        scheduler = PollScheduler(interval=10, jitter=0.2, rng=random.Random(1))
+        offsets = set()
+        for now in range(0, 1000, 20):
+            scheduler.due([self.url], set(), now=now)
+            offset = scheduler._next_due[self.url] - now
+            self.assertTrue(8 <= offset <= 12)
+            offsets.add(round(offset, 3))
+        self.assertGreater(len(offsets), 1)
+
+    def test_circuit_breaker(self):
+        """Тест: после серии неудач сервер проверяется пробой, а после успеха сразу опрашивается полностью"""
+        self.scheduler.due([self.url], set(), now=0)
+        for _ in range(3):
+            self.scheduler.report(self.url, False, now=0)
+        self.assertEqual(self.scheduler.get_state(self.url), OPEN)
+
+        due = self.scheduler.due([self.url], set(), now=100)
+        self.assertEqual(due, [(self.url, True)])
+        self.assertEqual(self.scheduler.get_state(self.url), HALF_OPEN)
+
+        # Неудачная проба снова размыкает защиту
+        self.scheduler.report(self.url, False, now=100)
+        self.assertEqual(self.scheduler.get_state(self.url), OPEN)
+        self.assertEqual(self.scheduler.due([self.url], set(), now=101), [])
+
+        self.assertEqual(self.scheduler.due([self.url], set(), now=200), [(self.url, True)])
+        self.scheduler.report(self.url, True, now=200)
+        self.assertEqual(self.scheduler.get_state(self.url), CLOSED)
+        self.assertEqual(self.scheduler.due([self.url], set(), now=200), [(self.url, False)])
+        self.assertEqual(self.scheduler.get_stats()['probes'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
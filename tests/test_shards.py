@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Тесты для модуля shards
+"""
+
+import unittest
+import tempfile
+import shutil
+import sqlite3
+import time
+
+# Добавляем путь к модулям проекта
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+from models.retention import RetentionService
+from models.shards import DAY_MS, MAX_ATTACHED
+
+DISK = {"C:": {"usage_precent": 50.0, "free_gb": 10.0, "total_gb": 20.0}}
+
+
+class TestShards(unittest.TestCase):
+    """Тестовый класс для шардов сырых метрик по дням"""
+
+    def setUp(self):
+        """Настройка перед каждым тестом"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.temp_dir, 'servers.db')
+        self.db = Database(self.db_file, shard_period='day')
+        self.url = "http://test-server:9090"
+        self.db.add_server(self.url)
+        self.today = self.db.shards.start_of(int(time.time() * 1000))
+
+    def tearDown(self):
+        """Очистка после каждого теста"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _save_days(self, days):
+        """Сохраняет по точке с диском в середине каждого из days последних дней"""
+        self.db.save_metrics_batch([(self.url, '', self.today - day * DAY_MS + DAY_MS // 2, float(day), 0.0, 0.0, DISK)
+                                    for day in range(days)])
+
+    def _shard_files(self):
+        return sorted(name for name in os.listdir(self.temp_dir) if name.startswith('servers.metrics-')
+                      and name.endswith('.db'))
+
+    def test_writes_go_to_daily_files(self):
+        """Тест: сырые метрики пишутся в файл своего дня, агрегаты - в основную базу"""
+        self._save_days(3)
+        self.assertEqual(len(self._shard_files()), 3)
+        self.assertEqual(self.db.shards.starts(), [self.today - 2 * DAY_MS, self.today - DAY_MS, self.today])
+
+        conn = sqlite3.connect(self.db.shards.path(self.today))
+        try:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM metrics").fetchone()[0], 1)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM disk_metrics").fetchone()[0], 1)
+        finally:
+            conn.close()
+        self.assertEqual(self.db.conn.execute("SELECT COUNT(*) FROM main.metrics").fetchone()[0], 0)
+        self.assertEqual(self.db.conn.execute("SELECT SUM(count) FROM metrics_1h").fetchone()[0], 3)
+
+    def test_history_spans_only_overlapping_shards(self):
+        """Тест: история собирается из нужных шардов по возрастанию времени"""
+        self._save_days(MAX_ATTACHED + 2)
+        hours = (time.time() * 1000 - self.today + 1.25 * DAY_MS) / 3600000
+        self.assertEqual(self.db.shards.overlapping(self.today - DAY_MS // 2), [self.today - DAY_MS, self.today])
+
+        history = self.db.get_metrics_history(self.url, hours=hours)
+        self.assertEqual([row[1] for row in history], [1.0, 0.0])
+        self.assertEqual(list(self.db.iter_metrics_history(self.url, hours=hours, batch_size=1)), history)
+        self.assertEqual(len(self.db.get_disk_history(self.url, hours=hours)['C:']), 2)
+
+        # Интервал длиннее лимита ATTACH читается поочередным подключением шардов
+        all_days = self.db.get_metrics_history(self.url, hours=(MAX_ATTACHED + 3) * 24)
+        self.assertEqual([row[1] for row in all_days], [float(day) for day in reversed(range(MAX_ATTACHED + 2))])
+        self.assertEqual(len(self.db.get_metrics_history_arrays(self.url, hours=(MAX_ATTACHED + 3) * 24)['ts']),
+                         MAX_ATTACHED + 2)
+
+    def test_readonly_attach_with_mmap(self):
+        """Тест: при чтении шарды подключаются только для чтения, отсутствующие пропускаются"""
+        self._save_days(1)
+        conn = self.db.read_pool.open_connection()
+        try:
+            names = self.db.shards.attach(conn, [self.today, self.today - DAY_MS], readonly=True)
+            self.assertEqual(names, [self.db.shards.schema(self.today)])
+            self.assertGreater(conn.execute(f"PRAGMA {names[0]}.mmap_size").fetchone()[0], 0)
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute(f"DELETE FROM {names[0]}.metrics")
+        finally:
+            conn.close()
+
+    def test_retention_drops_shard_files(self):
+        """Тест: устаревшие шарды удаляются целиком вместе с файлами"""
+        self._save_days(10)
+        report = RetentionService(self.db, {'metrics': 7, 'disk_metrics': 7}, pause=0).run_once()
+
+        # Удаляются только дни, целиком вышедшие за срок хранения
+        self.assertEqual(report['shards_dropped'], 2)
+        self.assertGreater(report['bytes_freed'], 0)
+        self.assertEqual(len(self._shard_files()), 8)
+        self.assertEqual(len(self.db.get_metrics_history(self.url, hours=24 * 30)), 8)
+
+        # Записи продолжают идти в шарды после удаления старых
+        self.db.save_metrics_batch([(self.url, '', self.today + 1000, 1.0, 0.0, 0.0, None)])
+        self.assertEqual(len(self.db.get_metrics_history(self.url, hours=24 * 30)), 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,20 @@
 import customtkinter as ctk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import threading
 import datetime
-from models.monitor import PrometheusMonitor
 from models.database import Database
 from models.alert_manager import AlertManager
+from models.collector import MetricsCollector
+from models.backfill import HistoryBackfill
+from models.retention import RetentionService
 from views.servers_window import ServersWindow
 from views.current_status_tab import CurrentStatusTab
 from views.history_graphs_tab import HistoryGraphsTab
 from views.incidents_tab import IncidentsTab
 
+# Пункт меню для истории, сохраненной до появления экземпляров (instance = '')
+NO_INSTANCE = "без экземпляра"
+
 class App(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -19,23 +23,30 @@ class App(ctk.CTk):
         # Настройка темной темы для главного окна
         self.configure(fg_color="#1a1a1a")  # Очень темный фон
         
-        self.db = Database(self.DBname)
+        # Период "1 час" при опросе раз в 5 с рисуется из памяти; запас - на задержки опроса
+        self.db = Database(self.DBname, cache_points=900)
+        # Все записи в базу идут через один поток пакетными транзакциями
+        self.db.start_writer()
         self.servers = self.db.servers
         self.alert_manager = AlertManager(self.db)
 
+        # Сборщик опрашивает все серверы в фоне, интерфейс только читает результаты
+        self.collector = MetricsCollector(self.db, self.alert_manager)
+        self.collector.start()
+        # История, накопленная Prometheus, догружается в фоне
+        self.backfill = HistoryBackfill(self.db)
+        self.backfill.start(self.db.servers)
+        # Устаревшие данные удаляются в фоне небольшими порциями
+        self.retention = RetentionService(self.db).start()
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+
         self.title("Мониторинг серверов")
         self.geometry("1200x800+400+100")
         self.minsize(1000, 600)
 
+        self.selected_instance = None
         self.setup_connection_frame()
         self.selected_url = self.connectionEntry.get() if self.connectionEntry.get() else ""
-        
-        # Инициализируем монитор с обработкой ошибок
-        try:
-            self.monitor = PrometheusMonitor(self.selected_url)
-        except Exception as e:
-            print(f"Ошибка при инициализации монитора: {e}")
-            self.monitor = None
 
         self.setup_tabs()
 
@@ -66,11 +77,11 @@ class App(ctk.CTk):
         
         # Вкладка текущего состояния
         self.current_tab = self.tabview.add("Текущее состояние")
-        self.current_status_tab = CurrentStatusTab(self.current_tab, self.monitor, self.db, self.alert_manager)
+        self.current_status_tab = CurrentStatusTab(self.current_tab, self.db, self.alert_manager)
         
         # Вкладка исторических графиков
         self.graphs_tab = self.tabview.add("История метрик")
-        self.history_graphs_tab = HistoryGraphsTab(self.graphs_tab, self.monitor, self.db)
+        self.history_graphs_tab = HistoryGraphsTab(self.graphs_tab, self.db)
         
         # Вкладка инцидентов
         self.incidents_tab = self.tabview.add("История инцидентов")
@@ -80,6 +91,7 @@ class App(ctk.CTk):
         self.setup_alerts_frame()
         
         # Загружаем графики за последний час для выбранного сервера при запуске
+        self.update_instances()
         self.history_graphs_tab.update_graphs()
         
         # Запускаем первое обновление данных и планируем периодические обновления
@@ -98,14 +110,49 @@ class App(ctk.CTk):
                                                fg_color="#3d3d3d", button_color="#4d4d4d")
         self.connectionEntry.grid(row=0, column=1, padx=10)
 
+        # Экземпляры (метка instance), обнаруженные за выбранным Prometheus
+        self.instanceEntry = ctk.CTkOptionMenu(self.connectionFrame, values=["—"],
+                                             command=lambda _: self.change_instance(),
+                                             fg_color="#3d3d3d", button_color="#4d4d4d")
+        self.instanceEntry.grid(row=0, column=2, padx=10)
+
         self.connectionButton = ctk.CTkButton(self.connectionFrame, text='Серверы', 
                                             command=self.open_servers_window,
                                             fg_color="#4d4d4d", hover_color="#5d5d5d")
-        self.connectionButton.grid(row=0, column=2, padx=10)
+        self.connectionButton.grid(row=0, column=3, padx=10)
 
         self.connectionStatusLabel = ctk.CTkLabel(self.connectionFrame, text="Подключение отсутствует", 
                                                 justify="left", font=("Arial", 16), text_color="#FF6D6A")
-        self.connectionStatusLabel.grid(row=0, column=3, padx=10)
+        self.connectionStatusLabel.grid(row=0, column=4, padx=10)
+
+        self.backfillLabel = ctk.CTkLabel(self.connectionFrame, text="", justify="left",
+                                          font=("Arial", 14), text_color="#aaaaaa")
+        self.backfillLabel.grid(row=0, column=5, padx=10)
+
+    def update_instances(self):
+        """Обновление списка экземпляров выбранного сервера"""
+        instances = self.collector.get_instances(self.selected_url) or self.db.get_instances(self.selected_url)
+        if '' not in instances and self.db.has_history(self.selected_url):
+            # Старая история без экземпляра доступна, пока не удалена хранением
+            instances = instances + ['']
+        self.instanceEntry.configure(values=[instance or NO_INSTANCE for instance in instances] or ["—"])
+        if self.selected_instance not in instances:
+            self.selected_instance = instances[0] if instances else None
+        if self.selected_instance is None:
+            self.instanceEntry.set("—")
+        else:
+            self.instanceEntry.set(self.selected_instance or NO_INSTANCE)
+        self.history_graphs_tab.server_url = self.selected_url
+        self.history_graphs_tab.instance = self.selected_instance or ''
+
+    def change_instance(self):
+        """Смена экземпляра внутри выбранного сервера"""
+        instance = self.instanceEntry.get()
+        self.selected_instance = None if instance == "—" else '' if instance == NO_INSTANCE else instance
+        self.history_graphs_tab.instance = self.selected_instance or ''
+        self.get_all_data()
+        self.update_all_data()
+        self.history_graphs_tab.update_graphs()
 
     def update_connection_info(self):
         """Обновление информации о подключении"""
@@ -128,32 +175,31 @@ class App(ctk.CTk):
             self.connectionStatusLabel.configure(text=connection_text, text_color="#FF6D6A")
             return False
 
+    def update_backfill_info(self):
+        """Отображение прогресса загрузки истории выбранного сервера"""
+        progress = self.backfill.get_progress(self.selected_url)
+        if progress is None or progress >= 1:
+            self.backfillLabel.configure(text="")
+        else:
+            self.backfillLabel.configure(text=f"Загрузка истории: {progress:.0%}")
+
     def update_data_periodically(self):
         """Периодическое обновление данных"""
-        threading.Thread(target=self.get_all_data, daemon=True).start()
+        self.update_instances()
+        self.get_all_data()
         self.update_all_data()
+        self.update_backfill_info()
         # Планируем следующее обновление через 5 секунд
         self.after(5000, self.update_data_periodically)
 
     def get_all_data(self):
-        """Получение всех данных"""
+        """Получение всех данных из последнего снимка сборщика"""
         try:
-            self.connection_info = self.monitor.is_network_available() if self.monitor else "0"
-            self.cpu_info = self.monitor.get_cpu_info() if self.monitor else None
-            self.ram_info = self.monitor.get_RAM_info() if self.monitor else None
-            self.rom_info = self.monitor.get_ROM_info() if self.monitor else None
-            
-            # Сохраняем метрики в базу данных
-            if self.cpu_info and self.ram_info and self.rom_info:
-                cpu_usage = float(self.cpu_info.get('usage_precent', 0))
-                ram_usage = float(self.ram_info.get('usage_precent', 0))
-                temperature = float(self.cpu_info.get('temperatur', 0))
-                
-                self.db.save_metrics(self.selected_url, cpu_usage, ram_usage, temperature, self.rom_info)
-                
-                # Проверяем оповещения
-                self.alert_manager.check_alerts(self.selected_url, self.cpu_info, self.ram_info, self.rom_info)
-                
+            snapshot = self.collector.get_latest(self.selected_url, self.selected_instance)
+            self.connection_info = snapshot['network'] if snapshot else "0"
+            self.cpu_info = snapshot['cpu'] if snapshot else None
+            self.ram_info = snapshot['ram'] if snapshot else None
+            self.rom_info = snapshot['rom'] if snapshot else None
         except Exception as e:
             # Логируем ошибку, но не прерываем работу приложения
             print(f"Ошибка при получении данных: {e}")
@@ -179,16 +225,24 @@ class App(ctk.CTk):
         """Смена сервера"""
         self.selected_url = self.connectionEntry.get()
         try:
-            if self.monitor:
-                self.monitor.change_url(self.selected_url)
-            else:
-                self.monitor = PrometheusMonitor(self.selected_url)
             self.reset_all_data()
+            self.selected_instance = None
+            self.update_instances()
+            # Данные нового сервера уже собраны в фоне - показываем их сразу
+            self.get_all_data()
+            self.update_all_data()
             # Не сбрасываем период, просто обновляем графики для текущего выбранного периода
             self.history_graphs_tab.update_graphs()
         except Exception as e:
             print(f"Ошибка при смене сервера: {e}")
-            self.monitor = None
+
+    def on_closing(self):
+        """Остановка сборщика при закрытии окна"""
+        self.backfill.stop()
+        self.retention.stop()
+        self.collector.stop()
+        self.db.close_writer()
+        self.destroy()
 
     def reset_all_data(self):
         """Сброс всех данных"""
@@ -209,6 +263,8 @@ class App(ctk.CTk):
         """Обновление списка серверов"""
         self.servers = self.db.servers
         self.connectionEntry.configure(values=self.servers)
+        # Для новых серверов загружаем историю из Prometheus
+        self.backfill.start(self.servers)
 
     def show_alerts(self):
         """Отображает активные оповещения"""
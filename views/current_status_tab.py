@@ -4,9 +4,8 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import datetime
 
 class CurrentStatusTab:
-    def __init__(self, parent, monitor, database, alert_manager):
+    def __init__(self, parent, database, alert_manager):
         self.parent = parent
-        self.monitor = monitor
         self.db = database
         self.alert_manager = alert_manager
         
@@ -2,15 +2,20 @@ import customtkinter as ctk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import datetime
-import json
+import numpy as np
 import matplotlib.dates as mdates
+from dateutil import tz
 from matplotlib.ticker import FuncFormatter, MultipleLocator
+from models.buckets import bucket_columns
+from models.database import HISTORY_COLUMNS
 
 class HistoryGraphsTab:
-    def __init__(self, parent, monitor, database):
+    def __init__(self, parent, database):
         self.parent = parent
-        self.monitor = monitor
         self.db = database
+        self.server_url = ''  # адрес Prometheus, история которого показывается
+        self.instance = ''  # экземпляр за адресом Prometheus, история которого показывается
+        self.buckets = 1000  # сколько интервалов запрашивать у базы при любом периоде
         
         self.setup_ui()
 
@@ -109,10 +114,43 @@ class HistoryGraphsTab:
         self.disks_canvas_frame = ctk.CTkFrame(self.disks_frame, fg_color="#2b2b2b")  # Темный фон
         self.disks_canvas_frame.pack(fill=ctk.BOTH, expand=True, padx=10, pady=5)
 
+    def load_history_arrays(self):
+        """Сводки метрик выбранного периода по интервалам в массивах numpy со временем UTC для оси"""
+        hours = self.period_values[self.period_names.index(self.period_dropdown.get())]
+        recent = self.db.get_recent_arrays(self.server_url, hours, instance=self.instance)
+        if recent is not None and len(recent['ts']) <= self.buckets:
+            # Период целиком в памяти: каждая точка - свой интервал
+            data = {'ts': recent['ts']}
+            for metric in HISTORY_COLUMNS:
+                for stat in ('min', 'avg', 'max', 'p95'):
+                    data[f'{metric}_{stat}'] = recent[metric].astype(np.float64)
+        else:
+            _, rows = self.db.get_metrics_buckets(self.server_url, hours, buckets=self.buckets,
+                                                  instance=self.instance)
+            columns = bucket_columns(HISTORY_COLUMNS)
+            # None (нет значений в интервале) становится NaN
+            values = np.array(rows, dtype=np.float64).reshape(len(rows), len(columns))
+            data = {column: values[:, index] for index, column in enumerate(columns)}
+            data['ts'] = data['ts'].astype(np.int64)
+        # В местное время ось переводит каждую метку со своим смещением (format_time_axis)
+        data['time'] = data['ts'].astype('datetime64[ms]')
+        return data
+
+    def plot_buckets(self, ax, timestamps, data, metric, color):
+        """Среднее по интервалам линией, разброс min-max полосой, p95 пунктиром"""
+        ax.fill_between(timestamps, data[f'{metric}_min'], data[f'{metric}_max'],
+                        color=color, alpha=0.2, linewidth=0)
+        # Пропуски (NaN) среднего рисуются как 0, как и прежде
+        ax.plot(timestamps, np.nan_to_num(data[f'{metric}_avg']), color=color, linewidth=2)
+        ax.plot(timestamps, data[f'{metric}_p95'], color=color, linewidth=1, linestyle='--', alpha=0.8)
+
     def parse_sqlite_timestamp(self, timestamp_str):
         """Парсинг временной метки из SQLite в datetime объект"""
         if not timestamp_str:
             return None
+        if isinstance(timestamp_str, (int, float)):
+            # Метки в мс эпохи
+            return datetime.datetime.fromtimestamp(timestamp_str / 1000)
             
         try:
             # Пробуем разные форматы времени
@@ -142,33 +180,26 @@ class HistoryGraphsTab:
 
     def format_time_axis(self, ax):
         """Форматирование оси времени для графиков"""
-        import matplotlib.dates as mdates
-        from matplotlib.ticker import FuncFormatter
-        
-        # Настраиваем форматирование времени - одинаковый формат для всех периодов
-        def time_formatter(x, pos):
-            try:
-                dt = mdates.num2date(x)
-                return dt.strftime('%d.%m %H:%M')
-            except:
-                return ''
+        # Точки наносятся в UTC, деления и подписи - в местном поясе с его правилами перехода на летнее время
+        local = tz.tzlocal()
         
         period = self.period_values[self.period_names.index(self.period_dropdown.get())]
         if period == 1:
-            locator = mdates.MinuteLocator(interval=5)
+            locator = mdates.MinuteLocator(interval=5, tz=local)
         elif period == 24:
-            locator = mdates.MinuteLocator(interval=15)
+            locator = mdates.MinuteLocator(interval=15, tz=local)
         elif period == 48:
-            locator = mdates.HourLocator(interval=2)  # Каждые 2 часа
+            locator = mdates.HourLocator(interval=2, tz=local)  # Каждые 2 часа
         elif period == 168:
-            locator = mdates.HourLocator(interval=6)  # Каждые 6 часов
+            locator = mdates.HourLocator(interval=6, tz=local)  # Каждые 6 часов
         elif period > 168:
-            locator = mdates.DayLocator()
+            locator = mdates.DayLocator(tz=local)
         else:
-            locator = mdates.MinuteLocator(interval=15)
+            locator = mdates.MinuteLocator(interval=15, tz=local)
         
         ax.xaxis.set_major_locator(locator)
-        ax.xaxis.set_major_formatter(FuncFormatter(time_formatter))
+        # Одинаковый формат для всех периодов
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m %H:%M', tz=local))
         
         # Настройка внешнего вида - уменьшенный размер шрифта для времени
         ax.tick_params(colors='white', labelsize=7)
@@ -260,12 +291,12 @@ class HistoryGraphsTab:
         self.cpu_canvas_frame.update()
         
         # Получаем данные
-        data = self.db.get_metrics_history(self.monitor.prom.url, self.period_values[self.period_names.index(self.period_dropdown.get())])
+        data = self.load_history_arrays()
         
         # Удаляем плейсхолдер
         placeholder.destroy()
         
-        if not data:
+        if not len(data['ts']):
             no_data_label = ctk.CTkLabel(self.cpu_canvas_frame, text="Нет данных за выбранный период", 
                                         font=("Arial", 16), text_color="#ffffff")
             no_data_label.pack(expand=True)
@@ -276,21 +307,10 @@ class HistoryGraphsTab:
         fig.patch.set_facecolor('#2b2b2b')
         ax.set_facecolor('#2b2b2b')
         
-        timestamps = []
-        cpu_values = []
+        timestamps = data['time']
         
-        for row in data:
-            timestamp_str = row[0]  # timestamp
-            cpu_usage = row[1] if row[1] is not None else 0  # cpu_usage
-            
-            # Парсим timestamp из SQLite
-            dt = self.parse_sqlite_timestamp(timestamp_str)
-            if dt:
-                timestamps.append(dt)
-                cpu_values.append(float(cpu_usage))
-        
-        if timestamps:
-            ax.plot(timestamps, cpu_values, color='#aec7e8', linewidth=2, marker='o', markersize=3)
+        if len(timestamps):
+            self.plot_buckets(ax, timestamps, data, 'cpu_usage', '#aec7e8')
             
             # Настройка стиля графика
             self.setup_graph_style(ax, f'Использование CPU за {self.period_values[self.period_names.index(self.period_dropdown.get())]} часов')
@@ -316,9 +336,9 @@ class HistoryGraphsTab:
         self.ram_canvas_frame.update()
         
         # Получаем данные
-        data = self.db.get_metrics_history(self.monitor.prom.url, self.period_values[self.period_names.index(self.period_dropdown.get())])
+        data = self.load_history_arrays()
         
-        if not data:
+        if not len(data['ts']):
             no_data_label = ctk.CTkLabel(self.ram_canvas_frame, text="Нет данных за выбранный период", 
                                         font=("Arial", 16), text_color="#ffffff")
             no_data_label.pack(expand=True)
@@ -329,21 +349,10 @@ class HistoryGraphsTab:
         fig.patch.set_facecolor('#2b2b2b')
         ax.set_facecolor('#2b2b2b')
         
-        timestamps = []
-        ram_values = []
+        timestamps = data['time']
         
-        for row in data:
-            timestamp_str = row[0]  # timestamp
-            ram_usage = row[2] if row[2] is not None else 0  # ram_usage
-            
-            # Парсим timestamp из SQLite
-            dt = self.parse_sqlite_timestamp(timestamp_str)
-            if dt:
-                timestamps.append(dt)
-                ram_values.append(float(ram_usage))
-        
-        if timestamps:
-            ax.plot(timestamps, ram_values, color='#98df8a', linewidth=2, marker='o', markersize=3)
+        if len(timestamps):
+            self.plot_buckets(ax, timestamps, data, 'ram_usage', '#98df8a')
             
             # Настройка стиля графика
             self.setup_graph_style(ax, f'Использование RAM за {self.period_values[self.period_names.index(self.period_dropdown.get())]} часов')
@@ -369,9 +378,9 @@ class HistoryGraphsTab:
         self.temp_canvas_frame.update()
         
         # Получаем данные
-        data = self.db.get_metrics_history(self.monitor.prom.url, self.period_values[self.period_names.index(self.period_dropdown.get())])
+        data = self.load_history_arrays()
         
-        if not data:
+        if not len(data['ts']):
             no_data_label = ctk.CTkLabel(self.temp_canvas_frame, text="Нет данных за выбранный период", 
                                         font=("Arial", 16), text_color="#ffffff")
             no_data_label.pack(expand=True)
@@ -382,21 +391,10 @@ class HistoryGraphsTab:
         fig.patch.set_facecolor('#2b2b2b')
         ax.set_facecolor('#2b2b2b')
         
-        timestamps = []
-        temp_values = []
+        timestamps = data['time']
         
-        for row in data:
-            timestamp_str = row[0]  # timestamp
-            temperature = row[3] if row[3] is not None else 0  # temperature
-            
-            # Парсим timestamp из SQLite
-            dt = self.parse_sqlite_timestamp(timestamp_str)
-            if dt:
-                timestamps.append(dt)
-                temp_values.append(float(temperature))
-        
-        if timestamps:
-            ax.plot(timestamps, temp_values, color='#ff9896', linewidth=2, marker='o', markersize=3)
+        if len(timestamps):
+            self.plot_buckets(ax, timestamps, data, 'temperature', '#ff9896')
             
             # Настройка стиля графика
             self.setup_graph_style(ax, f'Температура CPU за {self.period_values[self.period_names.index(self.period_dropdown.get())]} часов')
@@ -433,7 +431,8 @@ class HistoryGraphsTab:
         self.disks_canvas_frame.update()
         
         # Получаем данные
-        data = self.db.get_metrics_history(self.monitor.prom.url, self.period_values[self.period_names.index(self.period_dropdown.get())])
+        _, data = self.db.get_disk_buckets(self.server_url, self.period_values[self.period_names.index(self.period_dropdown.get())],
+                                           buckets=self.buckets, instance=self.instance)
         
         if not data:
             no_data_label = ctk.CTkLabel(self.disks_canvas_frame, text="Нет данных за выбранный период", 
@@ -449,25 +448,14 @@ class HistoryGraphsTab:
         # Собираем данные по дискам
         disk_data = {}
         
-        for row in data:
-            timestamp_str = row[0]  # timestamp
-            disk_usage_json = row[4]  # disk_usage
-            
-            if disk_usage_json:
-                # Парсим timestamp из SQLite
-                dt = self.parse_sqlite_timestamp(timestamp_str)
-                if dt:
-                    try:
-                        disk_info = json.loads(disk_usage_json)
-                        
-                        for volume, usage in disk_info.items():
-                            if volume not in disk_data:
-                                disk_data[volume] = {'timestamps': [], 'usage': []}
-                            
-                            disk_data[volume]['timestamps'].append(dt)
-                            disk_data[volume]['usage'].append(float(usage['usage_precent']))
-                    except:
-                        continue
+        for volume, rows in data.items():
+            points = {'timestamps': [], 'usage': []}
+            for ts, _, _, used_pct, _, _ in rows:
+                if used_pct is not None:
+                    # Метка интервала в мс эпохи - на оси UTC, как и у остальных графиков
+                    points['timestamps'].append(np.datetime64(int(ts), 'ms'))
+                    points['usage'].append(used_pct)
+            disk_data[volume] = points
         
         if disk_data:
             colors = ['#aec7e8', '#98df8a', '#ff9896', '#c5b0d5', '#ffbb78', '#2ca02c']
@@ -477,8 +465,7 @@ class HistoryGraphsTab:
                 if data_points['timestamps']:
                     color = colors[color_idx % len(colors)]
                     ax.plot(data_points['timestamps'], data_points['usage'], 
-                           color=color, linewidth=2, marker='o', markersize=3, 
-                           label=f'Диск {volume}')
+                           color=color, linewidth=2, label=f'Диск {volume}')
                     color_idx += 1
             
             # Настройка стиля графика
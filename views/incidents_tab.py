@@ -1,10 +1,24 @@
 import customtkinter as ctk
 import datetime
 
+ALL = "Все"
+
+# Фильтры: подпись -> значение для get_incidents_page
+TYPE_FILTERS = {ALL: None, "Температура CPU": "cpu_temp", "Использование диска": "disk_usage",
+                "Использование RAM": "ram_usage"}
+SEVERITY_FILTERS = {ALL: None, "Критические": "critical", "Предупреждения": "warning"}
+STATUS_FILTERS = {ALL: None, "Активные": False, "Разрешенные": True}
+
+
 class IncidentsTab:
+    PAGE_SIZE = 50
+
     def __init__(self, parent, database):
         self.parent = parent
         self.db = database
+        # Курсоры начала просмотренных страниц: последний - текущая страница
+        self.page_cursors = [None]
+        self.next_cursor = None
         
         self.setup_ui()
         self.refresh_incidents()
@@ -23,6 +37,18 @@ class IncidentsTab:
             width=100
         )
         self.refresh_button.pack(side=ctk.LEFT, padx=10, pady=5)
+
+        # Фильтры выполняются в базе по индексам
+        self.server_filter = self._add_filter([ALL] + list(self.db.servers), width=180)
+        self.type_filter = self._add_filter(list(TYPE_FILTERS))
+        self.severity_filter = self._add_filter(list(SEVERITY_FILTERS))
+        self.status_filter = self._add_filter(list(STATUS_FILTERS))
+
+        # Постраничный просмотр
+        self.prev_button = ctk.CTkButton(self.control_frame, text="< Новее", command=self.prev_page, width=80)
+        self.prev_button.pack(side=ctk.LEFT, padx=(10, 2), pady=5)
+        self.next_button = ctk.CTkButton(self.control_frame, text="Старее >", command=self.next_page, width=80)
+        self.next_button.pack(side=ctk.LEFT, padx=(2, 10), pady=5)
         
         # Кнопка очистки старых данных
         '''self.cleanup_button = ctk.CTkButton(
@@ -50,6 +76,42 @@ class IncidentsTab:
         
         self.incidents_list = []
 
+    def _add_filter(self, values, width=150):
+        """Выпадающий список фильтра; смена значения открывает первую страницу"""
+        menu = ctk.CTkOptionMenu(self.control_frame, values=values, command=lambda _: self.reset_pages(), width=width)
+        menu.pack(side=ctk.LEFT, padx=5, pady=5)
+        menu.set(ALL)
+        return menu
+
+    def reset_pages(self):
+        """Возврат к первой странице (новейшие инциденты)"""
+        self.page_cursors = [None]
+        self.refresh_incidents()
+
+    def next_page(self):
+        if self.next_cursor is not None:
+            self.page_cursors.append(self.next_cursor)
+            self.refresh_incidents()
+
+    def prev_page(self):
+        if len(self.page_cursors) > 1:
+            self.page_cursors.pop()
+            self.refresh_incidents()
+
+    def load_page(self):
+        """Загружает текущую страницу с выбранными фильтрами"""
+        server = self.server_filter.get()
+        incidents, self.next_cursor = self.db.get_incidents_page(
+            server_url=None if server == ALL else server,
+            incident_type=TYPE_FILTERS[self.type_filter.get()],
+            severity=SEVERITY_FILTERS[self.severity_filter.get()],
+            resolved=STATUS_FILTERS[self.status_filter.get()],
+            after=self.page_cursors[-1],
+            limit=self.PAGE_SIZE)
+        self.prev_button.configure(state="normal" if len(self.page_cursors) > 1 else "disabled")
+        self.next_button.configure(state="normal" if self.next_cursor is not None else "disabled")
+        return incidents
+
     def setup_table_headers(self):
         """Настройка заголовков таблицы"""
         headers_frame = ctk.CTkFrame(self.main_container)
@@ -76,8 +138,11 @@ class IncidentsTab:
             incident_widget.destroy()
         self.incidents_list.clear()
         
-        # Получаем инциденты
-        incidents = self.db.get_incidents(limit=100)
+        # Список серверов мог измениться
+        self.server_filter.configure(values=[ALL] + list(self.db.servers))
+
+        # Получаем текущую страницу инцидентов
+        incidents = self.load_page()
         
         if not incidents:
             no_incidents_label = ctk.CTkLabel(
@@ -263,6 +328,8 @@ class IncidentsTab:
             self.stats_label.configure(text="Всего инцидентов: 0")
             return
         
+        # Статистика по текущей странице
+        page = len(self.page_cursors)
         total = len(incidents)
         active = sum(1 for inc in incidents if not inc[7])  # resolved
         resolved = total - active
@@ -270,7 +337,7 @@ class IncidentsTab:
         critical = sum(1 for inc in incidents if inc[4] == "critical")  # severity
         warning = sum(1 for inc in incidents if inc[4] == "warning")
         
-        stats_text = f"Всего: {total} | Активных: {active} | Разрешенных: {resolved} | Критических: {critical} | Предупреждений: {warning}"
+        stats_text = f"Страница {page} | Всего: {total} | Активных: {active} | Разрешенных: {resolved} | Критических: {critical} | Предупреждений: {warning}"
         self.stats_label.configure(text=stats_text)
 
     def cleanup_old_data(self):
@@ -294,7 +361,7 @@ class IncidentsTab:
             self.refresh_incidents()
             
             # Через 3 секунды возвращаем обычную статистику
-            self.parent.after(3000, lambda: self.update_stats(self.db.get_incidents(limit=100)))
+            self.parent.after(3000, lambda: self.update_stats(self.load_page()))
             
         except Exception as e:
             # Показываем ошибку
@@ -303,4 +370,4 @@ class IncidentsTab:
             print(f"Ошибка при очистке данных: {e}")
             
             # Через 5 секунд возвращаем обычную статистику
-            self.parent.after(5000, lambda: self.update_stats(self.db.get_incidents(limit=100))) 
\ No newline at end of file
+            self.parent.after(5000, lambda: self.update_stats(self.load_page())) 
\ No newline at end of file
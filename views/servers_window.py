@@ -1,5 +1,6 @@
 import customtkinter as ctk
 import tkinter as tk
+import threading
 from views.add_server import AddServerWindow
 import tkinter.messagebox as msg
 
@@ -34,6 +35,14 @@ class ServersWindow():
         self.serverslabels = []
         self.serversbuttons = []
 
+        # Базу старого формата пользователь перестраивает сам: VACUUM долгий и приостанавливает запись
+        self.vacuum_thread = None
+        if self.db.needs_incremental_vacuum():
+            self.vacuumbutton = ctk.CTkButton(self.innerframe, text='Сжать базу данных',
+                                              command=self.convert_vacuum,
+                                              fg_color="#4d4d4d", hover_color="#5d5d5d")
+            self.vacuumbutton.grid(row=3, column=1, pady=10, padx=10)
+
         self.display_servers(self.db.servers)
 
     def display_servers(self, servers):
@@ -63,6 +72,30 @@ class ServersWindow():
             except Exception as e:
                 pass
 
+    def convert_vacuum(self):
+        """Перестройка базы в режим auto_vacuum=INCREMENTAL в фоне"""
+        result = msg.askquestion("Внимание", "Перестройка базы может занять несколько минут и требует свободного "
+                                             "места размером с базу. Запись метрик на это время приостановится. Продолжить?")
+        if result != "yes" or self.vacuum_thread:
+            return
+        self.vacuumbutton.configure(state="disabled", text="Сжатие базы...")
+        self.vacuum_thread = threading.Thread(target=self.db.convert_incremental_vacuum, daemon=True)
+        self.vacuum_thread.start()
+        self.master.after(500, self.check_vacuum)
+
+    def check_vacuum(self):
+        """Ожидание окончания перестройки базы"""
+        if self.vacuum_thread.is_alive():
+            self.master.after(500, self.check_vacuum)
+            return
+        self.vacuum_thread = None
+        if self.db.needs_incremental_vacuum():
+            self.vacuumbutton.configure(state="normal", text="Сжать базу данных")
+            msg.showwarning("Внимание", "Базу не удалось перестроить, попробуйте позже")
+        else:
+            self.vacuumbutton.destroy()
+            msg.showinfo("Готово", "База перестроена")
+
     def delete_server_wigets(self):
 
         for label in self.serverslabels: